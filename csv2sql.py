@@ -36,6 +36,14 @@ If you want to just parse the field lengths of a CSV file, you can do it like th
 
 $ csv2sql.py table my_file.csv
 
+For CSV files with a single character separator, the field lengths are computed
+by scanning the memory-mapped file directly, without going through pandas. If
+the numba package is installed, the scanner is compiled to machine code.
+Empty fields have a length of 0. Earlier versions counted them as 3 (the
+length of "nan"): for a column with empty fields and no value longer than 2
+characters, the length, and so the Hash on the last line, differ from those
+of earlier versions.
+
 ### Sample just a small part of the file
 
 You can use the `-m` option to sample just a small part of the file:
@@ -47,6 +55,45 @@ more or less good idea of the field lengths - depending on how big your sample i
 For a guaranteed correct result, you should use the `-m -1` option or not use
 the `-m` option at all. The `-a` option is a shortcut for `-m -1`.
 
+The first rows are often not like the rest of the file. To pick the rows
+elsewhere, use --sample: stratified reads short runs of rows at random places
+all over the file, seeking to them instead of reading what lies in between;
+ends takes the first and the last rows, and stratified runs in between; and
+reservoir takes a uniform sample, but has to read the whole file (it is also
+used for compressed and Excel files, which cannot be seeked). --seed changes
+the random places.
+
+$ csv2sql.py table -m 2000 --sample stratified my_file.csv
+
+For a sample, the output also shows, for each column, the estimated chance
+that no row of the file is longer than the longest sampled one, and the
+length that no row exceeds with 95% probability. Columns of a fixed format
+come out at 100%; for free text, expect a low chance, and size the column by
+the second number. Columns whose length may cross 255 or 65,535 characters
+are flagged; with --verify, the whole file is read to get their exact length:
+
+$ csv2sql.py table -m 2000 --sample stratified --verify -t my_file.csv
+
+### Profile the Columns
+
+To see more than the lengths, use --stats: it shows, for each column, the
+missing values (empty, or NA markers like NULL), the blank ones, the number of
+distinct values, the smallest and the largest value (numbers, if all values
+are numbers), the most frequent values, and how the lengths are spread.
+--stats-json writes the same to a file, for all files given:
+
+$ csv2sql.py table --stats my_file.csv
+$ csv2sql.py table --stats-json profile.json *.csv
+
+The profile is taken in the same pass as the lengths, in fixed memory: the
+distinct values are estimated with a HyperLogLog sketch (to about 2%), and
+the most frequent values are counted in a small table whose error is given
+as top_error. Use -j to profile the file in several processes; for CSV files
+and numba, the file is cut at its rows, and the pieces are parsed in the
+processes, too:
+
+$ csv2sql.py table --stats -j 4 my_file.csv
+
 
 ### Generate a Table Definition
 
@@ -120,7 +167,8 @@ If you want to use indices, you can do it like this:
 
 $ csv2sql.py table -t my_file.csv -i tpt -i solution_area,product_id
 
-If you use more than one column, an index be composite.
+If you use more than one column, an index be composite. The indices are added
+after the data is loaded, which is faster than keeping them up to date row by row.
 
 ### Use COMPRESSED row format
 
@@ -128,6 +176,70 @@ If you want to use the COMPRESSED row format, you can do it like this:
 
 $ csv2sql.py table -t -c my_file.csv
 
+### Load the File into the Database
+
+To not only generate, but also run the statements on the database (MySQL only),
+use --execute (or -x, which implies -t) with the same database options as for
+parse --db:
+
+$ csv2sql.py table -x -i product_id my_file.csv --dbhost=localhost --dbuser=user --dbpass=pass --dbschema=mydb
+
+This drops and creates the table, loads the file on the server with LOAD DATA
+INFILE (with the line terminator of the file, for CRLF files), adds the indices, and reports the rows per second and the warnings.
+If the file is on the client rather than on the server, use --local for LOAD
+DATA LOCAL INFILE (the server needs to allow it with local_infile). With
+--disable-keys, keys and unique and foreign key checks are switched off while
+loading.
+
+### Excel Files
+
+Excel files are read row by row from their first sheet, without loading the
+whole workbook into memory. If the python-calamine package is installed, it is
+used to read the sheet; otherwise, openpyxl is used in read-only mode.
+
+### Compressed Files
+
+CSV files compressed with gzip, bzip2, or zstd are decompressed on the fly,
+based on their extension:
+
+$ csv2sql.py table -t my_file.csv.gz
+$ csv2sql.py parse my_file.csv.zst --csv
+
+The table name defaults to the file name without both extensions. When
+python-isal (gzip) or indexed_bzip2 (bzip2) are installed, decompression runs
+in separate threads; zstd needs the zstandard package. The progress bar then
+shows the compressed bytes read so far.
+
+### CSV Dialects
+
+The delimiter, quote character, escape character, line terminator, byte
+order mark, and encoding of a CSV file are detected from samples taken at
+its start, middle, and end (compressed files are sampled from the start
+only). A backslash is treated as escape character, unless the samples show
+it taken literally, as in C:\temp. A delimiter must also split the first
+line, so that a single column of times is not split at the colons. The
+result is cached per file (keyed by path, size, and modification time) in
+~/.cache/csv2sql, or in the directory given by the CSV2SQL_CACHE environment
+variable. The -s option overrides the detected delimiter:
+
+$ csv2sql.py table -s ";" my_file.csv
+
+### Repair Broken Quoting
+
+Some exports quote their fields badly: triple quotes, quotes within quoted
+fields, or JSON fragments such as "{"key":"value"}". The --repair option
+fixes them as the file is read, in the same way as csvclean.sh, and also
+turns CRLF line endings into LF:
+
+$ csv2sql.py table --repair my_file.csv
+$ csv2sql.py parse --repair my_file.csv --csv
+
+The repair command writes the repaired file once, in place or to another
+file, so that later runs can read it directly:
+
+$ csv2sql.py repair my_file.csv
+$ csv2sql.py repair my_file.csv.gz -o my_file.csv
+
 
 
 
@@ -174,6 +286,15 @@ $ csv2sql.py parse my_file.csv -M 10 -H 5
 
 The above command shows 10 rows of the output, skipping the first 5 rows.
 
+To page through a large file with -h, pandas still has to parse every row it
+skips. With --offsets, the file is scanned once for the byte offset of every
+10,000th row, the offsets are kept in the cache directory (see "Cache the
+Parsed Data"), and each later run seeks to the nearest of them:
+
+$ csv2sql.py parse my_file.csv -h 5000000 -m 10 --offsets
+
+This works for uncompressed CSV files with a single character separator.
+
 
 ### Rename Columns
 
@@ -296,10 +417,90 @@ to convert it to an integer or float:
 
 $ csv2sql parse tpt_assignments_input.csv -m 12 -f "#Tenants"=int -o -"#Tenants"
 
-Here is how you can sort in a case sensitive manner:
+Sorting is case insensitive: a, B, and c sort in this order. Here is how you
+can sort in a case sensitive manner, where B sorts before a:
 
 csv2sql parse sold_to_party.csv -f customer_name=str -q 'customer_name contains "GmbH"' -o -customer_id --case -a
 
+Earlier versions sorted case sensitively even without --case, as their case
+folding did not take effect: the order of text columns with mixed case
+differs from theirs, and --case gives their order back.
+
+### Sort Files Larger than Memory
+
+If a file does not fit into memory, you can process it in chunks and sort it on disk:
+
+$ csv2sql.py parse my_file.csv -a -o city -o -amount --external --csv > sorted.csv
+
+Each chunk is read, transformed (columns, formats, regular expressions, queries),
+sorted, and written to a temporary file; the sorted chunks are then merged. Ties
+keep the order of the file. With --csv, the output is written as it is merged,
+so only a few chunks are ever in memory; for the other outputs, the merged data
+is put together before writing. Use --chunk-rows to set the number of rows per
+chunk (default: 1000000). Note that --longest needs the whole file, and cannot
+be used with --external.
+
+With --external, --unique drops duplicate rows as the chunks come, keeping the
+first row of each key, before sorting:
+
+$ csv2sql.py parse my_file.csv -a -u customer_id -o name --external --csv > unique.csv
+
+For this, a 64-bit hash of the key columns of each row is kept, so memory grows
+with the number of distinct keys, not with the number of rows. Hashes of different
+keys are very unlikely to collide; to be sure, --unique-verify keeps the keys as well
+and compares them when hashes match. If even the hashes of all distinct keys do
+not fit into memory, --unique-partitions spreads the rows over a number of
+partitions on disk, deduplicates each of them on its own, and merges them back
+into the order of the file:
+
+$ csv2sql.py parse my_file.csv -a -u customer_id --external --unique-partitions 16 --csv > unique.csv
+
+### Reduce the Memory Usage
+
+For large files, you can keep the data in a memory-compact form:
+
+$ csv2sql.py parse my_file.csv -a --compact --db
+
+The file is then read in small chunks, strings are stored in Arrow arrays
+(if pyarrow is installed), and columns with few distinct values are stored as
+categoricals. Missing values and non-breaking spaces are cleaned up column by
+column instead of copying the whole data. To measure the effect on a synthetic
+file, use the benchmark script:
+
+$ csv2sql_bench.py memory --rows 5000000 --cols 80
+
+### Profile the Stages
+
+To see where the time goes, you can profile the stages of a parse run
+(sniffing, reading, converters, replacing, querying, sorting, writing, and so on):
+
+$ csv2sql.py parse my_file.csv -a -f amount=int -q 'city="Rome"' --csv --profile > out.csv
+
+For each stage, this shows the wall and CPU time, the rows going in and out, and
+the peak memory so far on stderr. With --external, the stages run a chunk at
+a time, and their wall time is added up per stage (external: read, external:
+transform, external: unique, external: sort). With --profile-json, the stages
+are written to a JSON file in the Chrome trace event format (for
+chrome://tracing or Perfetto), and with --pstats, the whole run is profiled
+with cProfile and its statistics are written to a file for pstats or snakeviz:
+
+$ csv2sql.py parse my_file.csv -a --csv --profile-json trace.json --pstats parse.prof
+
+### Cache the Parsed Data
+
+When you run parse on the same file again and again with different queries,
+sort orders, or outputs, you can cache the data as it is before the queries:
+
+$ csv2sql.py parse my_file.csv -a -f amount=int -O note --cache -q 'city="Rome"' --csv
+$ csv2sql.py parse my_file.csv -a -f amount=int -O note --cache -q 'city="Paris"' -o -amount --json
+
+The first run reads the file, converts and cleans the data (columns, formats,
+regular expressions, non breaking spaces), and stores the result as a Parquet
+file in the cache directory ($CSV2SQL_CACHE, or ~/.cache/csv2sql). Later runs on
+the unchanged file with the same read options (separator, --head, --max, -f, -c,
+-n, -O, -r, --compact) start from there. The least recently used entries are
+removed when the cache grows beyond --cache-size (in MB, default: 2048).
+
 ### Generate a CSV File
 
 To show the content of a CSV file in CSV format, you can do it like this:
@@ -349,6 +550,13 @@ To generate a SQL schema, you can do it like this:
 
 $ csv2sql.py parse approvers.csv --sql
 
+This shows the CREATE TABLE statement that --db would run, with the columns
+sized and typed the same way. It is rendered for the database of --dbtype
+(MySQL by default, or PostgreSQL or SQLite), without connecting to it, so
+that neither the database nor its driver is needed:
+
+$ csv2sql.py parse approvers.csv --sql --dbtype postgresql
+
 
 ### Directly load the data into a Database
 
@@ -357,11 +565,22 @@ $ csv2sql.py parse approvers.csv --sql
 Before writing to the database, it may be a good idea to show the database schema
 that will be used:
 
+$ csv2sql.py parse approvers.csv --sql
+
 To directly load the data into a database, you can do it like this:
 
 $ csv2sql.py parse approvers.csv --db
 
-This will create a table called approvers in the database.
+This will create a table called approvers in the database. As with the table
+command, each column is created as a varchar sized to its longest value, or as
+bigint or double if it was converted to integers or floats with -f. Columns
+too long for a varchar become text columns: in MySQL, those longer than 16,383
+characters become mediumtext (or longtext), and if the varchars of a row would
+take more than the 65,535 bytes a row can hold (four bytes per character with
+utf8mb4), the longest of them become text. For MySQL, you can also use the
+COMPRESSED row format:
+
+$ csv2sql.py parse approvers.csv --db --compressed
 
 #### Use a prefix for the table name
 
@@ -390,6 +609,44 @@ $ csv2sql.py parse approvers.csv --db -cs=10000
 
 This can have a significant impact on the performance of the database.
 
+#### Write with several connections in parallel
+
+A single connection may not keep a database server busy. To split the data into
+partitions that are written over several connections in parallel, use:
+
+$ csv2sql.py parse approvers.csv --db --db-workers 4
+
+(SQLite only allows a single writer, so there, the data is always written over
+one connection.)
+
+#### Create indices
+
+To create indices once the data is loaded, use the same syntax as for table -i:
+
+$ csv2sql.py parse approvers.csv --db -i contact -i product_id,product_name
+
+#### Swap in a staging table
+
+By default, the table is dropped and filled again, so while loading, readers see
+it empty or half loaded. To load into a staging table (the table name followed by
+_staging) instead, and replace the table with it in one step at the end (RENAME
+TABLE for MySQL, a transaction for other databases), use:
+
+$ csv2sql.py parse approvers.csv --db --staging
+
+#### Write many tables at once
+
+When loading many (small) files, each into its own table, setting up the
+connections and waiting for the database can take longer than the data itself.
+With --db-async, the tables are written in the background over an asyncio engine
+(aiomysql, asyncpg, or aiosqlite, depending on --dbtype), while the next files
+are read; the number gives how many tables are written at once:
+
+$ csv2sql.py parse -a --db --db-async 8 -p _tmp_ data/*.csv
+
+This needs SQLAlchemy's asyncio support (pip install "sqlalchemy[asyncio]") and
+the asyncio driver of the database.
+
 
 #### Use special database connection parameters
 
@@ -401,6 +658,13 @@ You can also use the dbargs option to specify the database connection parameters
 
 $ csv2sql.py parse approvers.csv --db --dbargs='{"charset": "utf8mb4", "use_unicode": "True", "connect_timeout": 10}'
 
+#### Use SQLite
+
+To write to an SQLite database, give its file as the schema; the host, port,
+user, and password are then not used:
+
+$ csv2sql.py parse approvers.csv --db --dbtype sqlite --dbschema approvers.db
+
 
 ### Drop the table from the database
 
@@ -408,6 +672,101 @@ If you want to drop the table from the database, you can do it like this:
 
 $ csv2sql.py drop -p _tmp_ -t fpm
 
+You can give several tables, and glob patterns (*, ?, [...]) for the table names:
+
+$ csv2sql.py drop -p _tmp_ -t 'fpm_*' -t approvers
+
+The table names are listed once, and all matching tables are dropped over one
+connection (in a single DROP TABLE statement for MySQL and PostgreSQL). To drop
+many of them at once over an asyncio engine instead, use --db-async:
+
+$ csv2sql.py drop -p _tmp_ -t 'fpm_*' --db-async 8
+
+
+## Generate a Word Cloud
+
+To draw a word cloud of the words in a column, do it like this:
+
+$ csv2sql.py wordcloud -a -f comments -S my_stopwords.txt -o comments.png my_file.csv
+
+The words are counted once, and the counts go straight to the word cloud. To
+count them in several processes, each taking a slice of the column, use -j:
+
+$ csv2sql.py wordcloud -a -f comments -j 4 -o comments.png my_file.csv
+
+For files too large to load, --stream reads only the column, in chunks of
+--chunk-rows rows, and keeps just the word counts from one chunk to the next.
+The words are then lemmatized one by one (cats counts as cat), and the lemmas
+of the most recent words are remembered:
+
+$ csv2sql.py wordcloud -a -f comments --stream -o comments.png my_file.csv
+
+The words need NLTK's stopwords and wordnet data (nltk.download("stopwords"),
+nltk.download("wordnet")).
+
+
+## Ingest a Directory
+
+To load all files of a directory into the database, each into a table named
+after the file (as parse --db -a does), use ingest. The largest files are
+loaded first, -j of them at once:
+
+$ csv2sql.py ingest -j 4 --dbtype sqlite --dbschema inbox.db inbox/
+
+The files loaded are kept in a journal (.csv2sql-ingest.db in the directory,
+or --journal), so that a second run only loads the files that are new or
+have changed; files that failed are loaded again with --retry. With
+--watch, ingest keeps running and loads the files as they come; a file is
+only loaded once its size has not changed for --interval seconds. If the
+inotify_simple package is installed, new files are noticed at once rather
+than at the next scan. For each file, the time it took, the rows and bytes
+per second, and how long after it was found it was done are shown.
+
+
+## Use it from Python
+
+The stages of the commands are also available as a Python API, so that
+programs need not run csv2sql.py for each file. A Pipeline is given the
+options once (as parse takes them), and can then be used for many files;
+it returns DataFrames (or, with stream, an iterator of them), profiles the
+columns as table --stats does, and keeps the database engines it creates:
+
+    from csv2sql import Pipeline
+
+    pipeline = Pipeline(rename={0: "id"}, query=['city = "Rome"'], order=["-amount"])
+    df = pipeline.run("my_file.csv")
+    stats = pipeline.profile("my_file.csv") # A ColumnStats per column
+    pipeline.write(df, "rome", pipeline.engine("sqlite", "my.db"))
+    pipeline.close()
+
+Renames are given by column name, or by the column's index, counted from 0,
+and converters as formats, as parse -f takes them. parse itself runs its files
+through a Pipeline, so the two give the same results.
+
+
+## Run a Server
+
+Each call of csv2sql.py spends a second or two importing pandas, SQLAlchemy
+and the rest before it does anything. For many small calls, start a server
+once; it keeps the modules loaded and the database engines (with their
+pooled connections) open:
+
+$ export CSV2SQL_SERVER=/tmp/csv2sql.sock
+$ csv2sql.py serve &
+
+With CSV2SQL_SERVER set, the table, parse, and drop commands are handed to
+the server, which runs them in the directory they were called from and
+sends their output back; the client itself imports next to nothing. If no
+server answers, the command runs as usual. The jobs run one at a time.
+
+The csv2sql_bench.py script generates synthetic CSV and Excel files and times
+every command on them, writing the wall times and peak memory to a JSON file.
+Two such files can be compared to find regressions:
+
+$ csv2sql_bench.py run --rows 100000 --cols 20 --output before.json
+$ csv2sql_bench.py run --rows 100000 --cols 20 --output after.json
+$ csv2sql_bench.py compare before.json after.json
+
 """
 
 #
@@ -422,22 +781,65 @@ import re
 import csv
 import hashlib
 import struct
-import pandas as pd
-import numpy as np
-from pandas.io import sql
-from sqlalchemy import create_engine, MetaData, Table, exc, inspect
+import collections
+import io
+import mmap
+import datetime
+import time
+import pickle
+import tempfile
+import concurrent.futures
+import asyncio
+import threading
+import fnmatch
+import functools
+import contextlib
+from typing import List, Optional
 import json
 import os
 from os import path
 from pathlib import Path
 
+
+#
+# Hand the command over to a running csv2sql.py serve, if CSV2SQL_SERVER
+# names its socket. This happens before the heavy imports below, so that the
+# client takes milliseconds; the output of the command is streamed back as
+# JSON lines ({"out": text}, {"err": text}), and the last line has its exit
+# code ({"exit": code}). Returns None if the server cannot be reached.
+#
+def forward_command(address: str, args: list) -> Optional[int]:
+    import socket
+    try:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(address)
+    except OSError:
+        return None
+    with connection:
+        connection.sendall((json.dumps({"args": args, "cwd": os.getcwd()}) + "\n").encode("utf-8"))
+        for line in connection.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            for stream, text in message.items():
+                (sys.stdout if stream == "out" else sys.stderr).write(text)
+    return 1 # The server went away
+
+if __name__ == '__main__' and os.environ.get("CSV2SQL_SERVER") and sys.argv[1:2] in (["table"], ["parse"], ["drop"]):
+    code = forward_command(os.environ["CSV2SQL_SERVER"], sys.argv[1:])
+    if code is not None:
+        sys.stdout.flush()
+        os._exit(code)
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import create_engine, MetaData, Table, exc, inspect, BigInteger, Double
+from sqlalchemy.engine import URL
+
 #
 # ML
 #
 import nltk
-from nltk.corpus import stopwords
-from nltk.probability import FreqDist
-from nltk.tokenize import RegexpTokenizer
 from nltk.stem import WordNetLemmatizer
 
 #
@@ -445,6 +847,8 @@ from nltk.stem import WordNetLemmatizer
 #
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
+from wordcloud import STOPWORDS as WORDCLOUD_STOPWORDS
+from wordcloud.tokenization import score as collocation_score
 
 
 #
@@ -457,27 +861,15 @@ from rich import traceback;
 from rich import pretty;
 from rich.progress import Progress
 import rich.table # used to print a table
+import rich.markup
 from rich.console import Console
 pretty.install()
 traceback.install()
 
 
-#
-# Global Variables
-#
-# The separator to use is held in a global variable
-# because it is determined by the read_file function;
-# that function returns a dataframe, but needs to
-# save the separator for the write_file function that
-# is called later by parse.
-#
-_separator = None
-
-
 #
 # Command Line Interface
 #
-from typing import List, Optional
 import typer
 
 app = typer.Typer(
@@ -511,117 +903,195 @@ def wordcloud (
     head:       int  = typer.Option(0,         "--head",       "-h",          help="The number of header lines to skip"),
     all:        bool = typer.Option(False,     "--all",        "-a",          help="Whether to read all rows or not"),
     maxr:       int  = typer.Option(-1,        "--max",        "-m",          help="The number of rows to read. -1 for all rows"),
+    workers:    int  = typer.Option(1,         "--workers",    "-j",          help="The number of processes to count the words with"),
+    stream:     bool = typer.Option(False,     "--stream",                    help="Read the column in chunks and lemmatize word by word"),
+    chunk_rows: int  = typer.Option(100000,    "--chunk-rows",                help="The number of rows per chunk with --stream"),
     files:      Optional[List[str]] = typer.Argument(None,                    help="The files to process"),
 ) -> None:
     """
     Parse CSV or XLSX files and get a word cloud out of a given column
     """
-    #
-    # Set the global separator
-    #
-    global _separator
-    if sepr is not None:
-        _separator = sepr
-
     if len(files) == 0: # len(ctx.args) == 0:
         print("Please specify a file name.")
         sys.exit(1)
     else:
+        stopwords = cloud_stopwords(stop)
+
         for file in files: #ctx.args:
             abs_path = path.abspath(file)
+            rows = -1 if all else maxr
 
-            nrows = file_len(file)
-
-            if all:
-                df = read_file(file, sepr, -1, head)
+            if stream:
+                #
+                # Read just the column, chunk by chunk, so that only the
+                # counts are kept from one chunk to the next
+                #
+                chunks = (df[feature] for df in read_file_chunks(file, sepr, rows, head, chunksize=chunk_rows, columns=[feature]))
+                frequencies = word_frequencies(chunks, stopwords, workers, by_word=True)
             else:
-                df = read_file(file, sepr, maxr, head)
-
-            #
-            # Replace NaN with ""
-            #
-            df = df.fillna("")
+                df = read_file(file, sepr, rows, head)
 
-            #
-            # Lowercase
-            #
-            df[feature] = df[feature].astype(str).str.lower()
+                #
+                # Count the words in slices of the column, one slice per process
+                # at a time, and weigh them like WordCloud.generate would
+                #
+                texts = df[feature]
+                del df
+                slices = 4 * workers if workers > 1 else 1
+                size = -(-len(texts) // slices) or 1
+                chunks = (texts.iloc[i:i + size] for i in range(0, len(texts), size))
+                frequencies = word_frequencies(chunks, stopwords, workers)
 
-            #
-            # Remove punctuation
-            #
-            regexp = RegexpTokenizer('\\w+')
-            df['text_token']=df[feature].apply(regexp.tokenize)
+            wordcloud = WordCloud(width=width,
+                                 height=height,
+                                 random_state=2,
+                                 max_font_size=100).generate_from_frequencies(frequencies)
 
-            #
-            # Remove stopwords
-            #
-            # import nltk
-            # nltk.download('stopwords')
+            plt.figure(figsize=(10, 7))
+            plt.imshow(wordcloud, interpolation='bilinear')
+            plt.axis('off')
+            plt.savefig(output)
 
-            # Make a list of english stopwords
-            stopwords = nltk.corpus.stopwords.words("english")
 
-            # Extend the list with your own custom stopwords
-            my_stopwords = []
-            if stop is not None:
-                with open(stop, "r") as f:
-                    for line in f:
-                        line = line.rstrip()
-                        if (line.startswith("#")):
-                            continue
-                        my_stopwords.append(line)
+#
+# The stopwords of the word cloud: NLTK's English stopwords, and those of the
+# --stop file, one per line (lines starting with # are skipped)
+#
+def cloud_stopwords(stop: str = None) -> frozenset:
+    words = nltk.corpus.stopwords.words("english")
+    if stop is not None:
+        with open(stop, "r") as f:
+            words.extend(line.rstrip() for line in f if not line.startswith("#"))
+    return frozenset(words)
 
-            stopwords.extend(my_stopwords)
 
-            df['text_token'] = df['text_token'].apply(lambda x: [item for item in x if item not in stopwords])
+#
+# Count the words of a chunk of the features column for the word cloud.
+# The text is lowercased and split into words (\w+); stopwords and words of
+# up to two characters are dropped, and what is left of each row is
+# lemmatized as a whole (or, with by_word, word by word). The rows are then
+# split again like
+# WordCloud.process_text does, and numbers dropped. Returns the counts of the
+# words and of the pairs of adjacent words that are not among WordCloud's own
+# stopwords, both in the order they first occur in, and the first and last
+# words of the chunk, to pair them up with the neighbouring chunks.
+#
+_WORD_RE = re.compile(r"\w+")
+_CLOUD_WORD_RE = re.compile(r"\w[\w']*") # The words of WordCloud.process_text
+_CLOUD_STOPWORDS = frozenset(w.lower() for w in WORDCLOUD_STOPWORDS)
+
+def count_words(texts: pd.Series, stopwords: frozenset, by_word: bool = False) -> tuple:
+    texts = texts.fillna("").astype(str).str.lower().str.findall(_WORD_RE)
+    if by_word:
+        text = " ".join([lemmatize(w) for words in texts for w in words if w not in stopwords and len(w) > 2])
+    else:
+        lemmatizer = WordNetLemmatizer()
+        rows = [" ".join([w for w in words if w not in stopwords and len(w) > 2]) for words in texts]
+        lemmas = {row: lemmatizer.lemmatize(row) for row in set(rows)}
+        text = " ".join([lemmas[row] for row in rows])
+
+    words = _CLOUD_WORD_RE.findall(text)
+    if "'" in text:
+        words = [w[:-2] if w.lower().endswith("'s") else w for w in words]
+    words = pd.Series(words, dtype=object)
+    words = words[~words.str.isdigit()].to_numpy() if len(words) else words.to_numpy()
+    if len(words) == 0:
+        return collections.Counter(), collections.Counter(), None, None
+    stop = pd.Series(words).str.lower().isin(_CLOUD_STOPWORDS).to_numpy()
+    keep = ~stop[:-1] & ~stop[1:]
+    pairs = pd.Series(words[:-1][keep]) + " " + pd.Series(words[1:][keep])
+    return _count(words[~stop]), _count(pairs), words[0], words[-1]
 
-            #
-            # Remove infrequent words
-            #
-            df['text_string'] = df['text_token'].apply(lambda x: ' '.join([item for item in x if len(item)>2]))
-            df[[feature, 'text_token', 'text_string']].head()
 
-            #
-            # Create a list of all words
-            #
-            all_words = ' '.join([word for word in df['text_string']])
+#
+# Lemmatize a word, remembering the lemmas of the most recent words
+#
+_LEMMA_CACHE_SIZE = 1 << 17
 
-            # Tokenize the words
-            tokenized_words = nltk.tokenize.word_tokenize(all_words)
+@functools.lru_cache(maxsize=_LEMMA_CACHE_SIZE)
+def lemmatize(word: str) -> str:
+    return _lemmatizer.lemmatize(word)
 
-            # Create a frequency distribution of the words
-            fdist = FreqDist(tokenized_words)
+_lemmatizer = WordNetLemmatizer()
 
-            # Create a dataframe of the most common words
-            df['text_string_fdist'] = df['text_token'].apply(lambda x: ' '.join([item for item in x if fdist[item] >= 1 ]))
-            # print(df[[feature, 'text_token', 'text_string', 'text_string_fdist']].head())
 
-            # Lemmatize the words
-            # import nltk
-            # nltk.download('wordnet')
-            # nltk.download('omw-1.4')
-            wordnet_lem = WordNetLemmatizer()
+#
+# Count values in the order they first occur in
+#
+def _count(values) -> collections.Counter:
+    codes, uniques = pd.factorize(values)
+    return collections.Counter(dict(zip(uniques, np.bincount(codes, minlength=len(uniques)).tolist())))
 
-            df['text_string_lem'] = df['text_string_fdist'].apply(wordnet_lem.lemmatize)
 
-            # check if the columns are equal
-            df['is_equal'] = (df['text_string_fdist']==df['text_string_lem'])
-            # print(df.head(100))
+#
+# Add up the counts of count_words over chunks, in a pool of processes if
+# workers > 1, and weigh them like WordCloud.process_text does: plurals are
+# merged into their singulars, and pairs of words that occur together more
+# often than by chance (collocations) are counted as one, taking their counts
+# from the words. Returns the frequencies for WordCloud.generate_from_frequencies.
+# The chunks are taken as they come: at most two per process are read ahead.
+#
+def word_frequencies(chunks, stopwords: frozenset, workers: int = 1, by_word: bool = False) -> dict:
+    words, pairs = collections.Counter(), collections.Counter()
+    last = None
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        if pool is None:
+            counts = (count_words(chunk, stopwords, by_word) for chunk in chunks)
+        else:
+            counts = _ordered_map(pool, count_words, chunks, 2 * workers, stopwords, by_word)
+        for chunk_words, chunk_pairs, first, chunk_last in counts:
+            if first is None:
+                continue
+            words.update(chunk_words)
+            if last is not None and last.lower() not in _CLOUD_STOPWORDS and first.lower() not in _CLOUD_STOPWORDS:
+                pairs[f"{last} {first}"] += 1 # The pair across the chunks
+            pairs.update(chunk_pairs)
+            last = chunk_last
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    n_words = sum(words.values())
+    words, forms = _merge_plurals(words)
+    pairs, _ = _merge_plurals(pairs)
+    frequencies = words.copy()
+    for pair, count in pairs.items():
+        first, second = (forms[w.lower()] for w in pair.split(" "))
+        if collocation_score(count, words[first], words[second], n_words) > 30:
+            frequencies[first] -= count
+            frequencies[second] -= count
+            frequencies[pair] = count
+    return {word: count for word, count in frequencies.items() if count > 0}
 
-            # Word Cloud
-            all_words_lem = ' '.join([word for word in df['text_string_lem']])
 
-            wordcloud = WordCloud(width=width,
-                                 height=height,
-                                 random_state=2,
-                                 max_font_size=100).generate(all_words_lem)
+#
+# Map a function over items in a pool, in order, with at most ahead items
+# submitted and not yet taken
+#
+def _ordered_map(pool, function, items, ahead: int, *args):
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.submit(function, item, *args))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
-            plt.figure(figsize=(10, 7))
-            plt.imshow(wordcloud, interpolation='bilinear')
-            plt.axis('off')
-            plt.savefig(output)
 
+#
+# Merge the counts of plurals into those of their singulars, if both occur
+# (cats into cat, but not class into clas). Returns the counts, and the word
+# each word is counted under.
+#
+def _merge_plurals(counts: collections.Counter) -> tuple:
+    merged = counts.copy()
+    forms = {word: word for word in counts}
+    for word in counts:
+        if word.endswith("s") and not word.endswith("ss") and word[:-1] in counts:
+            merged[word[:-1]] += merged.pop(word)
+            forms[word] = word[:-1]
+    return merged, forms
 
 
 #
@@ -639,35 +1109,55 @@ def table (
     head:       int  = typer.Option(0,         "--head",       "-h",          help="The number of header lines to skip"),
     all:        bool = typer.Option(False,     "--all",        "-a",          help="Whether to read all rows or not"),
     maxr:       int  = typer.Option(-1,        "--max",        "-m",          help="The number of rows to read. -1 for all rows"),
+    sample:     str  = typer.Option("head",    "--sample",                    help="How to pick the --max rows: head, reservoir, stratified, or ends"),
+    seed:       int  = typer.Option(0,         "--seed",                      help="The seed of the random sample"),
+    verify:     bool = typer.Option(False,     "--verify",                    help="Read the whole file for the columns whose sampled length is near a type boundary"),
+    stats:      bool = typer.Option(False,     "--stats",                     help="Show the missing, distinct, smallest, largest, and most frequent values of each column"),
+    stats_json: str  = typer.Option(None,      "--stats-json",                help="The JSON file to write the column statistics to"),
+    workers:    int  = typer.Option(1,         "--workers",    "-j",          help="The number of processes to compute the statistics with"),
+    repair:     bool = typer.Option(False,     "--repair",                    help="Repair broken quoting, as csvclean.sh does, while reading"),
     names:      List[str] = typer.Option(None, "--names",      "-n",          help="If you want to rename columns"),
     formats:    List[str] = typer.Option(None, "--formats",    "-f",          help="The formats to use for the specified columns"),
     default:    str  = typer.Option("DEFAULT NULL",  "--default",    "-D",    help="The default value to use for the specified columns"),
     compressed: bool = typer.Option(False,     "--compressed", "-c",          help="Whether to use ROW_FORMAT=COMPRESSED or not"),
     idx:        Optional[List[str]] = typer.Option(None, "--index", "-i",     help="The index to use for the table"),
+    execute:    bool = typer.Option(False,     "--execute",    "-x",          help="Whether to run the statements on the database or not (implies -t)"),
+    local_infile: bool = typer.Option(False,   "--local",                     help="Use LOAD DATA LOCAL INFILE, to load the file from the client"),
+    disable_keys: bool = typer.Option(False,   "--disable-keys",              help="Disable keys and unique checks while loading"),
+    dbhost:     str  = typer.Option("tc",      "--dbhost",     "-dh",         help="The database host to connect to"),
+    dbport:     int  = typer.Option(3306,      "--dbport",     "-dp",         help="The database port to connect to"),
+    dbuser:     str  = typer.Option("tc",      "--dbuser",     "-du",         help="The database user to connect as"),
+    dbpass:     str  = typer.Option("sap123",  "--dbpass",     "-dw",         help="The database password to connect with"),
+    dbschema:   str  = typer.Option("tc",      "--dbschema",   "-ds",         help="The database schema to connect to"),
+    dbspecial:  str  = typer.Option(None,      "--dbspecial",  "-dss",        help="The database specials to use for the connection"),
+    dbtype:     str  = typer.Option("mysql+pymysql",           "--dbtype",    help="The database type"),
+    dbargs:     str  = typer.Option('{"connect_timeout": 10}', "--dbargs",    help="The database connection arguments to use"),
     files:      Optional[List[str]] = typer.Argument(None,                    help="The files to process; optionally use = to specify the table name"),
 ) -> None:
     """
     Parse CSV or XLSX files to analyze the data and optionally generate create table statements.
     """
 
-    #
-    # Set the global separator
-    #
-    global _separator
-    if sepr is not None:
-        _separator = sepr
-
     if len(files) == 0: # len(ctx.args) == 0:
         print("Please specify a file name.")
         sys.exit(1)
+    elif sample not in _SAMPLINGS:
+        print(f"Invalid sample {sample}. Use one of {', '.join(_SAMPLINGS)}.")
+        sys.exit(1)
+    elif (stats or stats_json) and sample != "head":
+        print("The --stats option reads the rows in order, and cannot be used with --sample.")
+        sys.exit(1)
+    elif repair and sample != "head":
+        print("The --repair option reads the rows in order, and cannot be used with --sample.")
+        sys.exit(1)
     else:
+        table = table or execute # The statements to run are those of the table
+        profiles = {} # The column statistics of each file, for --stats-json
         for file in files: #ctx.args:
             cols = []
             hdrs = []
-            maxl = 0
-            sum_field_length = 0
             result = ""
-            hash_result = ""
+            sampled = None
 
             tablename=file
             if file.find("=") > -1:
@@ -675,84 +1165,97 @@ def table (
                 file = temp[0]
                 tablename = temp[1]
             else:
-                tablename = Path(file).stem
+                tablename = _file_stem(file)
                 if prefix != "": # If we have a prefix, we add it to the table name
                     dbtable = f"{prefix}{tablename}"
 
 
             abs_path = path.abspath(file)
 
-            nrows = file_len(file)
+            file_ext, compression = _file_format(file)
             with Progress() as progress: # Create a progress bar
-                task = progress.add_task(f"Parsing {file}", total=nrows)
-                if all:
-                    df = read_file(file, sepr, -1, head)
+                if compression: # Compressed files report their progress on the compressed bytes
+                    task = progress.add_task(f"Parsing {file}", total=os.path.getsize(file))
+                    advance = None
                 else:
-                    df = read_file(file, sepr, maxr, head)
-
-                #
-                # If asked to rename columns, do it
-                #
-                rename = {}
-                if names:
-                    for col in names:
-                        if col.find("=") == -1:
-                            print("Please specify a column name or its index and its alternate name using =")
-                            sys.exit(1)
-                        else:
-                            temp = col.split("=")
-                            key, new_name = temp[0], temp[1]
-                            # if key is digit, we assume it to be index
-                            if key.isdigit():
-                                key = int(key) - 1 # convert 1-based index to 0-based index
-                                if key >= len(df.columns) or key < 0:
-                                    print("Index is out of range.")
-                                    sys.exit(1)
-                                else:
-                                    df.columns.values[key] = new_name
-                            else: # key is column name
-                                rename[key] = new_name
-
-                if rename:
-                    df = df.rename(columns=rename)
-
+                    task = progress.add_task(f"Parsing {file}", total=file_len(file))
+                    advance = lambda n: progress.update(task, advance=n)
 
                 #
                 # Skip rows
                 #
-                rows = 0
                 rows_skipped = 0
 
                 if head is not None and head > 0:
                     rows_skipped = head
 
-
                 #
-                # Get the column names and lengths
+                # Get the column names and the maximum length of each column:
+                # CSV files are scanned directly, everything else goes through pandas
                 #
-                hdrs = []
-                for hdr in df.columns:
-                    #hdr = hdr.lower()
-                    #hdr = re.sub(r'[^^a-zA-Z0-9,]', '_', hdr)
-                    maxl = len(hdr) if maxl < len(hdr) else maxl
-                    hdrs.append(hdr)
+                rows_max = -1 if all else maxr
+                separator = sepr
+                if file_ext == ".csv":
+                    dialect = sniff_dialect(file)
+                    separator = sepr or dialect["delimiter"]
+                scannable = file_ext == ".csv" and not compression and not repair and len(separator) == 1 and dialect["encoding"] in _SCAN_ENCODINGS
+                if sample != "head" and rows_max > 0: # Estimate the lengths from a sample of the rows
+                    hdrs, lengths, total = sample_lengths(file, sepr, head, rows_max, sample, seed)
+                    cols, rows = list(lengths.max(axis=0)) if len(lengths) else [0] * len(hdrs), len(lengths)
+                    chances, projected = length_confidence(lengths, total)
+                    sampled = [[chance, limit, near_boundary(int(length), limit), None] for chance, length, limit in zip(chances, cols, projected)]
+                    if verify: # Read the whole file for the columns that may cross a type boundary
+                        check = [i for i, (_, _, boundary, _) in enumerate(sampled) if boundary is not None]
+                        if check and scannable:
+                            exact = scan_lengths(file, separator, head, -1, 0, quotechar=dialect["quotechar"],
+                                                 escapechar=dialect["escapechar"], encoding=dialect["encoding"], advance=advance)[1]
+                        elif check:
+                            exact = profile_lengths(read_file_chunks(file, sepr, -1, head, columns=[hdrs[i] for i in check], repair=repair))[1]
+                            exact = dict(zip(check, exact))
+                        for i in check:
+                            sampled[i][3] = cols[i] = exact[i]
+                elif stats or stats_json: # Profile the values, too, in the same pass
+                    profiled = scan_stats(file, separator, head, rows_max, rows_skipped, quotechar=dialect["quotechar"], escapechar=dialect["escapechar"],
+                                          encoding=dialect["encoding"], advance=advance, workers=workers) if scannable else None
+                    if profiled is None:
+                        chunks = read_file_chunks(file, sepr, rows_max, head,
+                                                  progress=(lambda n: progress.update(task, completed=n)) if compression else None, repair=repair)
+                        profiled = profile_stats(chunks, rows_skipped, advance, workers)
+                    hdrs, cols, rows, column_stats = profiled
+                elif scannable:
+                    hdrs, cols, rows = scan_lengths(file, separator, head, rows_max, rows_skipped, quotechar=dialect["quotechar"],
+                                                    escapechar=dialect["escapechar"], encoding=dialect["encoding"], advance=advance)
+                else:
+                    chunks = read_file_chunks(file, sepr, rows_max, head,
+                                              progress=(lambda n: progress.update(task, completed=n)) if compression else None, repair=repair)
+                    hdrs, cols, rows = profile_lengths(chunks, rows_skipped, advance=advance)
+                cols = [int(length) for length in cols]
 
-                #
-                # Iterate through the rows
-                #
-                for index, row in df.iterrows():
-                    progress.update(task, advance=1)
-                    rows += 1
-                    if rows_skipped > 0:
-                        rows_skipped -= 1
-                        continue
-                    col = 0
-                    for item in row:
-                        if col >= len(cols):
-                            cols.append(len(f"{item}"))
-                        else:
-                            cols[col] = len(f"{item}") if cols[col] < len(f"{item}") else cols[col]
-                        col += 1
+            #
+            # If asked to rename columns, do it
+            #
+            rename = {}
+            if names:
+                for col in names:
+                    if col.find("=") == -1:
+                        print("Please specify a column name or its index and its alternate name using =")
+                        sys.exit(1)
+                    else:
+                        temp = col.split("=")
+                        key, new_name = temp[0], temp[1]
+                        # if key is digit, we assume it to be index
+                        if key.isdigit():
+                            key = int(key) - 1 # convert 1-based index to 0-based index
+                            if key >= len(hdrs) or key < 0:
+                                print("Index is out of range.")
+                                sys.exit(1)
+                            else:
+                                hdrs[key] = new_name
+                        else: # key is column name
+                            rename[key] = new_name
+
+            if rename:
+                hdrs = [rename.get(hdr, hdr) for hdr in hdrs]
 
             #
             # Create the table header
@@ -765,8 +1268,6 @@ def table (
 
             if table:
                 tablename = tablename.lower()
-                result += f"DROP {temporary}TABLE IF EXISTS `{prefix}{tablename}`;\n"
-                result += f"CREATE {temporary}TABLE `{prefix}{tablename}` (\n"
 
 
             #
@@ -787,25 +1288,16 @@ def table (
             #
             # Create the table content
             #
-            maxl += 4  # Add some space
-            for i, hdr in enumerate(hdrs):
-                hdr_str = f"`{hdr}`".ljust(maxl)
-                sum_field_length += cols[i]
-                add_line = ""
-                if table:
-                    add_line += f"  {hdr_str} "# varchar({cols[i]})"
-                    if hdr in hdr_formats:
-                        add_line += hdr_formats[hdr].replace("?","%s" % cols[i])
-                    else:
-                        add_line += "varchar(%s)" % cols[i]
-                        if default is not None and default != "":
-                            add_line += f" {default}"
-                    add_line += "," if i < len(hdrs)-1 or len(idx) >= 0 else ""
-                    add_line += "\n"
-                else:
-                    add_line += f"{i+1:2} {hdr_str} : {cols[i]:3}\n"
-                result += add_line
-                hash_result += add_line
+            sum_field_length = sum(cols)
+            if table:
+                defs = column_defs(hdrs, cols, hdr_formats, default)
+                hash_result = "".join(f"{line},\n" for line in defs) # The hash has always been taken with a comma after each column
+                result += ";\n".join(create_table_sql(f"{prefix}{tablename}", defs, temporary, compressed)) + ";\n\n"
+            else:
+                maxl = max((len(hdr) for hdr in hdrs), default=0) + 4 # Add some space
+                for i, hdr in enumerate(hdrs):
+                    result += f"{i+1:2} {f'`{hdr}`'.ljust(maxl)} : {cols[i]:3}\n"
+                hash_result = result
 
 
             #
@@ -817,36 +1309,35 @@ def table (
 
 
             #
-            # Create the table footer
+            # Create the load statement
             #
             if table:
-                if(len(idx) > 0):
-                    for i, idx_col in enumerate(idx):
-                        result += f"  index({idx_col})"
-                        result += "," if i < len(idx)-1 else ""
-                        result += "\n"
-                result += ") ENGINE=InnoDB"
-
-                if compressed and temporary == "":
-                    result += f" ROW_FORMAT=COMPRESSED"
-
-                result += " DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;"
-
-                result += ";\n\n"
-
-                file = path.basename(file)
-                if dir is not None:
-                    result += f"load data infile '{dir}/{file}' into table `{prefix}{tablename}`\n"
+                local = "local " if local_infile else ""
+                if dir is not None and not local: # With local, the client reads the file, so we use its own path
+                    load = f"load data {local}infile '{dir}/{path.basename(file)}' into table `{prefix}{tablename}`\n"
                 else:
-                    result += f"load data infile '{abs_path}' into table `{prefix}{tablename}`\n"
-                result += f"  fields terminated by '{sepr}'\n"
-                result += "  optionally enclosed by '\"'\n"
-                result += "  ignore "
+                    load = f"load data {local}infile '{abs_path}' into table `{prefix}{tablename}`\n"
+                load += f"  fields terminated by '{separator}'\n"
+                load += "  optionally enclosed by '\"'\n"
+                if file_ext == ".csv" and dialect["lineterminator"] != "\n": # The default is \n
+                    load += f"  lines terminated by '{dialect['lineterminator'].encode('unicode_escape').decode()}'\n"
+                load += "  ignore "
                 if head is not None and head > 0:
-                    result += f"{head + 1}"
+                    load += f"{head + 1}"
                 else:
-                    result += "1"
-                result += " rows;\n"
+                    load += "1"
+                load += " rows"
+                result += load + ";\n"
+
+                #
+                # Create the indices after loading the data, which is
+                # faster than keeping them up to date row by row
+                #
+                index = None
+                if idx:
+                    index = f"alter table `{prefix}{tablename}`\n"
+                    index += ",\n".join(f"  add index({idx_col})" for idx_col in idx)
+                    result += f"\n{index};\n"
 
             #
             # Add the total field length and the hash to the result
@@ -855,10 +1346,53 @@ def table (
             formatted_length = "{:,}".format(sum_field_length)
             result += f"\n-- Rows: {formatted_rows}. Sum of Field Lengths: {formatted_length}. Hash: {hash_str}.\n"
 
+            #
+            # For a sample, add how likely no row is longer than the sampled
+            # maximum, for each column
+            #
+            if sampled is not None:
+                maxl = max((len(hdr) for hdr in hdrs), default=0) + 4 # Add some space
+                result += f"-- Sampled {rows:,} of about {total:,} rows ({sample}). The chance that no row is longer,\n"
+                result += "-- and the length that no row exceeds with 95% probability:\n"
+                for i, (hdr, (chance, limit, boundary, exact)) in enumerate(zip(hdrs, sampled)):
+                    result += f"-- {i+1:2} {f'`{hdr}`'.ljust(maxl)} : {cols[i]:3} {chance:7.1%} {limit:6,}"
+                    if exact is not None:
+                        result += f"  verified (near {boundary:,})"
+                    elif boundary is not None:
+                        result += f"  near {boundary:,}; check with --verify"
+                    result += "\n"
+
             #
             # Return the result
             #
             print(result)
+            if stats:
+                print_stats(column_stats, hdrs, Console())
+            if stats_json is not None:
+                profiles[file] = [{**s.as_dict(), "column": hdr} for hdr, s in zip(hdrs, column_stats)]
+
+            #
+            # If asked to, run the statements on the database
+            #
+            if execute and table:
+                if file_ext != ".csv" or compression:
+                    print(f"Only uncompressed CSV files can be loaded with --execute; skipping {file}.")
+                    continue
+                engine = make_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial,
+                                     json.dumps({**json.loads(dbargs or "{}"), "local_infile": True}) if local_infile else dbargs,
+                                     engines=served_engines(ctx))
+                if engine.dialect.name != "mysql":
+                    print("LOAD DATA INFILE needs a MySQL database; please use parse --db for other databases.")
+                    sys.exit(1)
+                execute_load(engine, f"{prefix}{tablename}", create_table_sql(f"{prefix}{tablename}", defs, temporary, compressed),
+                             load, index, disable_keys)
+
+        #
+        # Write the column statistics, if asked to
+        #
+        if stats_json is not None:
+            with open(stats_json, "w") as f:
+                json.dump(profiles, f, indent=2, default=str)
 
 
 #
@@ -873,6 +1407,16 @@ def parse (
     headp:      int  = typer.Option(0,         "--headp",     "-H",          help="The number of header lines to skip when showing"),
     all:        bool = typer.Option(False,     "--all",       "-a",          help="Whether to read all rows or not"),
     longest:    bool = typer.Option(False,     "--longest",   "-l",          help="Show the row with the longest value for each column"),
+    compact:    bool = typer.Option(False,     "--compact",                  help="Keep the data in memory-compact form (Arrow strings, categoricals)"),
+    profile:    bool = typer.Option(False,     "--profile",                  help="Show the time, rows, and memory of each stage"),
+    profile_json: str = typer.Option(None,     "--profile-json",             help="The JSON file to write the profile trace to"),
+    pstats:     str  = typer.Option(None,      "--pstats",                   help="The file to write cProfile statistics to"),
+    external:   bool = typer.Option(False,     "--external",                 help="Process the file in chunks and sort it on disk, for files larger than memory"),
+    chunk_rows: int  = typer.Option(1000000,   "--chunk-rows",               help="The number of rows per chunk with --external"),
+    cache:      bool = typer.Option(False,     "--cache",                    help="Cache the cleaned data, for runs that only change queries, order, or output"),
+    cache_size: int  = typer.Option(2048,      "--cache-size",               help="The maximum size of the cache in MB"),
+    offsets:    bool = typer.Option(False,     "--offsets",                  help="Index the row offsets of the file once, and seek to --head with it"),
+    repair:     bool = typer.Option(False,     "--repair",                   help="Repair broken quoting, as csvclean.sh does, while reading"),
     maxr:       int  = typer.Option(10,        "--max",       "-m",          help="The number of rows to read. -1 for all rows"),
     maxp:       int  = typer.Option(-1,        "--maxp",      "-M",          help="The number of rows to show. -1 for all rows"),
     columns:    List[str] = typer.Option(None, "--columns",   "-c",          help="The columns to show and their alternate names"),
@@ -882,6 +1426,8 @@ def parse (
     replace:    List[str] = typer.Option(None, "--replace",   "-r",          help="The regular expressions to apply to the specified columns"),
     formats:    List[str] = typer.Option(None, "--formats",   "-f",          help="The formats to use for the specified columns"),
     unique:     List[str] = typer.Option(None, "--unique",    "-u",          help="The columns to unique on"),
+    unique_verify: bool = typer.Option(False,  "--unique-verify",            help="Compare the keys, not just their hashes, with --unique and --external"),
+    unique_partitions: int = typer.Option(0,   "--unique-partitions",        help="The number of partitions to spill the keys to disk with --unique and --external"),
     order:      List[str] = typer.Option(None, "--order",     "-o",          help="The sort order to use for the specified columns"),
     case_sens:  bool = typer.Option(False,     "--case",                     help="Whether to use case-sensitive sorting or not"),
     ascsv:      bool = typer.Option(False,     "--csv",                      help="Whether to output in CSV format or not"),
@@ -893,12 +1439,17 @@ def parse (
     assql:      bool = typer.Option(False,     "--sql",                      help="Whether to output in SQL format or not"),
     db:         bool = typer.Option(False,     "--db",        "-db",         help="Whether to write to the database or not"),
     chunk_size: int  = typer.Option(10000,     "--chunk_size","-cs",         help="The chunksize to use for writing to the database"),
+    db_workers: int  = typer.Option(1,         "--db-workers",               help="The number of connections to write to the database with in parallel"),
+    db_async:   int  = typer.Option(0,         "--db-async",                 help="The number of tables to write at once over an asyncio engine, for many files"),
+    idx:        Optional[List[str]] = typer.Option(None, "--index", "-i",     help="The indices to create after writing to the database"),
+    staging:    bool = typer.Option(False,     "--staging",                  help="Write to a staging table, and swap it in when done"),
+    compressed_db: bool = typer.Option(False,  "--compressed",               help="Whether to use ROW_FORMAT=COMPRESSED for the database table or not"),
     dbtable:    str  = typer.Option(None,      "--table",     "-t",          help="The database table to write to"),
     prefix:     str  = typer.Option("",        "--prefix",    "-p",          help="The prefix to use for the table name"),
     dbhost:     str  = typer.Option("tc",      "--dbhost",    "-dh",         help="The database host to connect to"),
     dbport:     int  = typer.Option(3306,      "--dbport",    "-dp",         help="The database port to connect to"),
     dbuser:     str  = typer.Option("tc",      "--dbuser",    "-du",         help="The database user to connect as"),
-    dbpass:     str  = typer.Option("sap123",  "--dbpass",    "-dp",         help="The database password to connect with"),
+    dbpass:     str  = typer.Option("sap123",  "--dbpass",    "-dw",         help="The database password to connect with"),
     dbschema:   str  = typer.Option("tc",      "--dbschema",  "-ds",         help="The database schema to connect to"),
     dbspecial:  str  = typer.Option(None,      "--dbspecial", "-dss",        help="The database specials to use for the connection"),
     dbtype:     str  = typer.Option("mysql+pymysql",           "--dbtype",   help="The database type"),
@@ -909,13 +1460,6 @@ def parse (
     Parse CSV or XLSX files to analyze, convert and optionally load the data into a database.
     """
 
-    #
-    # Set the global separator
-    #
-    global _separator
-    if sepr is not None:
-        _separator = sepr
-
     if len(files) == 0: # len(ctx.args) == 0:
         print("Please specify a file name.")
         sys.exit(1)
@@ -959,294 +1503,138 @@ def parse (
                         rename_by_name[key] = new_name
 
 
+        if external and longest:
+            print("The --longest option needs the whole file, and cannot be used with --external.")
+            sys.exit(1)
+        if repair and offsets:
+            print("The row offsets are those of the file as it is, and --offsets cannot be used with --repair.")
+            sys.exit(1)
+        if (unique_verify or unique_partitions) and not (external and unique):
+            print("The --unique-verify and --unique-partitions options only apply to --unique with --external.")
+            sys.exit(1)
+
+        #
+        # Profile the stages, if asked to
+        #
+        profiler = Profiler(profile or profile_json is not None)
+        if pstats is not None:
+            import cProfile
+            cprofiler = cProfile.Profile()
+            cprofiler.enable()
+
+        #
+        # The stages of parse for each file, from reading it to sorting it
+        #
+        pipeline = Pipeline(sepr, head, -1 if maxr == -1 or all else maxr, rename={**rename_by_index, **rename_by_name},
+                            columns=selected_columns, omit=omit, replace=replace, query=query, unique=unique, order=order,
+                            case_sens=case_sens, compact=compact, chunk_rows=chunk_rows, formats=formats,
+                            unique_verify=unique_verify, unique_partitions=unique_partitions, offsets=offsets, repair=repair,
+                            longest=longest, cache_size=cache_size << 20 if cache else 0, profiler=profiler)
+
         #
         # Read the files
         #
+        engine = None
+        runner = None # Writes tables in the background with --db-async
         for file in files: #ctx.args:
+            profiler.start(file)
+            if profiler.enabled and _file_format(file)[0] == '.csv': # Sniff up front, so that it is timed on its own
+                sniff_dialect(file)
+                profiler.lap("sniff")
+
             #
-            # Read the file
+            # For files larger than memory, transform the file chunk by chunk,
+            # drop duplicates by their hashes, and sort it on disk; CSV output is
+            # then written as it comes. Otherwise, with --cache, the pipeline
+            # starts from the cleaned frame of an earlier run with the same file
+            # and options, if there is one.
             #
-            if formats:
-                #
-                # If we have types, we need to apply them
-                #
-                import math
-                converters = {}
-                converter_dict = {
-                    'int':   lambda x: int(re.sub(r'[^0-9.]', '', x)) if isinstance(x, str) else x if isinstance(x, int) else pd.NA,
-                    'float': lambda x: float(re.sub(r'[^0-9.]', '', x)) if isinstance(x, str) else x if isinstance(x, float) else pd.NA,
-                    'str':   str,
-                }
-                for t in formats:
-                    col, col_type = t.split("=")
-                    #
-                    # If the type is date, we need to parse the format
-                    # This is hard: we need to find the date format, and the output format.
-                    # We then need to create lambda functions that will convert the date to the output format.
-                    # As we need to create a given format for each given column, we need to use eval() to create the lambda function.
-                    # This is not safe, but as a simple command line tool, not too much of a problem.
-                    #
-                    if col_type.startswith("date"):
-                        m = re.search('date\\((.*?)\\)\\((.*?)\\)', col_type)
-                        if m:
-                            date_type = m.group(1)
-                            output_format = m.group(2)
-                            converter_dict[col] = eval(f"lambda x: pd.to_datetime(x, format=\"{date_type}\").strftime(\"{output_format}\") if x and pd.to_datetime(x, format=\"{date_type}\") is not pd.NaT else None")
-                            col_type="date"
-                        else:
-                            print(f"Missing date format for column {col}. Skipping.")
-                    if col_type in converter_dict: # For a normal type, we just use the converter
-                        converters[col] = converter_dict[col_type]
-                    elif col_type == "date": # For a date, we use the converter we created above
-                        converters[col] = converter_dict[col]
-                    else: # For anything else, we skip
-                        print(f"Invalid type {col_type} for column {col}. Skipping.")
+            if external:
+                chunks = pipeline.stream(file)
+                if ascsv:
+                    pipeline.write_csv(chunks, sys.stdout, file, headp, maxp)
+                    profiler.lap("external")
+                    continue
+                df = pd.concat(chunks, ignore_index=True)
+                profiler.lap("external", df)
+            else:
+                df = pipeline.run(file)
 
-                #
-                # Read in the file
-                #
-                if maxr == -1 or all:
-                    df = read_file(file, sepr, -1, head, converters)
-                else:
-                    df = read_file(file, sepr, maxr, head, converters)
 
             #
-            # If we don't have types, we can just read the file
+            # If asked to output in HTML format, do it
             #
-            else:
-                if maxr == -1 or all:
-                    df = read_file(file, sepr, -1, head)
+            if ashtml:
+                if maxp > -1:
+                    print(df.iloc[headp:].head(maxp).to_html(index=False))
                 else:
-                    df = read_file(file, sepr, maxr, head)
+                    print(df.iloc[headp:].to_html(index=False))
 
-
-            if longest:
-                df['Line Number'] = df.index + 1 + head  # +1 because index starts from 0, and adjust for header lines skipped
-
-                # Initialize lists to store the maximum length and corresponding row index for each column
-                max_lengths = []
-                max_row_indices = []
-
-                for index, row in df.iterrows():
-                    #progress.update(task, advance=1)
-                    #rows += 1
-                    #if rows_skipped > 0:
-                    #    rows_skipped -= 1
-                    #    continue
-
-                    for col, item in enumerate(row):
-                        item_length = len(str(item))
-                        if col >= len(max_lengths):
-                            max_lengths.append(item_length)
-                            max_row_indices.append(index)
-                        else:
-                            if item_length > max_lengths[col]:
-                                max_lengths[col] = item_length
-                                max_row_indices[col] = index
-
-                # Filter the dataframe to get rows with the longest values
-                longest_rows_df = df.loc[max_row_indices].drop_duplicates()
-
-                # Replace the original dataframe with the new one
-                df = longest_rows_df
-
-
-
-
-
-            #
-            # If asked to rename columns, do it
-            #
-            if rename_by_index:
-                for key in rename_by_index.keys():
-                    if key >= len(df.columns):
-                        print(f"Column index {key+1} is out of range.")
-                        sys.exit(1)
-                    else:
-                        df.columns.values[key] = rename_by_index[key]
-            if rename_by_name:
-                df = df.rename(columns=rename_by_name)
-
-
-
-            #
-            # If asked to select, and reorder columns, do it
-            #
-            if selected_columns:
-                df = df[selected_columns]
-
-            #
-            # If asked to omit columns, do it
-            #
-            if omit:
-                for col in omit:
-                    if col in df.columns:
-                        df = df.drop(col, axis=1)
-
-            #
-            # Replace NaN with ""
-            #
-            df = df.fillna("")
-
-            #
-            # If asked to do regexes, do them
-            #
-            if replace:
-                replace_columns = {}
-                for rep in replace:
-                    temp = rep.split("=")
-                    if len(temp) == 2:
-                        replace_columns[temp[0]] = temp[1]
-                    else:
-                        replace_columns[temp[0]] = temp[1]
-                    if replace_columns:
-                        for col in replace_columns:
-                            if col in df.columns:
-                                rep = replace_columns[col]
-                                match = re.match(r's/([^/]*)/([^/]*)/([g|i]*)', rep)
-                                if match:
-                                    search, replace, flags = match.groups()
-                                    if 'g' in flags:
-                                        df[col] = df[col].apply(lambda x: re.sub(search, replace, x))
-                                    else:
-                                        df[col] = df[col].apply(lambda x: re.sub(search, replace, x, 1))
-                                else:
-                                    print(f"Invalid replace string {rep}")
-
-            #
-            # Replace \u00A0 (Non breaking space) with ""; these appear
-            # to sometimes come from Excel, and cause problems with
-            # queries using ==.
-            df = df.replace("\u00A0", "", regex=True)
-
-            #
-            # If we are asked to query, do it
-            #
-            if query:
-                for q in query:
-                    q = re.sub(r'(\w+) contains "(.*)"', r'\1.str.contains("\2")', q) # form proper contains query
-                    q = q.replace("=", "==") # replace == with =, as == is hard to type
-                    q = q.replace("!==", "!=") # replace !== with !=, as !== is wrong
-                    df = df.query(f"{q}", engine='python') # This is safe, as we are using pandas
-
-            #
-            # If asked to drop duplicates, do it
-            #
-            if unique:
-                df = df.drop_duplicates(unique)
-
-            #
-            # If asked to sort, do it
-            #
-            if order:
-                sortvalues = []
-                sortorders = []
-                for o in order:
-                    if o.startswith("-"):
-                        sortvalues.append(o[1:])
-                        sortorders.append(False)
-                    else:
-                        sortvalues.append(o)
-                        sortorders.append(True)
-                if case_sens:
-                    df = df.sort_values(sortvalues, ascending=sortorders, kind='quicksort', na_position='last')
-                else:
-                    df = df.sort_values(sortvalues, ascending=sortorders, kind='quicksort', na_position='last', key=lambda x: x.str.lower() if isinstance(x, str) else x )
-
-
-            #
-            # If asked to output in HTML format, do it
-            #
-            if ashtml:
-                if maxp > -1:
-                    print(df.iloc[headp:].head(maxp).to_html(index=False))
-                else:
-                    print(df.iloc[headp:].to_html(index=False))
-
-            #
-            # If asked to output in markdown format, do it
-            #
-            elif asmd:
-                if maxp > -1:
-                    print(df.iloc[headp:].head(maxp).to_markdown(index=False))
-                else:
-                    print(df.iloc[headp:].to_markdown(index=False))
+            #
+            # If asked to output in markdown format, do it
+            #
+            elif asmd:
+                if maxp > -1:
+                    print(df.iloc[headp:].head(maxp).to_markdown(index=False))
+                else:
+                    print(df.iloc[headp:].to_markdown(index=False))
 
             #
             # If asked to output in SQL format, do it
             #
             elif assql:
-                if dbtable is None: # If no table name is given, we use the file name
-                    dbtable = Path(file).stem # We use the stem of the file name, without the extension
-                if prefix != "": # If we have a prefix, we add it to the table name
-                    dbtable = f"{prefix}{dbtable}"
-                if dbargs is not None:
-                    connect_args = json.loads(dbargs)
-                else:
-                    connect_args = {}
-                if dbspecial is not None:
-                    dbspecial = f"?{dbspecial}"
-                else:
-                    dbspecial = ""
-                engine=create_engine(f"{dbtype}://{dbuser}:{dbpass}@{dbhost}:{dbport}/{dbschema}{dbspecial}", echo=True, connect_args=connect_args)
-                sql_stmt = sql.get_schema(df, dbtable, con=engine)
-                print(f"{sql_stmt}")
+                tablename = dbtable if dbtable is not None else _file_stem(file) # If no table name is given, we use the stem of the file name
+                tablename = f"{prefix}{tablename}" # If we have a prefix, we add it to the table name
+                dialect = offline_dialect(dbtype)
+                df = df.iloc[headp:].head(maxp) if maxp > -1 else df.iloc[headp:] # The rows --db would write
+                create = create_table_sql(tablename, frame_defs(df, dialect), compressed=compressed_db, mysql=dialect.name == "mysql",
+                                          quote=dialect.identifier_preparer.quote_identifier)[1]
+                print(f"{create};")
 
             #
             # If asked to write to DB, do it
             #
             elif db:
-                if dbtable is None: # If no table name is given, we use the file name
-                    dbtable = Path(file).stem # We use the stem of the file name, without the extension
-                if prefix != "": # If we have a prefix, we add it to the table name
-                    dbtable = f"{prefix}{dbtable}"
-                if dbargs is not None: # If we have DB args, we use them
-                    connect_args = json.loads(dbargs)
-                else:
-                    connect_args = {}
-
+                tablename = dbtable if dbtable is not None else _file_stem(file) # If no table name is given, we use the stem of the file name
+                tablename = f"{prefix}{tablename}" # If we have a prefix, we add it to the table name
                 if maxp > -1:
                     df = df.iloc[headp:].head(maxp)
                 else:
                     df = df.iloc[headp:]
 
                 total_rows = len(df)
-                if chunk_size > total_rows:
-                    chunk_size = total_rows//1000 # Calculate the chunk size
-                    if chunk_size == 0:
-                        chunk_size = total_rows // 100
-                        if chunk_size == 0 or chunk_size < 100:
-                            chunk_size = 100
-                if dbspecial is not None:
-                    dbspecial = f"?{dbspecial}"
-                else:
-                    dbspecial = ""
-                engine=create_engine(f"{dbtype}://{dbuser}:{dbpass}@{dbhost}:{dbport}/{dbschema}{dbspecial}", echo=False, connect_args=connect_args) # We create the engine
+                rows_per_chunk = chunk_size
+                if rows_per_chunk > total_rows:
+                    rows_per_chunk = total_rows//1000 # Calculate the chunk size
+                    if rows_per_chunk == 0:
+                        rows_per_chunk = total_rows // 100
+                        if rows_per_chunk == 0 or rows_per_chunk < 100:
+                            rows_per_chunk = 100
 
                 #
-                # First drop the table
+                # With --db-async, the tables are written in the background over
+                # an asyncio engine, while we go on with the next file
                 #
-                try:
-                    meta = MetaData() # We create the metadata
-                    table = Table(dbtable, meta)
-                    insp = inspect(engine)
-                    if dbtable in insp.get_table_names():
-                        table = Table(dbtable, meta, autoload_with=engine)
-                        table.drop(bind=engine, checkfirst=True)
-                except exc.NoSuchTableError:
-                    pass #print(f"Table {dbtable} does not exist.")
+                if db_async > 0:
+                    if runner is None:
+                        engine = make_async_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs, pool_size=db_async)
+                        runner = AsyncRunner(async_limit(engine, db_async))
+                elif engine is None:
+                    engine = make_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs, pool_size=db_workers,
+                                         engines=served_engines(ctx)) # We create the engine
 
                 #
-                # Insert the data
+                # Replace the table with the data, its columns sized to the
+                # data as the table command does
                 #
+                if runner is not None:
+                    runner.submit(pipeline.write_async(df, tablename, engine, rows_per_chunk, idx, staging, compressed_db))
+                    profiler.lap("write", df)
+                    continue
                 with Progress() as progress:
-                    task = progress.add_task(f"Writing {total_rows} in chunks of {chunk_size} to {dbtable}", total=total_rows)
-                    for i, chunk in enumerate(np.array_split(df, total_rows // chunk_size + 1)):
-                        chunk.to_sql(dbtable, engine, if_exists='append', index=False)
-                        progress.update(task, advance=chunk_size)
-                        connection = engine.raw_connection()
-                        connection.commit()
-                print(f"Done writing [magenta]{total_rows}[/magenta] rows to [green]{dbtable}[/green].")
+                    task = progress.add_task(f"Writing {total_rows} in chunks of {rows_per_chunk} to {tablename}", total=total_rows)
+                    pipeline.write(df, tablename, engine, rows_per_chunk, db_workers, idx, staging, compressed_db, progress, task)
+                print(f"Done writing [magenta]{total_rows}[/magenta] rows to [green]{tablename}[/green].")
 
             #
             # If asked to output in JSON format, do it
@@ -1280,12 +1668,7 @@ def parse (
             # Otherwise, output in table format
             #
             elif ascsv:
-                if sepr is None:
-                    sepr = _separator
-                if maxp > -1:
-                    df.iloc[headp:].head(maxp).to_csv(sys.stdout, sep=sepr, index=False, quoting=csv.QUOTE_NONNUMERIC, quotechar='"',escapechar='\\')
-                else:
-                    df.iloc[headp:].to_csv(sys.stdout, sep=sepr, index=False, quoting=csv.QUOTE_NONNUMERIC, quotechar='"',escapechar='\\')
+                pipeline.write_csv(df, sys.stdout, file, headp, maxp)
 
             #
             # If all else fails, output table
@@ -1307,6 +1690,563 @@ def parse (
                     for row in df.iloc[headp:].itertuples(index=False):
                         table.add_row(*[str(i) for i in row])
                 print(table)
+            profiler.lap("write", df)
+
+        #
+        # Wait for the tables still being written
+        #
+        if runner is not None:
+            try:
+                runner.wait()
+            finally:
+                runner.run(engine.dispose())
+                runner.close()
+
+        #
+        # Report the profile on stderr, so that it does not mix with the output
+        #
+        profiler.report(Console(stderr=True))
+        if profile_json is not None:
+            profiler.write_trace(profile_json)
+        if pstats is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(pstats)
+
+
+#
+# Make the converters of parse -f from its formats: int, float, str, or
+# date(input format)(output format)
+#
+def format_converters(formats: List[str]) -> dict:
+    import math
+    converters = {}
+    converter_dict = {
+        'int':   lambda x: int(re.sub(r'[^0-9.]', '', x)) if isinstance(x, str) else x if isinstance(x, int) else pd.NA,
+        'float': lambda x: float(re.sub(r'[^0-9.]', '', x)) if isinstance(x, str) else x if isinstance(x, float) else pd.NA,
+        'str':   str,
+    }
+    for t in formats:
+        col, col_type = t.split("=")
+        #
+        # If the type is date, we need to parse the format
+        # This is hard: we need to find the date format, and the output format.
+        # We then need to create lambda functions that will convert the date to the output format.
+        # As we need to create a given format for each given column, we need to use eval() to create the lambda function.
+        # This is not safe, but as a simple command line tool, not too much of a problem.
+        #
+        if col_type.startswith("date"):
+            m = re.search('date\\((.*?)\\)\\((.*?)\\)', col_type)
+            if m:
+                date_type = m.group(1)
+                output_format = m.group(2)
+                converter_dict[col] = eval(f"lambda x: pd.to_datetime(x, format=\"{date_type}\").strftime(\"{output_format}\") if x and pd.to_datetime(x, format=\"{date_type}\") is not pd.NaT else None")
+                col_type="date"
+            else:
+                print(f"Missing date format for column {col}. Skipping.")
+        if col_type in converter_dict: # For a normal type, we just use the converter
+            converters[col] = converter_dict[col_type]
+        elif col_type == "date": # For a date, we use the converter we created above
+            converters[col] = converter_dict[col]
+        else: # For anything else, we skip
+            print(f"Invalid type {col_type} for column {col}. Skipping.")
+    return converters
+
+
+#
+# Keep the rows with the longest value of each column, for parse --longest;
+# a column "Line Number" tells where they are in the file
+#
+def longest_rows(df: pd.DataFrame, head: int = 0) -> pd.DataFrame:
+    df['Line Number'] = df.index + 1 + head  # +1 because index starts from 0, and adjust for header lines skipped
+
+    # Initialize lists to store the maximum length and corresponding row index for each column
+    max_lengths = []
+    max_row_indices = []
+
+    for index, row in df.iterrows():
+        for col, item in enumerate(row):
+            item_length = len(str(item))
+            if col >= len(max_lengths):
+                max_lengths.append(item_length)
+                max_row_indices.append(index)
+            else:
+                if item_length > max_lengths[col]:
+                    max_lengths[col] = item_length
+                    max_row_indices[col] = index
+
+    # Filter the dataframe to get rows with the longest values
+    return df.loc[max_row_indices].drop_duplicates()
+
+
+#
+# Apply the row-wise steps of parse to a DataFrame (or to a chunk of one):
+# renaming, selecting, and omitting columns, replacing NaN, regular
+# expressions, non breaking spaces, and queries.
+#
+def transform_frame(df: pd.DataFrame, rename_by_index: dict = None, rename_by_name: dict = None, selected_columns: list = None,
+                    omit: list = None, replace: list = None, query: list = None, compact: bool = False, profiler = None) -> pd.DataFrame:
+    df = clean_frame(df, rename_by_index, rename_by_name, selected_columns, omit, replace, compact, profiler)
+    return query_frame(df, query, profiler)
+
+
+#
+# The steps of transform_frame up to the queries
+#
+def clean_frame(df: pd.DataFrame, rename_by_index: dict = None, rename_by_name: dict = None, selected_columns: list = None,
+                omit: list = None, replace: list = None, compact: bool = False, profiler = None) -> pd.DataFrame:
+    profiler = profiler or Profiler()
+
+    #
+    # If asked to rename columns, do it
+    #
+    if rename_by_index:
+        for key in rename_by_index.keys():
+            if key >= len(df.columns):
+                print(f"Column index {key+1} is out of range.")
+                sys.exit(1)
+            else:
+                df.columns.values[key] = rename_by_index[key]
+    if rename_by_name:
+        df = df.rename(columns=rename_by_name)
+
+
+
+    #
+    # If asked to select, and reorder columns, do it
+    #
+    if selected_columns:
+        df = df[selected_columns]
+
+    #
+    # If asked to omit columns, do it
+    #
+    if omit:
+        for col in omit:
+            if col in df.columns:
+                df = df.drop(col, axis=1)
+    profiler.lap("columns", df)
+
+    #
+    # Replace NaN with ""
+    #
+    if compact:
+        df = compact_fillna(df, "")
+    else:
+        df = df.fillna("")
+    profiler.lap("fillna", df)
+
+    #
+    # If asked to do regexes, do them
+    #
+    if replace:
+        replace_columns = {}
+        for rep in replace:
+            temp = rep.split("=")
+            if len(temp) == 2:
+                replace_columns[temp[0]] = temp[1]
+            else:
+                replace_columns[temp[0]] = temp[1]
+            if replace_columns:
+                for col in replace_columns:
+                    if col in df.columns:
+                        rep = replace_columns[col]
+                        match = re.match(r's/([^/]*)/([^/]*)/([g|i]*)', rep)
+                        if match:
+                            search, replacement, flags = match.groups()
+                            if 'g' in flags:
+                                df[col] = df[col].apply(lambda x: re.sub(search, replacement, x))
+                            else:
+                                df[col] = df[col].apply(lambda x: re.sub(search, replacement, x, 1))
+                        else:
+                            print(f"Invalid replace string {rep}")
+        profiler.lap("replace", df)
+
+    #
+    # Replace \u00A0 (Non breaking space) with ""; these appear
+    # to sometimes come from Excel, and cause problems with
+    # queries using ==.
+    if compact:
+        df = compact_replace(df, "\u00A0", "")
+    else:
+        df = df.replace("\u00A0", "", regex=True)
+    profiler.lap("nbsp", df)
+    return df
+
+
+#
+# The queries of transform_frame
+#
+def query_frame(df: pd.DataFrame, query: list = None, profiler = None) -> pd.DataFrame:
+    profiler = profiler or Profiler()
+
+    #
+    # If we are asked to query, do it
+    #
+    if query:
+        for q in query:
+            q = re.sub(r'(\w+) contains "(.*)"', r'\1.str.contains("\2")', q) # form proper contains query
+            q = q.replace("=", "==") # replace == with =, as == is hard to type
+            q = q.replace("!==", "!=") # replace !== with !=, as !== is wrong
+            df = df.query(f"{q}", engine='python') # This is safe, as we are using pandas
+        profiler.lap("query", df)
+    return df
+
+
+#
+# Parse --order options into the columns to sort by and their directions;
+# a leading minus sign sorts in descending order
+#
+def sort_spec(order: List[str]):
+    by, ascending = [], []
+    for o in order:
+        if o.startswith("-"):
+            by.append(o[1:])
+            ascending.append(False)
+        else:
+            by.append(o)
+            ascending.append(True)
+    return by, ascending
+
+
+#
+# Sort a DataFrame, case-insensitively unless asked otherwise
+#
+def sort_frame(df: pd.DataFrame, by: List[str], ascending: List[bool], case_sens: bool = False, kind: str = 'quicksort') -> pd.DataFrame:
+    if case_sens:
+        return df.sort_values(by, ascending=ascending, kind=kind, na_position='last')
+    return df.sort_values(by, ascending=ascending, kind=kind, na_position='last', key=_fold_case)
+
+
+def _fold_case(s: pd.Series) -> pd.Series:
+    return s.str.lower() if pd.api.types.is_string_dtype(s) else s
+
+
+#
+# Sort chunks on disk (external merge sort): each chunk is sorted and spilled
+# to a temporary file (a run), and the runs are then merged, yielding the
+# sorted rows in chunks. Memory is bounded by the chunk size while sorting,
+# and by two blocks per run while merging; runs are written in blocks of a
+# fanin-th of a chunk, and with more runs than can be merged at once, groups
+# of them are merged into longer runs first, so that the merge holds about
+# two chunks.
+#
+_MERGE_FANIN = 64 # The number of runs merged at once, which also bounds the open files
+
+def external_sort(chunks, by: List[str], ascending: List[bool], case_sens: bool = False,
+                  fanin: int = _MERGE_FANIN):
+    with tempfile.TemporaryDirectory(prefix="csv2sql-sort-") as tmp:
+        runs = []
+        empty = None
+        for chunk in chunks:
+            empty = chunk.iloc[:0]
+            if len(chunk) > 0:
+                if not runs: # Size the blocks after the first chunk
+                    block_rows = max(100, len(chunk) // fanin)
+                runs.append(_write_run(sort_frame(chunk, by, ascending, case_sens, kind='stable'), tmp, block_rows))
+        if not runs: # Keep the columns of an empty result
+            if empty is not None:
+                yield empty
+            return
+        while len(runs) > fanin: # Too many runs to merge at once, so merge them in groups first
+            merged = []
+            for i in range(0, len(runs), fanin):
+                group = runs[i:i + fanin]
+                merged.append(_write_run(_merge_runs(group, by, ascending, case_sens), tmp, block_rows))
+                for run in group:
+                    os.remove(run)
+            runs = merged
+        yield from _merge_runs(runs, by, ascending, case_sens)
+
+
+#
+# Write DataFrames as a run of pickled blocks to a new temporary file
+#
+def _write_run(frames, tmp: str, block_rows: int) -> str:
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    fd, run = tempfile.mkstemp(suffix=".run", dir=tmp)
+    with os.fdopen(fd, "wb") as f:
+        for df in frames:
+            for start in range(0, len(df), block_rows):
+                pickle.dump(df.iloc[start:start + block_rows], f, protocol=pickle.HIGHEST_PROTOCOL)
+    return run
+
+
+def _read_run(run: str):
+    with open(run, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+#
+# Merge sorted runs, a tournament of blocks: in each round, the smallest of
+# the last rows of the current blocks of the runs that have more blocks to
+# come (ties go to the first run) is the pivot, and the rows that sort before
+# it (as the stable sort of all runs would order them) are final, as all
+# rows still to be read sort after it. As each run is sorted, its final rows
+# are the next ones of its block, found by a binary search; only those rows
+# are ordered together (by the ranks of their keys, with a stable lexsort),
+# so that each row is ordered once, and the pivot's block is used up. Only the positions of the final rows are recorded in
+# each round; the rows themselves are gathered from the blocks in one go
+# once about a block per run is due.
+#
+def _merge_runs(runs: List[str], by: List[str], ascending: List[bool], case_sens: bool = False):
+    readers = [_read_run(run) for run in runs]
+    held = {} # The blocks that are current or still have rows due, by number
+    current = [] # The number of the current block of each run, or None when the run is done
+    ahead = [] # The next block of each run, read ahead to know which runs have more rows
+    for reader in readers:
+        block = next(reader, None)
+        current.append(len(held) if block is not None else None)
+        if block is not None:
+            held[len(held)] = block
+        ahead.append(next(reader, None))
+    keys = {n: _merge_keys(block, by, case_sens) for n, block in held.items()}
+    pos = [0] * len(runs) # The next row of the current block of each run
+    flush_rows = sum(len(block) for block in held.values())
+    due_blocks, due_rows, due = [], [], 0
+    numbered = len(held)
+    while True:
+        live = [i for i, n in enumerate(current) if n is not None]
+        if live:
+            pivot = None
+            for i in live:
+                if ahead[i] is not None:
+                    last = tuple(column[-1] for column in keys[current[i]])
+                    if pivot is None or _compare_keys(last, pivot[1], ascending) < 0:
+                        pivot = (i, last)
+            sizes = []
+            for i in live:
+                values, size = keys[current[i]], len(held[current[i]])
+                if pivot is None or i == pivot[0]:
+                    sizes.append(size - pos[i])
+                else: # Rows equal to the pivot come first from the runs before its run
+                    sizes.append(_bisect_keys(values, pos[i], size, pivot[1], ascending, i < pivot[0]) - pos[i])
+            sizes = np.array(sizes)
+            ends = np.cumsum(sizes)
+            columns = [np.concatenate([keys[current[i]][k][pos[i]:pos[i] + n] for i, n in zip(live, sizes)]) for k in range(len(by))]
+            final = _order_keys(columns, ascending)
+            owner = np.searchsorted(ends, final, side='right') # The position in live of the run of each final row
+            starts = np.array([pos[i] for i in live]) - (ends - sizes) # From positions in combined to rows in the blocks
+            due_blocks.append(np.array([current[i] for i in live])[owner])
+            due_rows.append(final + starts[owner])
+            due += len(final)
+            for i, n in zip(live, sizes):
+                pos[i] += int(n)
+                if pos[i] == len(held[current[i]]): # This run's block is used up, so move on to its next one
+                    del keys[current[i]]
+                    current[i], pos[i] = None, 0
+                    if ahead[i] is not None:
+                        current[i] = numbered
+                        held[numbered], keys[numbered] = ahead[i], _merge_keys(ahead[i], by, case_sens)
+                        numbered += 1
+                        ahead[i] = next(readers[i], None)
+        if due >= flush_rows or (not live and due > 0): # Gather the rows that are due
+            blocks, rows = np.concatenate(due_blocks), np.concatenate(due_rows)
+            used = np.unique(blocks)
+            offsets = np.zeros(used.max() + 1, dtype=np.int64)
+            offsets[used] = np.cumsum([0] + [len(held[n]) for n in used[:-1]])
+            gathered = pd.concat([held[n] for n in used], ignore_index=True)
+            yield gathered.take(offsets[blocks] + rows).reset_index(drop=True)
+            for n in used:
+                if n not in keys: # Neither current nor to come again
+                    del held[n]
+            due_blocks, due_rows, due = [], [], 0
+        if not live:
+            return
+
+
+#
+# The sort keys of a block: the values of its key columns as sort_frame
+# compares them (case-folded unless asked otherwise), missing ones as None
+#
+def _merge_keys(block: pd.DataFrame, by: List[str], case_sens: bool) -> List[np.ndarray]:
+    columns = [block[col] for col in by]
+    return [(c if case_sens else _fold_case(c)).to_numpy(dtype=object, na_value=None) for c in columns]
+
+
+#
+# The order of rows of sort keys, as the stable sort_frame gives it: each
+# column is ranked, in its direction and with missing values last, and the
+# ranks are sorted with a stable lexsort
+#
+def _order_keys(columns: List[np.ndarray], ascending: List[bool]) -> np.ndarray:
+    ranks = []
+    for values, asc in zip(columns, ascending):
+        codes, uniques = pd.factorize(values, sort=True)
+        missing = codes < 0
+        codes = codes if asc else len(uniques) - 1 - codes
+        codes[missing] = len(uniques)
+        ranks.append(codes)
+    return np.lexsort(ranks[::-1])
+
+
+#
+# Compare two rows of sort keys as sort_frame orders them: column by column,
+# in each column's direction, with missing values last
+#
+def _compare_keys(a: tuple, b: tuple, ascending: List[bool]) -> int:
+    for x, y, asc in zip(a, b, ascending):
+        if x is None or y is None:
+            if (x is None) != (y is None):
+                return 1 if x is None else -1
+            continue
+        if x != y:
+            return (-1 if x < y else 1) if asc else (1 if x < y else -1)
+    return 0
+
+
+#
+# The end of the rows from lo to hi of sorted keys that sort before key, or
+# that sort equal to it, too, with inclusive
+#
+def _bisect_keys(values: list, lo: int, hi: int, key: tuple, ascending: List[bool], inclusive: bool) -> int:
+    while lo < hi:
+        mid = (lo + hi) // 2
+        c = _compare_keys(tuple(column[mid] for column in values), key, ascending)
+        if c < 0 or (c == 0 and inclusive):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+#
+# Write chunks as CSV to stdout, as they come, skipping the first rows
+# and stopping after a number of rows, as parse does for whole files
+#
+def write_csv_chunks(chunks, separator: str = None, skip: int = 0, rows: int = -1, out = None) -> None:
+    out = out or sys.stdout
+    header = True
+    last = None
+    for chunk in chunks:
+        last = chunk
+        if skip > 0:
+            n = min(skip, len(chunk))
+            chunk = chunk.iloc[n:]
+            skip -= n
+        if rows > -1:
+            chunk = chunk.head(rows)
+            rows -= len(chunk)
+        if len(chunk) > 0:
+            chunk.to_csv(out, sep=separator or ",", index=False, header=header, quoting=csv.QUOTE_NONNUMERIC, quotechar='"',escapechar='\\')
+            header = False
+        if rows == 0:
+            break
+    if header and last is not None: # No rows at all, but still a header
+        last.iloc[:0].to_csv(out, sep=separator or ",", index=False, quoting=csv.QUOTE_NONNUMERIC, quotechar='"',escapechar='\\')
+
+
+#
+# A set of keys, kept as their 64-bit hashes in a few sorted arrays. New
+# hashes are added as a new array, and the last arrays are merged as long
+# as the last one is at least half the size of the one before, so there are
+# only a few arrays to search. With verify, the keys are kept along with their
+# hashes, and a key only counts as seen if it matches one with the same hash.
+#
+class KeySet:
+    def __init__(self, verify: bool = False):
+        self.verify = verify
+        self.levels = [] # (sorted hashes, their keys or None)
+
+    def __len__(self) -> int:
+        return sum(len(hashes) for hashes, _ in self.levels)
+
+    def seen(self, hashes: np.ndarray, keys: pd.DataFrame = None) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for level_hashes, level_keys in self.levels:
+            pos = np.minimum(np.searchsorted(level_hashes, hashes), len(level_hashes) - 1)
+            hit = level_hashes[pos] == hashes
+            if self.verify and hit.any():
+                rows = np.flatnonzero(hit)
+                same = np.ones(len(rows), dtype=bool)
+                for col in keys.columns:
+                    a, b = level_keys[col].to_numpy()[pos[rows]], keys[col].to_numpy()[rows]
+                    same &= (a == b) | (pd.isna(a) & pd.isna(b))
+                for row in rows[~same]: # Same hash, different key: look at the other keys with this hash
+                    key = tuple(keys.iloc[row])
+                    j = pos[row] + 1
+                    while j < len(level_hashes) and level_hashes[j] == hashes[row] and tuple(level_keys.iloc[j]) != key:
+                        j += 1
+                    hit[row] = j < len(level_hashes) and level_hashes[j] == hashes[row]
+            found |= hit
+        return found
+
+    def add(self, hashes: np.ndarray, keys: pd.DataFrame = None) -> None:
+        if len(hashes) == 0:
+            return
+        order = np.argsort(hashes, kind='stable')
+        self.levels.append((hashes[order], keys.iloc[order] if self.verify else None))
+        while len(self.levels) > 1 and 2 * len(self.levels[-1][0]) >= len(self.levels[-2][0]):
+            (h1, k1), (h2, k2) = self.levels.pop(-2), self.levels.pop()
+            hashes = np.concatenate([h1, h2])
+            order = np.argsort(hashes, kind='stable')
+            self.levels.append((hashes[order], pd.concat([k1, k2], ignore_index=True).iloc[order] if self.verify else None))
+
+
+#
+# Drop the rows of a chunk whose key was seen before, in the chunk or in
+# the key set, and add the new keys to the key set
+#
+def _unique_chunk(chunk: pd.DataFrame, columns: List[str], keyset: KeySet) -> pd.DataFrame:
+    keys = chunk[columns]
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    new = ~(keys.duplicated() if keyset.verify else pd.Series(hashes).duplicated()).to_numpy()
+    rows = np.flatnonzero(new)
+    new[rows[keyset.seen(hashes[rows], keys.iloc[rows])]] = False
+    keyset.add(hashes[new], keys[new] if keyset.verify else None)
+    return chunk[new]
+
+
+#
+# Drop duplicate rows from chunks as they come, keeping the first row of
+# each key, as drop_duplicates does; memory grows with the number of
+# distinct keys, not with the number of rows. For more distinct keys than
+# fit into memory, the rows are spread over partitions on disk by their
+# hash, each partition is deduplicated on its own, and the partitions are
+# merged back into the order of the file.
+#
+_ROW_NUMBER = "__csv2sql_row__"
+
+def unique_chunks(chunks, columns: List[str], verify: bool = False, partitions: int = 0):
+    if partitions <= 1:
+        keyset = KeySet(verify)
+        for chunk in chunks:
+            yield _unique_chunk(chunk, columns, keyset)
+        return
+    with tempfile.TemporaryDirectory(prefix="csv2sql-unique-") as tmp:
+        paths = [os.path.join(tmp, f"{p}.part") for p in range(partitions)]
+        files = [open(path, "wb") for path in paths]
+        rows = 0
+        empty = None
+        block_rows = 100
+        try:
+            for chunk in chunks:
+                empty = chunk.iloc[:0]
+                if rows == 0:
+                    block_rows = max(100, len(chunk) // partitions)
+                chunk = chunk.assign(**{_ROW_NUMBER: np.arange(rows, rows + len(chunk))})
+                rows += len(chunk)
+                part = pd.util.hash_pandas_object(chunk[columns], index=False).to_numpy() % partitions
+                for p in np.unique(part):
+                    pickle.dump(chunk[part == p], files[p], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        if rows == 0:
+            if empty is not None:
+                yield empty
+            return
+        runs = []
+        for path in paths:
+            keyset = KeySet(verify)
+            runs.append(_write_run((_unique_chunk(chunk, columns, keyset) for chunk in _read_run(path)), tmp, block_rows))
+            os.remove(path)
+        for chunk in _merge_runs(runs, [_ROW_NUMBER], [True], True):
+            yield chunk.drop(columns=_ROW_NUMBER)
 
 
 #
@@ -1316,125 +2256,2625 @@ def parse (
 @app.command()
 def drop (
     ctx:        typer.Context,
-    dbtable:    str  = typer.Option(None,      "--table",     "-t",          help="The database table to write to"),
+    dbtables:   List[str] = typer.Option(None, "--table",     "-t",          help="The database tables to drop"),
     prefix:     str  = typer.Option("",        "--prefix",    "-p",          help="The prefix to use for the table name"),
     dbhost:     str  = typer.Option("tc",      "--dbhost",    "-dh",         help="The database host to connect to"),
     dbport:     int  = typer.Option(3306,      "--dbport",    "-dp",         help="The database port to connect to"),
     dbuser:     str  = typer.Option("tc",      "--dbuser",    "-du",         help="The database user to connect as"),
-    dbpass:     str  = typer.Option("sap123",  "--dbpass",    "-dp",         help="The database password to connect with"),
+    dbpass:     str  = typer.Option("sap123",  "--dbpass",    "-dw",         help="The database password to connect with"),
     dbschema:   str  = typer.Option("tc",      "--dbschema",  "-ds",         help="The database schema to connect to"),
     dbspecial:  str  = typer.Option(None,      "--dbspecial", "-dss",        help="The database specials to use for the connection"),
     dbtype:     str  = typer.Option("mysql+pymysql",           "--dbtype",   help="The database type"),
     dbargs:     str  = typer.Option('{"connect_timeout": 10}', "--dbargs",   help="The database connection arguments to use"),
+    db_async:   int  = typer.Option(0,         "--db-async",                 help="The number of tables to drop at once over an asyncio engine"),
 ) -> None:
     """
-    Drop a table from the database.
+    Drop tables from the database.
     """
-    if dbtable is None:
+    if not dbtables:
         print ("Please specify a table to drop.") # If no table name is given, we exit
         sys.exit(1)
-    if prefix != "": # If we have a prefix, we add it to the table name
-        dbtable = f"{prefix}{dbtable}"
-    if dbargs is not None: # If we have DB args, we use them
-        connect_args = json.loads(dbargs)
-    else:
-        connect_args = {}
-    if dbspecial is not None:
-        dbspecial = f"?{dbspecial}"
-    else:
-        dbspecial = ""
-    engine=create_engine(f"{dbtype}://{dbuser}:{dbpass}@{dbhost}:{dbport}/{dbschema}{dbspecial}", echo=False, connect_args=connect_args) # We create the engine
+    patterns = [f"{prefix}{dbtable}" for dbtable in dbtables] # If we have a prefix, we add it to the table names
 
     #
-    # Drop the table
+    # Drop the tables: the table names are listed once, and the tables
+    # matching the names or patterns are dropped in one go, or many at
+    # once over an asyncio engine if asked to
     #
-    meta = MetaData() # We create the metadata
-    try:
-        meta = MetaData()
-        table = Table(dbtable, meta)
-        insp = inspect(engine)
-        if dbtable in insp.get_table_names():
-            table = Table(dbtable, meta, autoload_with=engine)
-            table.drop(bind=engine, checkfirst=True)
+    if db_async > 0:
+        engine = make_async_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs, pool_size=db_async)
+        runner = AsyncRunner(async_limit(engine, db_async))
+        try:
+            tables, missing = match_tables(runner.run(table_names_async(engine)), patterns)
+            for dbtable in tables:
+                runner.submit(drop_table_async(engine, dbtable))
+            runner.wait()
+        finally:
+            runner.run(engine.dispose())
+            runner.close()
+    else:
+        engine = make_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs, engines=served_engines(ctx)) # We create the engine
+        tables, missing = drop_tables(engine, patterns)
+        for dbtable in tables:
             print(f"Table [green]{dbtable}[/green] dropped.")
+    for pattern in missing:
+        if any(c in pattern for c in "*?["):
+            print(f"No table matches [green]{pattern}[/green].")
         else:
-            print(f"Table [green]{dbtable}[/green] does not exist.")
-    except exc.NoSuchTableError:
-        print(f"Table [green]{dbtable}[/green] does not exist.")
+            print(f"Table [green]{pattern}[/green] does not exist.")
 
 
 
 #
-# Count the number of lines in a file
+# Repair files
 #
-def file_len(file_path):
-    file_ext = os.path.splitext(file_path)[1]
-    if file_ext == '.csv': # If it's a CSV file, treat as text file
-        with open(file_path, "r") as f:
-            for i, l in enumerate(f):
-                pass
-        return i + 1
-    elif file_ext in ('.xls', '.xlsx'): # If we have an Excel file, use the Excel reader
-        with pd.ExcelFile(file_path) as xlsx:
-            nrows = pd.read_excel(xlsx, usecols=None, nrows=1, dtype=str).shape[0]
-            return nrows
-    else: # If we have an unsupported file type, raise an error
-        raise ValueError(f"Invalid file format: {file_ext}. Only CSV, XLS, and XLSX are supported.")
+@app.command()
+def repair (
+    ctx:        typer.Context,
+    output:     str  = typer.Option(None,      "--output",    "-o",          help="The file to write the repaired data to, instead of repairing in place"),
+    files:      Optional[List[str]] = typer.Argument(None,                   help="The files to repair"),
+) -> None:
+    """
+    Repair broken quoting in CSV files, as csvclean.sh does, in a single pass.
+    """
+    if not files:
+        print("Please specify a file name.")
+        sys.exit(1)
+    elif output is not None and len(files) > 1:
+        print("The --output option takes a single file.")
+        sys.exit(1)
+    for file in files:
+        file_ext, compression = _file_format(file)
+        if file_ext != ".csv":
+            print(f"Only CSV files can be repaired, not {file}.")
+            sys.exit(1)
+        elif output is None and compression:
+            print(f"Compressed files cannot be repaired in place. Use --output for {file}.")
+            sys.exit(1)
+
+        #
+        # Stream the file through the repair stage, to the output or to a
+        # temporary file that then replaces the file
+        #
+        target = output if output is not None else f"{file}.{os.getpid()}"
+        try:
+            with Progress() as progress:
+                task = progress.add_task(f"Repairing {file}", total=os.path.getsize(file))
+                with open_input(file, lambda n: progress.update(task, completed=n), repair=True) as f, open(target, 'wb') as out:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        out.write(block)
+            if output is None:
+                os.chmod(target, os.stat(file).st_mode & 0o7777) # Keep the mode of the file
+                os.replace(target, file)
+        except BaseException:
+            if output is None and path.exists(target):
+                os.remove(target)
+            raise
+        print(f"File [green]{file}[/green] repaired{f' to [green]{output}[/green]' if output is not None else ''}.")
+
 
 
 #
-# Read a file and output it in a dataframe
+# Ingest
 #
-def read_file(filename: str, separator: str = None, rows: int = -1, head: int = 0, converters = None ) -> pd.DataFrame:
-    global _separator
-    file_ext = os.path.splitext(filename)[1]
-    if file_ext == '.csv': # If it's a CSV file, use pandas
-        if separator: # If we have a separator, use it
-            if rows > -1: # If we have a number of rows, use it
-                if converters: # If we have converters, use them
-                    df = pd.read_csv(filename, sep=separator, escapechar='\\', nrows=rows, skiprows=range(0, head), converters=converters)
-                    return df
-                else: # If we don't have converters, don't use them
-                    return pd.read_csv(filename, sep=separator, escapechar='\\', nrows=rows, skiprows=range(0, head), dtype=str)
-            else: # If we don't have a number of rows, read the whole file
-                if converters: # If we have converters, use them
-                    return pd.read_csv(filename, sep=separator, escapechar='\\', skiprows=range(0, head), converters=converters)
-                else: # If we don't have converters, don't use them
-                    return pd.read_csv(filename, sep=separator, escapechar='\\', skiprows=range(0, head), dtype=str)
-        else: # If we don't have a separator, try to auto-detect it
-            with open(filename, 'r') as f:
-                dialect = csv.Sniffer().sniff(f.readline()) # Try to auto-detect the separator
-                f.seek(0) # Go back to the beginning of the file
-                if _separator is None:
-                    _separator = dialect.delimiter # Set the global separator
-                if rows > -1: # If we have a number of rows, use it
-                    if converters: # If we have converters, use them
-                        #pretty_print_converters (converters)
-                        df = pd.read_csv(filename, sep=dialect.delimiter, escapechar='\\', nrows=rows, skiprows=range(0, head), header=0, converters=converters)
-                        return df
-                    else: # If we don't have converters, don't use them
-                        return pd.read_csv(filename, sep=dialect.delimiter, escapechar='\\', nrows=rows, skiprows=range(0, head), dtype=str)
-                else: # If we don't have a number of rows, read the whole file
-                    if converters: # If we have converters, use them
-                        return pd.read_csv(filename, sep=dialect.delimiter, escapechar='\\', skiprows=range(0, head), converters=converters)
-                    else: # If we don't have converters, don't use them
-                        return pd.read_csv(filename, sep=dialect.delimiter, escapechar='\\', skiprows=range(0, head), dtype=str)
-    elif file_ext in ('.xls', '.xlsx'): # If we have an Excel file, use the Excel reader
-        if _separator is None:
-            _separator = "," # Set the global separator
-        if rows > -1: # If we have a number of rows, use it
-            if converters:
-                #pretty_print_converters (converters)
-                return pd.read_excel(filename, nrows=rows, skiprows=range(0, head), converters=converters)
-            else:
-                return pd.read_excel(filename, nrows=rows, skiprows=range(0, head), dtype=str)
-        else: # If we don't have a number of rows, read the whole file
-            if converters:
-                return pd.read_excel(filename, skiprows=range(0, head), converters=converters)
+@app.command()
+def ingest (
+    ctx:        typer.Context,
+    pattern:    str  = typer.Option("*.csv",   "--pattern",                   help="The files of the directory to load"),
+    watch:      bool = typer.Option(False,     "--watch",     "-w",          help="Keep watching the directory for new files"),
+    interval:   float = typer.Option(2.0,      "--interval",                  help="The seconds between scans of the directory"),
+    workers:    int  = typer.Option(1,         "--workers",   "-j",          help="The number of files to load at once"),
+    journal:    str  = typer.Option(None,      "--journal",                   help="The SQLite journal of the loaded files; .csv2sql-ingest.db in the directory"),
+    retry:      bool = typer.Option(False,     "--retry",                     help="Load the files that failed before again"),
+    sepr:       str  = typer.Option(None,      "--separator", "-s", "--sep", help="The separator to use"),
+    head:       int  = typer.Option(0,         "--head",      "-h",          help="The number of header lines to skip when reading"),
+    compact:    bool = typer.Option(False,     "--compact",                  help="Keep the data in memory-compact form (Arrow strings, categoricals)"),
+    chunk_size: int  = typer.Option(10000,     "--chunk_size","-cs",         help="The chunksize to use for writing to the database"),
+    staging:    bool = typer.Option(False,     "--staging",                  help="Write to a staging table, and swap it in when done"),
+    prefix:     str  = typer.Option("",        "--prefix",    "-p",          help="The prefix to use for the table name"),
+    dbhost:     str  = typer.Option("tc",      "--dbhost",    "-dh",         help="The database host to connect to"),
+    dbport:     int  = typer.Option(3306,      "--dbport",    "-dp",         help="The database port to connect to"),
+    dbuser:     str  = typer.Option("tc",      "--dbuser",    "-du",         help="The database user to connect as"),
+    dbpass:     str  = typer.Option("sap123",  "--dbpass",    "-dw",         help="The database password to connect with"),
+    dbschema:   str  = typer.Option("tc",      "--dbschema",  "-ds",         help="The database schema to connect to"),
+    dbspecial:  str  = typer.Option(None,      "--dbspecial", "-dss",        help="The database specials to use for the connection"),
+    dbtype:     str  = typer.Option("mysql+pymysql",           "--dbtype",   help="The database type"),
+    dbargs:     str  = typer.Option('{"connect_timeout": 10}', "--dbargs",   help="The database connection arguments to use"),
+    directory:  str  = typer.Argument(...,                                   help="The directory to load the files of"),
+) -> None:
+    """
+    Load the files of a directory into the database, each into a table of its own.
+    """
+    import signal
+    if not path.isdir(directory):
+        print(f"{directory} is not a directory.")
+        sys.exit(1)
+    journal = IngestJournal(journal or path.join(directory, ".csv2sql-ingest.db"))
+    pipeline = Pipeline(separator=sepr, head=head, compact=compact)
+    engine = pipeline.engine(dbtype, dbschema, dbuser, dbpass, dbhost, dbport, dbspecial, dbargs, pool_size=max(workers, 1))
+    watcher = _directory_watcher(directory) if watch else None
+
+    def stop(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop) # Stop as for Ctrl-C, and finish the files being loaded
+
+    seen = {} # The files found but not yet settled or loaded, by path: (size, mtime, when first seen)
+    running = {} # The files being loaded, by their future: (path, size, mtime, when first seen)
+    tried = set() # The files taken in this run, not to be retried again if they fail
+    totals = [0, 0, 0.0] # Files, rows, bytes
+    start = time.perf_counter()
+    pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1))
+    try:
+        while True:
+            #
+            # Find the new files; while watching, a file is only taken once its
+            # size and time are the same on two scans, so it is not half written
+            #
+            busy = set(file for file, _, _, _ in running.values())
+            for entry in os.scandir(directory):
+                if entry.name.startswith(".") or not entry.is_file() or not fnmatch.fnmatch(entry.name, pattern) or entry.path in busy:
+                    continue
+                st = entry.stat()
+                if journal.loaded(entry.path, st.st_size, st.st_mtime_ns, retry and entry.path not in tried):
+                    continue
+                size, mtime, first, _ = seen.get(entry.path, (None, None, time.time(), False))
+                seen[entry.path] = (st.st_size, st.st_mtime_ns, first, not watch or (size, mtime) == (st.st_size, st.st_mtime_ns))
+
+            #
+            # Start the largest settled files first, as they take the longest
+            #
+            ready = sorted((p for p, (_, _, _, settled) in seen.items() if settled), key=lambda p: -seen[p][0])
+            for file in ready[:max(workers, 1) - len(running)]:
+                size, mtime, first, _ = seen.pop(file)
+                tried.add(file)
+                future = pool.submit(_ingest_file, pipeline, engine, file, f"{prefix}{_file_stem(file)}", chunk_size, staging)
+                running[future] = (file, size, mtime, first)
+
+            if not running and not watch and not any(settled for _, _, _, settled in seen.values()):
+                break
+
+            #
+            # Wait for a file to be done, or for the next scan
+            #
+            if running:
+                done, _ = concurrent.futures.wait(running, timeout=interval, return_when=concurrent.futures.FIRST_COMPLETED)
             else:
-                return pd.read_excel(filename, skiprows=range(0, head), dtype=str)
-    else: # If we have an unsupported file type, raise an error
-        raise ValueError(f"Invalid file format: {file_ext}. Only CSV, XLS, and XLSX are supported.")
+                done = ()
+                _wait_for_files(watcher, interval)
+            for future in done:
+                file, size, mtime, first = running.pop(future)
+                try:
+                    rows, seconds = future.result()
+                except Exception as e:
+                    journal.record(file, size, mtime, "failed", error=str(e).splitlines()[0] if str(e) else type(e).__name__)
+                    print(f"[red]Failed[/red] {file}: {e}")
+                    continue
+                journal.record(file, size, mtime, "done", rows, seconds)
+                totals[0] += 1
+                totals[1] += rows
+                totals[2] += size
+                print(f"Loaded [magenta]{rows:,}[/magenta] rows of {file} in {seconds:.1f}s "
+                      f"({rows / max(seconds, 1e-9):,.0f} rows/s, {size / max(seconds, 1e-9) / 1e6:,.1f} MB/s), "
+                      f"{time.time() - first:.1f}s after it was found.")
+    except KeyboardInterrupt:
+        print("Stopping; waiting for the files being loaded.")
+        for future, (file, size, mtime, _) in running.items():
+            try:
+                rows, seconds = future.result()
+                journal.record(file, size, mtime, "done", rows, seconds)
+            except Exception as e:
+                journal.record(file, size, mtime, "failed", error=str(e))
+    finally:
+        pool.shutdown()
+        pipeline.close()
+        journal.close()
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {totals[0]:,} files, [magenta]{totals[1]:,}[/magenta] rows, in {elapsed:.1f}s "
+          f"({totals[1] / max(elapsed, 1e-9):,.0f} rows/s, {totals[2] / max(elapsed, 1e-9) / 1e6:,.1f} MB/s).")
+
+
+def _ingest_file(pipeline: "Pipeline", engine, filename: str, table: str, chunk_size: int, staging: bool) -> tuple:
+    start = time.perf_counter()
+    df = pipeline.run(filename)
+    pipeline.write(df, table, engine, chunk_size, staging=staging)
+    return len(df), time.perf_counter() - start
+
+
+#
+# Watch a directory for files written or moved into it with inotify, if the
+# inotify_simple package is installed (on Linux); otherwise, the directory
+# is polled. _wait_for_files returns after an event, or after the interval.
+#
+def _directory_watcher(directory: str):
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    watcher = INotify()
+    watcher.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+    return watcher
+
+
+def _wait_for_files(watcher, interval: float) -> None:
+    if watcher is None:
+        time.sleep(interval)
+    else:
+        watcher.read(timeout=int(interval * 1000))
+
+
+#
+# The journal of ingest: a SQLite table with the state of each file (done or
+# failed), its size and time when it was loaded, and how long that took. A
+# file counts as loaded if it is done and has not changed since, so that
+# restarts skip it; failed files are only loaded again if asked to.
+#
+class IngestJournal:
+    def __init__(self, filename: str):
+        import sqlite3
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                                "status TEXT, rows INTEGER, seconds REAL, error TEXT, finished TEXT)")
+        self.connection.commit()
+
+    def loaded(self, filename: str, size: int, mtime_ns: int, retry: bool = False) -> bool:
+        row = self.connection.execute("SELECT size, mtime_ns, status FROM files WHERE path = ?", (path.abspath(filename),)).fetchone()
+        if row is None or (row[0], row[1]) != (size, mtime_ns):
+            return False
+        return row[2] == "done" or not retry
+
+    def record(self, filename: str, size: int, mtime_ns: int, status: str, rows: int = None, seconds: float = None, error: str = None) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                (path.abspath(filename), size, mtime_ns, status, rows, seconds, error, datetime.datetime.now().isoformat(timespec="seconds")))
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+#
+# Serve
+#
+@app.command()
+def serve (
+    ctx:        typer.Context,
+    address:    str  = typer.Option(None,      "--socket",                    help="The Unix socket to listen on; $CSV2SQL_SERVER, or csv2sql.sock in the cache directory"),
+) -> None:
+    """
+    Run table, parse, and drop jobs in a warm process.
+    """
+    import socket
+    import signal
+    address = address or os.environ.get("CSV2SQL_SERVER") or path.join(cache_dir(), "csv2sql.sock")
+    if path.exists(address):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(address)
+                print(f"A server is running on {address} already.")
+                sys.exit(1)
+            except OSError: # Left behind by a server that did not stop cleanly
+                os.unlink(address)
+    engines = {} # The engines of the jobs, by their arguments
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)) # Clean up when killed, too
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(address)
+        os.chmod(address, 0o600) # Only for the user who runs it
+        server.listen()
+        print(f"Serving on [green]{address}[/green]; set CSV2SQL_SERVER to it to send the commands here.")
+        try:
+            while True:
+                connection, _ = server.accept()
+                with connection:
+                    try:
+                        serve_job(connection, engines)
+                    except (OSError, ValueError) as e: # The client went away, or sent no job
+                        print(f"Job failed: {e}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(address)
+            for engine in engines.values():
+                engine.dispose()
+
+
+#
+# Run one job of a client of csv2sql.py serve: the command runs in the
+# directory of the client, with its output sent back as forward_command
+# expects it. The jobs run one at a time, as the commands print to the
+# standard output and change to the directory of their client. The engines
+# of the server are given to the command in its context (see served_engines).
+#
+def serve_job(connection, engines: dict = None) -> None:
+    stream = connection.makefile("rw", encoding="utf-8")
+    line = stream.readline()
+    if not line: # Just a probe whether the server runs
+        return
+    request = json.loads(line)
+    args = request["args"]
+    start = time.perf_counter()
+    code = 0
+    if args[:1] not in (["table"], ["parse"], ["drop"]):
+        code = 1
+        _JobStream(stream, "err").write("Only table, parse, and drop jobs can be served.\n")
+    else:
+        cwd = os.getcwd()
+        try:
+            os.chdir(request.get("cwd", cwd))
+            with contextlib.redirect_stdout(_JobStream(stream, "out")), contextlib.redirect_stderr(_JobStream(stream, "err")):
+                try:
+                    app(args, prog_name="csv2sql.py", obj={"engines": engines})
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+                except Exception:
+                    code = 1
+                    Console(stderr=True).print_exception()
+        finally:
+            os.chdir(cwd)
+    stream.write(json.dumps({"exit": code}) + "\n")
+    stream.flush()
+    print(f"{' '.join(args)}: exit code {code} in {time.perf_counter() - start:.3f}s")
+
+
+class _JobStream(io.TextIOBase):
+    def __init__(self, stream, name: str):
+        self.stream = stream
+        self.name = name
+
+    def write(self, text: str) -> int:
+        self.stream.write(json.dumps({self.name: text}) + "\n")
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+#
+# Create a database engine. For SQLite (--dbtype sqlite), the schema is the
+# path of the database file, and the host, port, user, and password are not used.
+# Given a dict of engines, the engine is kept there by its arguments, so that
+# later calls for the same database share its pool of connections: a
+# csv2sql.py serve process keeps the engines of its jobs so, and a Pipeline
+# its own.
+#
+def make_engine(dbtype: str, dbuser: str, dbpass: str, dbhost: str, dbport: int, dbschema: str,
+                dbspecial: str = None, dbargs: str = None, echo: bool = False, pool_size: int = None, engines: dict = None):
+    url, connect_args = _engine_url(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs)
+    pool_args = {"pool_size": pool_size} if pool_size is not None else {} # One pooled connection per writer
+    key = (url, echo, json.dumps(connect_args, sort_keys=True), pool_size)
+    if engines is not None and key in engines:
+        return engines[key]
+    engine = create_engine(url, echo=echo, connect_args=connect_args, **pool_args)
+    if engines is not None:
+        engines[key] = engine
+    return engine
+
+
+#
+# The engines that a csv2sql.py serve process keeps for the command of a job,
+# or None when the command does not run in one
+#
+def served_engines(ctx: typer.Context) -> Optional[dict]:
+    return ctx.obj.get("engines") if isinstance(ctx.obj, dict) else None
+
+
+def _engine_url(dbtype: str, dbuser: str, dbpass: str, dbhost: str, dbport: int, dbschema: str,
+                dbspecial: str = None, dbargs: str = None):
+    connect_args = json.loads(dbargs) if dbargs is not None else {} # If we have DB args, we use them
+    special = f"?{dbspecial}" if dbspecial is not None else ""
+    if dbtype.split("+")[0] == "sqlite":
+        if "connect_timeout" in connect_args: # sqlite3 calls it timeout
+            connect_args["timeout"] = connect_args.pop("connect_timeout")
+        return f"{dbtype}:///{dbschema}{special}", connect_args
+    return f"{dbtype}://{dbuser}:{dbpass}@{dbhost}:{dbport}/{dbschema}{special}", connect_args
+
+
+#
+# Get the SQLAlchemy dialect of a --dbtype without creating an engine, to
+# render SQL offline: neither the database driver nor a connection is needed
+#
+def offline_dialect(dbtype: str):
+    try:
+        return URL.create(dbtype).get_dialect()()
+    except exc.NoSuchModuleError:
+        print(f"Unknown database type {dbtype}.")
+        sys.exit(1)
+
+
+#
+# Create an asyncio database engine, for the same --dbtype as make_engine:
+# the driver is swapped for the asyncio driver of the database (aiomysql,
+# asyncpg, aiosqlite), unless an asyncio driver is given already. This
+# needs SQLAlchemy's asyncio extra (greenlet) and the driver installed.
+#
+_ASYNC_DRIVERS = {"mysql": "aiomysql", "mariadb": "aiomysql", "postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+def make_async_engine(dbtype: str, dbuser: str, dbpass: str, dbhost: str, dbport: int, dbschema: str,
+                      dbspecial: str = None, dbargs: str = None, pool_size: int = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    dialect, _, driver = dbtype.partition("+")
+    if driver not in ("aiomysql", "asyncmy", "asyncpg", "psycopg_async", "aiosqlite"):
+        if dialect not in _ASYNC_DRIVERS:
+            print(f"There is no asyncio driver for {dbtype}.")
+            sys.exit(1)
+        driver = _ASYNC_DRIVERS[dialect]
+    url, connect_args = _engine_url(f"{dialect}+{driver}", dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs)
+    pool_args = {"pool_size": pool_size} if pool_size is not None else {}
+    return create_async_engine(url, connect_args=connect_args, **pool_args)
+
+
+#
+# Run coroutines on an event loop in a background thread, so that the caller
+# can go on (say, reading the next file) while they run. At most limit of them
+# are in flight at once: submit() waits for a free slot. wait() waits for all
+# of them, and then raises the first error; close() also lets those still in
+# flight finish first, so that the loop is never closed under them. SQLite has
+# a single writer, so there it runs one at a time (see async_limit).
+#
+def async_limit(engine, limit: int) -> int:
+    return 1 if engine.dialect.name == "sqlite" else limit
+
+
+class AsyncRunner:
+    def __init__(self, limit: int):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.slots = threading.BoundedSemaphore(limit)
+        self.futures = []
+
+    def submit(self, coroutine) -> None:
+        self.slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def wait(self) -> None:
+        concurrent.futures.wait(self.futures)
+        for future in self.futures:
+            future.result()
+
+    def close(self) -> None:
+        concurrent.futures.wait(self.futures)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+#
+# Replace a table with a DataFrame over an asyncio engine, like load_table
+# does, but on a single connection per table; many tables can so be loaded
+# at once on one thread. The statements run through SQLAlchemy's run_sync,
+# so that pandas can insert the rows.
+#
+async def load_table_async(engine, df: pd.DataFrame, dbtable: str, chunk_size: int = 10000, indices: List[str] = None,
+                           staging: bool = False, defs: List[str] = None, compressed: bool = False) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(_replace_table, df, dbtable, chunk_size, indices, staging, defs, compressed)
+    print(f"Done writing [magenta]{len(df)}[/magenta] rows to [green]{dbtable}[/green].")
+
+
+def _replace_table(connection, df: pd.DataFrame, dbtable: str, chunk_size: int = 10000, indices: List[str] = None,
+                   staging: bool = False, defs: List[str] = None, compressed: bool = False) -> None:
+    mysql = connection.dialect.name == "mysql"
+    target = f"{dbtable}_staging" if staging else dbtable
+    for statement in create_table_sql(target, defs, compressed=compressed, mysql=mysql,
+                                      quote=connection.dialect.identifier_preparer.quote_identifier):
+        connection.exec_driver_sql(statement)
+    for start in range(0, len(df), chunk_size):
+        df.iloc[start:start + chunk_size].to_sql(target, connection, if_exists='append', index=False)
+    if not staging or mysql:
+        _create_indices(connection, target, indices)
+    if staging:
+        _swap_in(connection, dbtable, target, indices)
+
+
+#
+# List the tables over an asyncio engine, and drop one of them
+#
+async def table_names_async(engine) -> List[str]:
+    async with engine.connect() as connection:
+        return await connection.run_sync(lambda sync: inspect(sync).get_table_names())
+
+
+async def drop_table_async(engine, dbtable: str) -> None:
+    async with engine.begin() as connection:
+        await connection.exec_driver_sql(f"DROP TABLE {engine.dialect.identifier_preparer.quote(dbtable)}")
+    print(f"Table [green]{dbtable}[/green] dropped.")
+
+
+#
+# Load a DataFrame into a database table, replacing the table. The table is
+# created from the column definitions (see column_defs), or else by pandas
+# from the first chunk; the remaining rows are split into one partition per
+# worker, and each worker writes its partition in chunks over its own pooled
+# connection. The indices (column lists like "a,b", as for table -i) are
+# created once the data is in. With staging, the data is loaded into a
+# staging table that then replaces the table in one step, so that readers
+# never see it empty or half loaded.
+#
+def load_table(df: pd.DataFrame, engine, dbtable: str, chunk_size: int = 10000, workers: int = 1,
+               indices: List[str] = None, staging: bool = False, progress: Progress = None, task = None,
+               defs: List[str] = None, compressed: bool = False) -> None:
+    mysql = engine.dialect.name == "mysql"
+    target = f"{dbtable}_staging" if staging else dbtable
+    if engine.dialect.name == "sqlite": # SQLite has a single writer, so more workers would just wait for each other
+        workers = 1
+    drop_table(engine, target)
+    if defs is not None:
+        with engine.begin() as connection:
+            for statement in create_table_sql(target, defs, compressed=compressed, mysql=mysql,
+                                              quote=engine.dialect.identifier_preparer.quote_identifier):
+                connection.exec_driver_sql(statement)
+
+    def write(start: int, stop: int) -> None:
+        with engine.connect() as connection:
+            for chunk_start in range(start, stop, chunk_size):
+                chunk = df.iloc[chunk_start:min(chunk_start + chunk_size, stop)]
+                chunk.to_sql(target, connection, if_exists='append', index=False)
+                connection.commit()
+                if progress is not None:
+                    progress.update(task, advance=len(chunk))
+
+    first = 0
+    if defs is None:
+        first = min(chunk_size, len(df))
+        write(0, max(first, 1)) # Create the table, even if there are no rows
+    bounds = np.linspace(first, len(df), workers + 1).astype(int)
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        for future in [pool.submit(write, start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]:
+            future.result() # Raise the first error of any worker
+
+    if not staging or mysql: # MySQL names indices per table, so they can be created before the swap
+        with engine.begin() as connection:
+            _create_indices(connection, target, indices)
+    if staging:
+        with engine.begin() as connection:
+            _swap_in(connection, dbtable, target, indices)
+
+
+#
+# Replace a table with a staging table: RENAME TABLE swaps both atomically
+# in MySQL; elsewhere, DDL is transactional, so the swap is atomic as a
+# whole. As index names are global there, the indices are created here.
+#
+def _swap_in(connection, dbtable: str, target: str, indices: List[str] = None) -> None:
+    quote = connection.dialect.identifier_preparer.quote
+    old = f"{dbtable}_old"
+    exists = inspect(connection).has_table(dbtable)
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(old)}")
+    if connection.dialect.name == "mysql":
+        renames = [f"{quote(dbtable)} TO {quote(old)}"] if exists else []
+        renames.append(f"{quote(target)} TO {quote(dbtable)}")
+        connection.exec_driver_sql(f"RENAME TABLE {', '.join(renames)}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(old)}")
+    else:
+        if exists:
+            connection.exec_driver_sql(f"ALTER TABLE {quote(dbtable)} RENAME TO {quote(old)}")
+            connection.exec_driver_sql(f"DROP TABLE {quote(old)}")
+        connection.exec_driver_sql(f"ALTER TABLE {quote(target)} RENAME TO {quote(dbtable)}")
+        _create_indices(connection, dbtable, indices)
+
+
+def _create_indices(connection, table: str, indices: List[str] = None) -> None:
+    quote = connection.dialect.identifier_preparer.quote
+    for index in indices or []:
+        index_cols = [col.strip() for col in index.split(",")]
+        cols = ", ".join(quote(col) for col in index_cols)
+        if connection.dialect.name == "mysql": # Named after the first column, as for table -i
+            connection.exec_driver_sql(f"ALTER TABLE {quote(table)} ADD INDEX ({cols})")
+        else:
+            name = quote("ix_" + "_".join([table] + index_cols))
+            connection.exec_driver_sql(f"CREATE INDEX {name} ON {quote(table)} ({cols})")
+
+
+#
+# Drop a table if it exists; returns whether it existed
+#
+def drop_table(engine, dbtable: str) -> bool:
+    return drop_tables(engine, [dbtable])[0] == [dbtable]
+
+
+#
+# Drop tables, given by name or by glob pattern (*, ?, [...]). The table
+# names are listed once, and the tables are dropped on one connection, in a
+# single DROP TABLE where the database allows several tables in it (MySQL,
+# PostgreSQL). Returns the tables dropped, and the names and patterns that
+# matched no table.
+#
+def drop_tables(engine, patterns: List[str]):
+    with engine.begin() as connection:
+        tables, missing = match_tables(inspect(connection).get_table_names(), patterns)
+        quote = connection.dialect.identifier_preparer.quote
+        if connection.dialect.name in ("mysql", "postgresql"):
+            for start in range(0, len(tables), 500): # Keep the statements at a reasonable size
+                connection.exec_driver_sql(f"DROP TABLE {', '.join(quote(table) for table in tables[start:start + 500])}")
+        else:
+            for table in tables:
+                connection.exec_driver_sql(f"DROP TABLE {quote(table)}")
+    return tables, missing
+
+
+def match_tables(names: List[str], patterns: List[str]):
+    tables, missing = [], []
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            matches = fnmatch.filter(names, pattern)
+        else:
+            matches = [pattern] if pattern in names else []
+        if not matches:
+            missing.append(pattern)
+        tables += [table for table in matches if table not in tables]
+    return tables, missing
+
+
+#
+# Generate the column definitions of a table from the maximum length of each
+# column: varchar(length), followed by the default, unless a format is given
+# for the column, in which ? stands for the length.
+#
+def column_defs(hdrs: List[str], cols: List[int], hdr_formats: dict = None, default: str = "DEFAULT NULL",
+                quote = lambda name: f"`{name}`") -> List[str]:
+    hdr_formats = hdr_formats or {}
+    maxl = max((len(hdr) for hdr in hdrs), default=0) + 4 # Add some space
+    defs = []
+    for hdr, length in zip(hdrs, cols):
+        line = f"  {quote(hdr).ljust(maxl)} "
+        if hdr in hdr_formats:
+            line += hdr_formats[hdr].replace("?", "%s" % length)
+        else:
+            line += "varchar(%s)" % length
+            if default is not None and default != "":
+                line += f" {default}"
+        defs.append(line)
+    return defs
+
+
+#
+# Generate the statements to (re)create a table from its column definitions.
+# The table options (engine, row format, character set) are MySQL's, and are
+# left out for other databases.
+#
+def create_table_sql(tablename: str, defs: List[str], temporary: str = "", compressed: bool = False, mysql: bool = True,
+                     quote = lambda name: f"`{name}`") -> List[str]:
+    create = f"CREATE {temporary}TABLE {quote(tablename)} (\n" + ",\n".join(defs) + "\n)"
+    if mysql:
+        create += " ENGINE=InnoDB"
+        if compressed and temporary == "":
+            create += " ROW_FORMAT=COMPRESSED"
+        create += " DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"
+    return [f"DROP {temporary}TABLE IF EXISTS {quote(tablename)}", create]
+
+
+#
+# Run the statements generated by the table command on a MySQL database:
+# (re)create the table, load the file on the server with LOAD DATA INFILE,
+# and add the indices. With disable_keys, the keys (for MyISAM) and the
+# unique and foreign key checks (for InnoDB) are off during the load. All
+# statements run on one connection, as these settings are per session.
+#
+def execute_load(engine, tablename: str, create: List[str], load: str, index: str = None, disable_keys: bool = False) -> None:
+    with engine.connect() as connection:
+        for statement in create:
+            connection.exec_driver_sql(statement)
+        if disable_keys:
+            connection.exec_driver_sql(f"ALTER TABLE `{tablename}` DISABLE KEYS")
+            connection.exec_driver_sql("SET unique_checks=0, foreign_key_checks=0")
+        start = time.perf_counter()
+        rows = connection.exec_driver_sql(load).rowcount
+        elapsed = time.perf_counter() - start
+        count = connection.exec_driver_sql("SHOW COUNT(*) WARNINGS").scalar()
+        warnings = connection.exec_driver_sql("SHOW WARNINGS LIMIT 10").fetchall()
+        if disable_keys:
+            connection.exec_driver_sql("SET unique_checks=1, foreign_key_checks=1")
+            connection.exec_driver_sql(f"ALTER TABLE `{tablename}` ENABLE KEYS")
+        if index:
+            connection.exec_driver_sql(index)
+        connection.commit()
+    print(f"Loaded [magenta]{rows:,}[/magenta] rows into [green]{tablename}[/green] in {elapsed:.1f}s "
+          f"({rows / max(elapsed, 1e-9):,.0f} rows/s), with {count:,} warnings.")
+    for level, code, message in warnings:
+        print(f"  {level} {code}: {message}")
+
+
+#
+# Get the SQL types of the columns of a DataFrame, for the columns that are
+# not plain strings (like those converted with parse -f): integers become
+# bigint, and floats double; everything else stays varchar(length). With a
+# dialect, the types are spelled as that database does (double precision
+# for PostgreSQL).
+#
+def sql_formats(df: pd.DataFrame, default: str = "DEFAULT NULL", dialect = None) -> dict:
+    bigint = BigInteger().compile(dialect=dialect).lower() if dialect is not None else "bigint"
+    double = Double().compile(dialect=dialect).lower() if dialect is not None else "double"
+    hdr_formats = {}
+    for col in df.columns:
+        kind = pd.api.types.infer_dtype(df[col], skipna=True)
+        if kind == "integer":
+            hdr_formats[col] = f"{bigint} {default}".strip()
+        elif kind in ("floating", "mixed-integer-float"):
+            hdr_formats[col] = f"{double} {default}".strip()
+    return hdr_formats
+
+
+#
+# Get the column definitions of a table for a DataFrame, as parse --db
+# creates it: each column sized to its longest value, and typed by
+# sql_formats for the database of the dialect. Strings too long for a
+# varchar of the database become text columns (see text_formats).
+#
+def frame_defs(df: pd.DataFrame, dialect) -> List[str]:
+    hdrs, cols, _ = profile_lengths([df])
+    cols = [max(length, 1) for length in cols]
+    hdr_formats = sql_formats(df, dialect=dialect)
+    hdr_formats.update(text_formats(hdrs, cols, hdr_formats, dialect.name))
+    return column_defs(hdrs, cols, hdr_formats, quote=dialect.identifier_preparer.quote_identifier)
+
+
+#
+# Get the text types of the string columns that do not fit a varchar. In
+# MySQL, a varchar holds at most 16,383 characters of utf8mb4, and the
+# columns of a row at most 65,535 bytes, with four bytes per character of a
+# varchar: longer columns become mediumtext (or longtext), and while the row
+# is still too large, the longest varchars become text, which only takes a
+# pointer of the row. In PostgreSQL, a varchar holds at most 10,485,760
+# characters; the other databases have no such limits.
+#
+_MYSQL_VARCHAR = 16383
+_MYSQL_MEDIUMTEXT = (1 << 24) // 4 - 1
+_MYSQL_ROW = 65535
+_MYSQL_POINTER = 12 # The bytes a text column takes of the row
+_POSTGRESQL_VARCHAR = 10485760
+
+def text_formats(hdrs: List[str], cols: List[int], hdr_formats: dict, dbname: str, default: str = "DEFAULT NULL") -> dict:
+    if dbname == "postgresql":
+        return {hdr: f"text {default}" for hdr, length in zip(hdrs, cols) if hdr not in hdr_formats and length > _POSTGRESQL_VARCHAR}
+    elif dbname not in ("mysql", "mariadb"):
+        return {}
+    formats = {}
+    varchars = []
+    size = (len(hdrs) + 7) // 8 # The NULL flags
+    for hdr, length in zip(hdrs, cols):
+        if hdr in hdr_formats: # bigint or double
+            size += 8
+        elif length > _MYSQL_VARCHAR:
+            formats[hdr] = f"{'mediumtext' if length <= _MYSQL_MEDIUMTEXT else 'longtext'} {default}"
+            size += _MYSQL_POINTER
+        else:
+            varchars.append((length, hdr))
+            size += 4 * length + (1 if 4 * length < 256 else 2)
+    for length, hdr in sorted(varchars, reverse=True):
+        if size <= _MYSQL_ROW:
+            break
+        formats[hdr] = f"text {default}"
+        size -= 4 * length + (1 if 4 * length < 256 else 2) - _MYSQL_POINTER
+    return formats
+
+
+#
+# The stages of the commands as a Python API: read a file, transform it as
+# parse does (-n, -c, -O, -r, -q, -u, -o), profile it as table --stats does,
+# and write it to a database as parse --db does. The options are given once,
+# and a pipeline can then be used for any number of files; it keeps the
+# database engines it creates. The parse command runs its files through a
+# pipeline, too. Renames are given by name, or by the (0-based) index of the
+# column, and converters as a dict, or as the formats of parse -f:
+#
+#   pipeline = Pipeline(rename={0: "id"}, query=['city = "Rome"'], order=["-amount"])
+#   df = pipeline.run("my_file.csv")
+#   stats = pipeline.profile("my_file.csv")
+#   pipeline.write(df, "rome", pipeline.engine("sqlite", "my.db"))
+#
+# run() reads the whole file; stream() reads and transforms it chunk by
+# chunk, like parse --external.
+#
+class Pipeline:
+    def __init__(self, separator: str = None, head: int = 0, rows: int = -1, converters: dict = None,
+                 rename: dict = None, columns: List[str] = None, omit: List[str] = None, replace: List[str] = None,
+                 query: List[str] = None, unique: List[str] = None, order: List[str] = None, case_sens: bool = False,
+                 compact: bool = False, chunk_rows: int = 100000, formats: List[str] = None, unique_verify: bool = False,
+                 unique_partitions: int = 0, offsets: bool = False, repair: bool = False, longest: bool = False,
+                 cache_size: int = 0, profiler: "Profiler" = None):
+        self.profiler = profiler or Profiler()
+        self.separator = separator
+        self.head = head
+        self.rows = rows
+        self.formats = formats
+        if converters is None and formats:
+            converters = format_converters(formats)
+        self.converters = self.profiler.wrap("converters", converters)
+        self.rename_by_index = {key: name for key, name in (rename or {}).items() if isinstance(key, int)}
+        self.rename_by_name = {key: name for key, name in (rename or {}).items() if not isinstance(key, int)}
+        self.columns = columns or []
+        self.omit = omit or []
+        self.replace = replace or []
+        self.query = query or []
+        self.unique = unique or []
+        self.order = order or []
+        self.case_sens = case_sens
+        self.compact = compact
+        self.chunk_rows = chunk_rows
+        self.unique_verify = unique_verify
+        self.unique_partitions = unique_partitions
+        self.offsets = offsets
+        self.repair = repair
+        self.longest = longest
+        self.cache_size = cache_size
+        self.engines = {}
+
+    def read(self, filename: str) -> pd.DataFrame:
+        return read_file(filename, self.separator, self.rows, self.head, self.converters, self.compact, self.offsets, self.repair)
+
+    def read_chunks(self, filename: str):
+        return read_file_chunks(filename, self.separator, self.rows, self.head, self.converters, self.chunk_rows,
+                                offsets=self.offsets, repair=self.repair)
+
+    #
+    # The steps up to the queries (renames, columns, missing values, regular
+    # expressions), and those from the queries on (queries, unique, order)
+    #
+    def clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        return clean_frame(df, self.rename_by_index, self.rename_by_name, self.columns, self.omit, self.replace,
+                           self.compact, self.profiler)
+
+    def filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = query_frame(df, self.query, self.profiler)
+        if self.unique:
+            df = df.drop_duplicates(self.unique)
+            self.profiler.lap("unique", df)
+        if self.order:
+            df = sort_frame(df, *sort_spec(self.order), self.case_sens)
+            self.profiler.lap("sort", df)
+        return df
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.filter(self.clean(df))
+
+    def transform_chunks(self, chunks):
+        chunks = self.profiler.stream("transform", (transform_frame(compact_strings(chunk) if self.compact else chunk, self.rename_by_index,
+                                                                    self.rename_by_name, self.columns, self.omit, self.replace, self.query,
+                                                                    self.compact) for chunk in chunks))
+        if self.unique:
+            chunks = self.profiler.stream("unique", unique_chunks(chunks, self.unique, self.unique_verify, self.unique_partitions))
+        if self.order:
+            chunks = self.profiler.stream("sort", external_sort(chunks, *sort_spec(self.order), self.case_sens))
+        return chunks
+
+    #
+    # Read and transform a file. With a cache size, the cleaned frame is
+    # cached, so that the next run with the same file and options (other than
+    # the queries, unique, and order) starts from there; this needs the
+    # converters to be given by their formats.
+    #
+    def run(self, filename: str) -> pd.DataFrame:
+        key = self.cache_key(filename)
+        df = read_frame_cache(key) if key is not None else None
+        if df is not None:
+            self.profiler.lap("cache", df)
+        else:
+            df = self.read(filename)
+            self.profiler.lap("read", df)
+            if self.longest:
+                df = longest_rows(df, self.head)
+                self.profiler.lap("longest", df)
+            df = self.clean(df)
+            if key is not None:
+                write_frame_cache(key, df, self.cache_size)
+                self.profiler.lap("cache", df)
+        return self.filter(df)
+
+    def stream(self, filename: str):
+        return self.transform_chunks(self.profiler.stream("read", self.read_chunks(filename)))
+
+    def cache_key(self, filename: str) -> Optional[str]:
+        if not self.cache_size or self.longest or (self.converters and not self.formats):
+            return None
+        return frame_cache_key(filename, sepr=self.separator, head=self.head, rows=self.rows, formats=self.formats,
+                               rename_by_index=self.rename_by_index, rename_by_name=self.rename_by_name,
+                               selected_columns=self.columns, omit=self.omit, replace=self.replace, compact=self.compact,
+                               repair=self.repair)
+
+    #
+    # Profile a file (as it is read, before the transformations) or a
+    # DataFrame; returns the ColumnStats of each column
+    #
+    def profile(self, source, workers: int = 1) -> List["ColumnStats"]:
+        if isinstance(source, pd.DataFrame):
+            return profile_stats([source])[3]
+        profiled = None
+        if _file_format(source) == ('.csv', None):
+            dialect = sniff_dialect(source)
+            separator = self.separator or dialect["delimiter"]
+            if len(separator) == 1 and dialect["encoding"] in _SCAN_ENCODINGS:
+                profiled = scan_stats(source, separator, self.head, self.rows, quotechar=dialect["quotechar"],
+                                      escapechar=dialect["escapechar"], encoding=dialect["encoding"], workers=workers)
+        if profiled is None:
+            profiled = profile_stats(self.read_chunks(source), workers=workers)
+        return profiled[3]
+
+    def engine(self, dbtype: str, dbschema: str, dbuser: str = "", dbpass: str = "", dbhost: str = "localhost",
+               dbport: int = 3306, dbspecial: str = None, dbargs: str = None, pool_size: int = None):
+        return make_engine(dbtype, dbuser, dbpass, dbhost, dbport, dbschema, dbspecial, dbargs, pool_size=pool_size, engines=self.engines)
+
+    #
+    # Replace a table with a DataFrame, its columns sized to the data; over
+    # an asyncio engine, write_async gives the coroutine to run
+    #
+    def write(self, df: pd.DataFrame, table: str, engine, chunk_size: int = 10000, workers: int = 1,
+              indices: List[str] = None, staging: bool = False, compressed: bool = False, progress: Progress = None, task = None) -> None:
+        load_table(df, engine, table, chunk_size, workers, indices, staging, progress, task, frame_defs(df, engine.dialect), compressed)
+
+    def write_async(self, df: pd.DataFrame, table: str, engine, chunk_size: int = 10000, indices: List[str] = None,
+                    staging: bool = False, compressed: bool = False):
+        return load_table_async(engine, df, table, chunk_size, indices, staging, frame_defs(df, engine.dialect), compressed)
+
+    #
+    # Write a DataFrame or chunks as CSV, with the separator of the file they
+    # come from, skipping the first rows and stopping after a number of rows
+    #
+    def write_csv(self, data, out, filename: str = None, skip: int = 0, rows: int = -1) -> None:
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        write_csv_chunks(chunks, file_separator(filename, self.separator) if filename else self.separator, skip, rows, out)
+
+    def close(self) -> None:
+        for engine in self.engines.values():
+            engine.dispose()
+        self.engines = {}
+
+
+#
+# Profile the stages of a command. Each call to lap() closes a stage: it
+# records the wall and CPU time since the previous lap, the rows going in
+# and out, and the peak memory (maximum resident set size) so far. When
+# profiling is off, lap() returns at once, so the hooks cost next to nothing.
+#
+class Profiler:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages = []
+        self.inner = {} # Time spent in wrapped functions (converters) and streams since the last lap
+        self.nested = 0.0 # Time of the wrapped functions and streams within the current step of a stream
+        self.start()
+
+    def start(self, file: str = None):
+        if not self.enabled:
+            return
+        self.file = file
+        self.rows = None
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        if not self.stages:
+            self.origin = self.wall
+
+    def lap(self, stage: str, df: pd.DataFrame = None):
+        if not self.enabled:
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        rows = len(df) if df is not None else self.rows
+        maxrss = _peak_rss()
+        spent = 0.0
+        for name, seconds in self.inner.items(): # Report wrapped functions as stages of their own
+            self.stages.append({"file": self.file, "stage": f"{stage}: {name}", "start": self.wall - self.origin,
+                                "wall": seconds, "cpu": None, "rows_in": self.rows, "rows_out": rows, "maxrss": maxrss})
+            spent += seconds
+        self.inner = {}
+        self.stages.append({"file": self.file, "stage": stage, "start": self.wall - self.origin + spent,
+                            "wall": wall - self.wall - spent, "cpu": max(cpu - self.cpu - spent, 0.0),
+                            "rows_in": self.rows, "rows_out": rows, "maxrss": maxrss})
+        self.rows = rows
+        self.wall, self.cpu = wall, cpu
+
+    #
+    # Time the calls to a dict of functions (like converters), which pandas
+    # calls from within a stage
+    #
+    def wrap(self, name: str, functions: dict) -> dict:
+        if not self.enabled or not functions:
+            return functions
+        def timed(f):
+            def call(x):
+                t = time.perf_counter()
+                try:
+                    return f(x)
+                finally:
+                    seconds = time.perf_counter() - t
+                    self.inner[name] = self.inner.get(name, 0.0) + seconds
+                    self.nested += seconds
+            return call
+        return {k: timed(f) for k, f in functions.items()}
+
+    #
+    # Time the steps of a stream of chunks (like the stages of parse
+    # --external, which run interleaved, a chunk at a time): each step counts
+    # for the stage without the time of the streams and functions it pulls
+    # from, and the stages are reported like wrapped functions
+    #
+    def stream(self, name: str, chunks):
+        if not self.enabled:
+            return chunks
+        return self._stream(name, iter(chunks))
+
+    def _stream(self, name: str, chunks):
+        done = object()
+        while True:
+            outer, self.nested = self.nested, 0.0
+            t = time.perf_counter()
+            try:
+                chunk = next(chunks, done)
+            finally:
+                seconds = time.perf_counter() - t
+                self.inner[name] = self.inner.get(name, 0.0) + seconds - self.nested
+                self.nested = outer + seconds
+            if chunk is done:
+                return
+            yield chunk
+
+    def report(self, console: Console) -> None:
+        if not self.enabled or not self.stages:
+            return
+        files = len({s["file"] for s in self.stages})
+        table = rich.table.Table(show_header=True, header_style="bold magenta", title="Profile")
+        for col in (["File"] if files > 1 else []) + ["Stage", "Wall s", "CPU s", "Rows in", "Rows out", "Peak MB"]:
+            table.add_column(col, justify="left" if col in ("File", "Stage") else "right", style="cyan")
+        fmt = lambda v, f: "" if v is None else format(v, f)
+        for s in self.stages:
+            table.add_row(*([s["file"]] if files > 1 else []), s["stage"], fmt(s["wall"], ".3f"), fmt(s["cpu"], ".3f"),
+                          fmt(s["rows_in"], ","), fmt(s["rows_out"], ","), fmt(s["maxrss"] and s["maxrss"] / 2**20, ",.0f"))
+        wall = sum(s["wall"] for s in self.stages)
+        cpu = sum(s["cpu"] for s in self.stages if s["cpu"] is not None)
+        table.add_row(*([""] if files > 1 else []), "[bold]Total[/bold]", f"{wall:.3f}", f"{cpu:.3f}", "", "", "")
+        console.print(table)
+
+    #
+    # Write the stages as a trace in the Chrome trace event format, which
+    # chrome://tracing and Perfetto can show
+    #
+    def write_trace(self, filename: str) -> None:
+        if not self.enabled:
+            return
+        events = [{"name": s["stage"], "cat": s["file"] or "", "ph": "X", "pid": os.getpid(), "tid": 0,
+                   "ts": round(s["start"] * 1e6), "dur": round(s["wall"] * 1e6),
+                   "args": {k: s[k] for k in ("cpu", "rows_in", "rows_out", "maxrss")}} for s in self.stages]
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "stages": self.stages, "argv": sys.argv}, f, indent=2)
+
+
+#
+# The peak memory (maximum resident set size) of the process in bytes,
+# or None where it cannot be measured
+#
+def _peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024 # Bytes on macOS, kilobytes elsewhere
+
+
+#
+# Count the number of lines in a file
+#
+def file_len(file_path):
+    file_ext, compression = _file_format(file_path)
+    if file_ext == '.csv': # If it's a CSV file, count the line feeds, whatever the encoding
+        lines = 0
+        last = b"\n"
+        with open_input(file_path) as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        return lines + (last != b"\n")
+    elif file_ext in ('.xls', '.xlsx'): # If we have an Excel file, use the sheet dimension
+        return excel_len(file_path)
+    else: # If we have an unsupported file type, raise an error
+        raise ValueError(f"Invalid file format: {file_ext}. Only CSV (optionally compressed), XLS, and XLSX are supported.")
+
+
+#
+# Count the number of rows of the first sheet of an Excel file.
+# For xlsx, this comes from the <dimension> metadata at the start of
+# the sheet, so the workbook is not parsed.
+#
+def excel_len(file_path):
+    if os.path.splitext(file_path)[1] == '.xlsx':
+        import openpyxl
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            if ws.max_row is not None: # The sheet has a dimension record
+                return ws.max_row
+            return sum(1 for _ in ws.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    return sum(1 for _ in _excel_rows(file_path))
+
+
+#
+# Read a file and output it in a dataframe
+#
+def read_file(filename: str, separator: str = None, rows: int = -1, head: int = 0, converters = None, compact: bool = False, offsets: bool = False,
+              repair: bool = False) -> pd.DataFrame:
+    file_ext, compression = _file_format(filename)
+    if compact: # Read in chunks, store the strings compactly, and make categoricals of repetitive columns
+        return compact_concat(read_file_chunks(filename, separator, rows, head, converters, _COMPACT_CHUNKSIZE, offsets=offsets, repair=repair))
+    if file_ext == '.csv': # If it's a CSV file, use pandas
+        offset, head = seek_rows(filename, separator, head) if offsets else (0, head)
+        kwargs = _csv_kwargs(filename, separator, rows, head, converters)
+        if compression or offset or repair: # Decompress while reading, start at the offset, or repair the data
+            with open_input(filename, offset=offset, repair=repair) as f:
+                return pd.read_csv(f, **kwargs)
+        return pd.read_csv(filename, **kwargs)
+    elif file_ext in ('.xls', '.xlsx'): # If we have an Excel file, use the streaming Excel reader
+        return pd.concat(read_excel_chunks(filename, rows, head, converters), ignore_index=True)
+    else: # If we have an unsupported file type, raise an error
+        raise ValueError(f"Invalid file format: {file_ext}. Only CSV (optionally compressed), XLS, and XLSX are supported.")
+
+
+#
+# Get the separator to write a file with: the one given, or else the one of
+# the file itself (a comma for Excel files)
+#
+def file_separator(filename: str, separator: str = None) -> str:
+    if separator:
+        return separator
+    return sniff_dialect(filename)["delimiter"] if _file_format(filename)[0] == '.csv' else ","
+
+
+#
+# Read a file and output it as an iterator of dataframes of at most chunksize rows
+#
+def read_file_chunks(filename: str, separator: str = None, rows: int = -1, head: int = 0, converters = None, chunksize: int = 100000, progress = None, columns: List[str] = None, offsets: bool = False,
+                     repair: bool = False):
+    file_ext, compression = _file_format(filename)
+    if file_ext == '.csv': # If it's a CSV file, let pandas read it in chunks
+        offset, head = seek_rows(filename, separator, head) if offsets else (0, head)
+        kwargs = _csv_kwargs(filename, separator, rows, head, converters)
+        kwargs["chunksize"] = chunksize
+        if columns: # Only parse the columns asked for
+            kwargs["usecols"] = columns
+        with open_input(filename, progress, offset, repair) as f, pd.read_csv(f, **kwargs) as reader:
+            yield from reader
+    elif file_ext in ('.xls', '.xlsx'): # If we have an Excel file, stream its rows
+        for chunk in read_excel_chunks(filename, rows, head, converters, chunksize):
+            yield chunk[columns] if columns else chunk
+    else: # If we have an unsupported file type, raise an error
+        raise ValueError(f"Invalid file format: {file_ext}. Only CSV (optionally compressed), XLS, and XLSX are supported.")
+
+
+#
+# Memory-compact DataFrames: strings are stored in Arrow-backed arrays
+# (if pyarrow is installed), and columns with few distinct values are
+# turned into categoricals, which store each distinct value only once.
+#
+_CATEGORY_RATIO = 0.5 # At most this share of distinct values makes a column categorical
+_COMPACT_CHUNKSIZE = 10000 # Small chunks keep the parser's temporary Python strings few
+
+def compact_strings(df: pd.DataFrame) -> pd.DataFrame:
+    dtype = _compact_string_dtype()
+    if dtype is None: # Strings are already compact, or cannot be made so
+        return df
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+            df.isetitem(i, s.astype(dtype))
+    return df
+
+
+#
+# Concatenate chunks into a compact DataFrame. Each chunk is made compact as
+# it is read, with the columns that are repetitive in the first chunk stored
+# as categoricals; the result is then assembled column by column, releasing
+# the chunks' columns as it goes, so that the data is never held twice.
+#
+def compact_concat(chunks, ratio: float = _CATEGORY_RATIO) -> pd.DataFrame:
+    from pandas.api.types import union_categoricals
+    try:
+        import pyarrow
+        pyarrow.set_memory_pool(pyarrow.system_memory_pool()) # The default pool holds on to freed memory, raising the peak
+    except ImportError:
+        pass
+    parts = None
+    for chunk in chunks:
+        chunk = compact_strings(chunk)
+        if parts is None: # The first chunk decides which columns become categoricals
+            columns = chunk.columns
+            categorical = [chunk.iloc[:, i].nunique() <= ratio * len(chunk) for i in range(chunk.shape[1])]
+            parts = [[] for _ in columns]
+        for i in range(chunk.shape[1]):
+            s = chunk.iloc[:, i]
+            parts[i].append(s.astype("category") if categorical[i] else s)
+    if parts is None:
+        return pd.DataFrame()
+    df = {}
+    for i in range(len(columns)):
+        if categorical[i]:
+            try:
+                df[i] = pd.Series(union_categoricals(_empty_categories(parts[i]), sort_categories=True))
+            except TypeError: # The chunks have categories of different dtypes, such as numbers and strings: make them all strings
+                parts[i] = [p.cat.rename_categories(p.cat.categories.astype(str)) for p in parts[i]]
+                df[i] = pd.Series(union_categoricals(parts[i], sort_categories=True))
+        else:
+            df[i] = pd.concat(parts[i], ignore_index=True)
+        parts[i] = None # Release the chunks' column
+    df = pd.DataFrame(df, copy=False)
+    df.columns = columns
+    return df
+
+
+#
+# A chunk in which a column is empty throughout gets float categories for it;
+# give them the dtype of the other chunks' categories, so they can be joined
+#
+def _empty_categories(parts: list) -> list:
+    dtypes = [p.cat.categories.dtype for p in parts if len(p.cat.categories)]
+    if not dtypes:
+        return parts
+    return [p.cat.set_categories(pd.Index([], dtype=dtypes[0])) if not len(p.cat.categories) else p for p in parts]
+
+
+def _compact_string_dtype():
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    dtype = pd.Series(["a"], dtype=str).dtype
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow": # Strings are Arrow-backed by default (pandas 3)
+        return None
+    return pd.StringDtype("pyarrow")
+
+
+#
+# Replace missing values column by column, so that the DataFrame is never
+# copied as a whole; for categoricals, only the categories are touched.
+#
+def compact_fillna(df: pd.DataFrame, value = "") -> pd.DataFrame:
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if not s.hasnans:
+            continue
+        if isinstance(s.dtype, pd.CategoricalDtype) and value not in s.cat.categories:
+            s = _sort_categories(s.cat.add_categories([value]))
+        df.isetitem(i, s.fillna(value))
+    return df
+
+
+#
+# Keep the categories in sorted order, so that sorting by a categorical
+# column gives the same result as sorting by its values
+#
+def _sort_categories(s: pd.Series) -> pd.Series:
+    try:
+        return s.cat.reorder_categories(s.cat.categories.sort_values())
+    except TypeError: # Categories of mixed types cannot be sorted
+        return s
+
+
+#
+# Replace a substring column by column; for categoricals, only the
+# categories are rewritten, and columns without the substring are left alone.
+#
+def compact_replace(df: pd.DataFrame, old: str, new: str) -> pd.DataFrame:
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = s.cat.categories
+            if not pd.api.types.is_string_dtype(categories) or not categories.str.contains(old, regex=False).any():
+                continue
+            renamed = categories.str.replace(old, new, regex=False)
+            if renamed.is_unique:
+                df.isetitem(i, _sort_categories(s.cat.rename_categories(renamed)))
+            else: # Some categories collapse into one, so rebuild the categorical
+                df.isetitem(i, s.astype(categories.dtype).str.replace(old, new, regex=False).astype("category"))
+        elif pd.api.types.is_string_dtype(s.dtype) and s.dtype != object:
+            if s.str.contains(old, regex=False).any():
+                df.isetitem(i, s.str.replace(old, new, regex=False))
+        else:
+            df.isetitem(i, s.replace(re.escape(old), new, regex=True))
+    return df
+
+
+#
+# Get the arguments for pd.read_csv from the dialect of a CSV file;
+# the separator, if given, takes precedence over the detected one
+#
+def _csv_kwargs(filename: str, separator: str = None, rows: int = -1, head: int = 0, converters = None) -> dict:
+    dialect = sniff_dialect(filename)
+    if not separator: # If we don't have a separator, use the detected one
+        separator = dialect["delimiter"]
+    kwargs = {"sep": separator, "quotechar": dialect["quotechar"], "escapechar": dialect["escapechar"],
+              "encoding": dialect["encoding"], "skiprows": range(0, head)}
+    if rows > -1: # If we have a number of rows, use it
+        kwargs["nrows"] = rows
+    if converters: # If we have converters, use them
+        kwargs["converters"] = converters
+    else: # If we don't have converters, don't use them
+        kwargs["dtype"] = str
+    return kwargs
+
+
+#
+# Detect the dialect of a CSV file: its delimiter, quote and escape characters,
+# line terminator, byte order mark, and encoding.
+#
+# The dialect is guessed from samples of the start, the middle, and the end of
+# the file (only the start for compressed files), and cached by the fingerprint
+# of the file, so that it is only detected once.
+#
+_SNIFF_SAMPLE = 1 << 16
+_SNIFF_DELIMITERS = ",;\t|"
+_SNIFF_CACHE_SIZE = 1000
+_BOMS = [(b'\xef\xbb\xbf', 'utf-8-sig'), (b'\xff\xfe\x00\x00', 'utf-32'), (b'\x00\x00\xfe\xff', 'utf-32'),
+         (b'\xff\xfe', 'utf-16'), (b'\xfe\xff', 'utf-16')]
+
+def sniff_dialect(filename: str) -> dict:
+    fingerprint = file_fingerprint(filename)
+    cache = _read_cache("dialects.json")
+    if fingerprint in cache:
+        return cache[fingerprint]
+
+    dialect = _sniff_dialect(filename)
+    cache[fingerprint] = dialect
+    _write_cache("dialects.json", dict(list(cache.items())[-_SNIFF_CACHE_SIZE:]))
+    return dialect
+
+
+def _sniff_dialect(filename: str) -> dict:
+    #
+    # Take the samples
+    #
+    with open_input(filename) as f:
+        samples = [f.read(_SNIFF_SAMPLE)]
+        if not _file_format(filename)[1]: # Uncompressed files can be sampled anywhere
+            size = os.fstat(f.fileno()).st_size
+            if size > 3 * _SNIFF_SAMPLE:
+                for offset in (size // 2, size - _SNIFF_SAMPLE):
+                    f.seek(offset)
+                    sample = f.read(_SNIFF_SAMPLE)
+                    sample = sample[sample.find(b"\n") + 1:] # Start at a line
+                    if offset + _SNIFF_SAMPLE < size: # End at a line, not within a character
+                        sample = sample[:sample.rfind(b"\n") + 1]
+                    samples.append(sample)
+        if len(samples[0]) == _SNIFF_SAMPLE:
+            samples[0] = samples[0][:samples[0].rfind(b"\n") + 1] # End at a line
+
+    #
+    # Get the encoding from the byte order mark, or try UTF-8, then cp1252
+    #
+    bom = None
+    for mark, encoding in _BOMS:
+        if samples[0].startswith(mark):
+            bom = encoding
+            samples = samples[:1] # The other samples may not start at a character
+            break
+    else:
+        for encoding in ('utf-8', 'cp1252', 'latin-1'):
+            try:
+                for sample in samples:
+                    sample.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                pass
+    text = "\n".join(sample.decode(encoding, errors='replace') for sample in samples).lstrip('\ufeff')
+
+    #
+    # Get the line terminator from the start of the file
+    #
+    head = samples[0].decode(encoding, errors='replace')
+    crlf = head.count("\r\n")
+    terminators = {"\r\n": crlf, "\n": head.count("\n") - crlf, "\r": head.count("\r") - crlf}
+    lineterminator = max(terminators, key=terminators.get) if any(terminators.values()) else "\n"
+
+    #
+    # Get the quote character: the one that most often opens or closes fields
+    #
+    delimiters = re.escape(_SNIFF_DELIMITERS)
+    quotechar = '"'
+    if text.count("'") > 0:
+        scores = {q: len(re.findall(f"(?:^|[{delimiters}]){q}|{q}(?:[{delimiters}]|$)", text, re.MULTILINE)) for q in '"\''}
+        quotechar = "'" if scores["'"] > scores['"'] else '"'
+
+    #
+    # Get the delimiter: the candidate that occurs the same number of times in
+    # most lines, once the quoted fields are removed, and that also splits the
+    # first line (so that a single column of, say, 1;2 values is left alone)
+    #
+    q = re.escape(quotechar)
+    unquoted = re.sub(f"{q}(?:[^{q}\\\\]|\\\\.|{q}{q})*{q}", "", text, flags=re.DOTALL)
+    lines = [line for line in unquoted.splitlines() if line.strip()]
+    delimiter, best = ",", (0, 0)
+    for candidate in _SNIFF_DELIMITERS:
+        if lines and candidate not in lines[0]:
+            continue
+        counts = collections.Counter(line.count(candidate) for line in lines)
+        counts.pop(0, None)
+        if counts:
+            mode, frequency = counts.most_common(1)[0]
+            score = (frequency / len(lines), mode)
+            if score > best:
+                delimiter, best = candidate, score
+
+    #
+    # Get the escape character: a backslash, as the samples may not show the
+    # one escaped field of a file, unless a backslash is taken literally, as
+    # in C:\temp (an escaping file doubles it); quotes doubled within fields
+    # read the same either way
+    #
+    escapechar = "\\"
+    if re.search(f"(?<!\\\\)(?:\\\\\\\\)*\\\\[^\\\\{q}{re.escape(delimiter)}\\r\\n]", text):
+        escapechar = None
+
+    return {"delimiter": delimiter, "quotechar": quotechar, "escapechar": escapechar,
+            "lineterminator": lineterminator, "bom": bom is not None, "encoding": bom or encoding}
+
+
+#
+# Get a fingerprint of a file, which changes whenever the file does
+#
+def file_fingerprint(filename: str) -> str:
+    st = os.stat(filename)
+    return hashlib.sha1(f"{path.abspath(filename)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()
+
+
+#
+# Get the cache directory: $CSV2SQL_CACHE, or csv2sql in the user's cache directory
+#
+def cache_dir(*parts) -> str:
+    base = os.environ.get("CSV2SQL_CACHE") or path.join(os.environ.get("XDG_CACHE_HOME") or path.expanduser("~/.cache"), "csv2sql")
+    directory = path.join(base, *parts)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+#
+# Read and write a JSON file in the cache directory. The cache is only an
+# optimization, so if it cannot be read or written, it is just not used.
+#
+def _read_cache(name: str) -> dict:
+    try:
+        with open(path.join(cache_dir(), name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(name: str, data: dict) -> None:
+    try:
+        file = path.join(cache_dir(), name)
+        with open(f"{file}.{os.getpid()}", "w") as f:
+            json.dump(data, f)
+        os.replace(f"{file}.{os.getpid()}", file) # Atomically, for concurrent runs
+    except OSError:
+        pass
+
+
+#
+# Cache the frames that parse has read and cleaned (up to the queries) as
+# Parquet files in the cache directory, keyed by the fingerprint of the file
+# and the options that shape the frame, so that runs that only change the
+# queries, the order, or the output start from there. Reading a frame marks
+# it as used; the least recently used frames are evicted to keep the cache
+# within its size.
+#
+_FRAME_CACHE_VERSION = 1
+
+def frame_cache_key(filename: str, **options) -> str:
+    key = [_FRAME_CACHE_VERSION, file_fingerprint(filename), options]
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_frame_cache(key: str) -> Optional[pd.DataFrame]:
+    file = path.join(cache_dir("frames"), f"{key}.parquet")
+    if not path.exists(file):
+        return None
+    try:
+        df = pd.read_parquet(file)
+        os.utime(file)
+        return df
+    except (OSError, ValueError, TypeError, ImportError):
+        return None
+
+
+def write_frame_cache(key: str, df: pd.DataFrame, max_bytes: int) -> None:
+    directory = cache_dir("frames")
+    file = path.join(directory, f"{key}.parquet")
+    try:
+        df.to_parquet(f"{file}.{os.getpid()}")
+        os.replace(f"{file}.{os.getpid()}", file) # Atomically, for concurrent runs
+    except (OSError, ValueError, TypeError, ImportError): # Say, columns of mixed types, which Parquet cannot store
+        if path.exists(f"{file}.{os.getpid()}"):
+            os.remove(f"{file}.{os.getpid()}")
+        return
+    try:
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".parquet"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= max_bytes:
+                break
+            os.remove(entry)
+            total -= size
+    except OSError:
+        pass
+
+
+#
+# Get the extension of a file, and its compression: for my_file.csv.gz,
+# this is (".csv", "gzip")
+#
+_COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+def _file_format(filename: str):
+    root, file_ext = os.path.splitext(filename)
+    compression = _COMPRESSIONS.get(file_ext)
+    if compression:
+        file_ext = os.path.splitext(root)[1]
+    return file_ext, compression
+
+
+#
+# Get the name of a file without its extensions: my_file for my_file.csv.gz
+#
+def _file_stem(filename: str) -> str:
+    stem = Path(filename).stem
+    if _file_format(filename)[1]:
+        stem = Path(stem).stem
+    return stem
+
+
+#
+# Open a file for reading in binary mode, decompressing it on the fly if its
+# name ends with .gz, .bz2, or .zst. Decompression runs in its own thread(s)
+# if python-isal (gzip) or indexed_bzip2 (bzip2) are installed; zstd frames
+# can only be decoded sequentially.
+#
+# If given, progress is called with the number of bytes read so far from
+# the file itself, i.e. the compressed bytes. An offset starts reading an
+# uncompressed file there.
+#
+def open_input(filename: str, progress = None, offset: int = 0, repair: bool = False):
+    if repair: # Repair the data as it is read (see repair_csv)
+        return io.BufferedReader(_RepairReader(open_input(filename, progress, offset)), 1 << 20)
+    compression = _file_format(filename)[1]
+    f = open(filename, 'rb')
+    if offset: # Start reading there (uncompressed files only)
+        f.seek(offset)
+    if progress is not None:
+        f = io.BufferedReader(_ProgressReader(f, progress), 1 << 20)
+    if compression == 'gzip':
+        try:
+            from isal import igzip_threaded
+            return io.BufferedReader(_Closing(igzip_threaded.open(f, 'rb', threads=1), f), 1 << 20)
+        except ImportError:
+            import gzip
+            return io.BufferedReader(_Closing(gzip.open(f, 'rb'), f), 1 << 20)
+    elif compression == 'bz2':
+        try:
+            import indexed_bzip2
+            return io.BufferedReader(_Closing(indexed_bzip2.open(f, parallelization=os.cpu_count()), f), 1 << 20)
+        except ImportError:
+            import bz2
+            return io.BufferedReader(_Closing(bz2.open(f, 'rb'), f), 1 << 20)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            f.close()
+            raise ValueError(f"Reading {filename} needs the zstandard package.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True), 1 << 20)
+    return f
+
+
+#
+# A raw file that reports how far it has been read
+#
+class _ProgressReader(io.RawIOBase):
+    def __init__(self, f, progress):
+        self.f = f
+        self.progress = progress
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.f.seekable()
+
+    def seek(self, offset, whence = io.SEEK_SET):
+        return self.f.seek(offset, whence)
+
+    def tell(self):
+        return self.f.tell()
+
+    def readinto(self, b):
+        n = self.f.readinto(b)
+        self.progress(self.f.tell())
+        return n
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+#
+# Repair the broken quoting of CSV exports, as csvclean.sh does with
+# dos2unix and eight passes of perl over the file: line breaks become
+# Unix ones, triple quotes become one, JSON fragments like "{"a":"b"} are
+# flattened to "a:b", and stray quotes inside fields are dropped. Each
+# perl pass only works within a line, so the passes run over whole blocks
+# of lines here, with the line breaks kept out of the character classes,
+# which gives the same result in one read of the file.
+#
+_REPAIRS = [
+    (re.compile(rb'"""'), rb'"'),                                # Compress triple quotes
+    (re.compile(rb'"\{"([^"\n]*?)":"([^"\n]*?)"'), rb'"\1:\2"'), # Remove JSON and its quotes
+    (re.compile(rb'(,"[^",\n]*)"([^",\n]*",)'), rb'\1\2'),       # Remove leading inner quotes
+    (re.compile(rb'("[^",\n]*?)"([^",\n]*?")'), rb'\1\2'),       # Remove trailing inner quotes
+    (re.compile(rb',"([^"\n]*?)""$', re.MULTILINE), rb',"\1"'),  # And towards the end
+    (re.compile(rb'("[^",\n]*?)"([^",\n]*?")'), rb'\1\2'),       # Remove trailing inner quotes
+    (re.compile(rb'("[^",\n]*?")",'), rb'\1,'),                  # "",
+    (re.compile(rb'("[^",\n]*?")[^,\n]*?,'), rb'\1,'),           # ,"Emirates" on,
+]
+
+def repair_csv(data: bytes) -> bytes:
+    data = data.replace(b"\r\n", b"\n")
+    for pattern, replacement in _REPAIRS:
+        data = pattern.sub(replacement, data)
+    return data
+
+
+#
+# A raw stream of the repaired data of another one: the data is repaired
+# in blocks of whole lines, and the byte order mark is dropped, as dos2unix
+# does
+#
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+class _RepairReader(io.RawIOBase):
+    def __init__(self, f, block: int = 1 << 20):
+        self.f = f
+        self.block = block
+        self.pending = b"" # The start of a line that is not complete yet
+        self.data = b""
+        self.pos = 0
+        self.first = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.pos == len(self.data):
+            chunk = self.f.read(self.block)
+            data = self.pending + chunk
+            if self.first and (len(data) >= 3 or not chunk or not _UTF8_BOM.startswith(data)): # Enough to tell a byte order mark
+                data = data[3:] if data.startswith(_UTF8_BOM) else data
+                self.first = False
+            if not chunk: # The last line may have no line break
+                if not data:
+                    return 0
+                self.data, self.pending = repair_csv(data), b""
+            else: # A byte order mark not complete yet has no line break, so it stays pending
+                cut = data.rfind(b"\n") + 1
+                self.data, self.pending = repair_csv(data[:cut]), data[cut:]
+            self.pos = 0
+        n = min(len(b), len(self.data) - self.pos)
+        b[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+#
+# A decompressed stream that also closes the file it reads from
+#
+class _Closing(io.RawIOBase):
+    def __init__(self, stream, f):
+        self.stream = stream
+        self.f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.stream.readinto(b)
+
+    def close(self):
+        self.stream.close()
+        self.f.close()
+        super().close()
+
+
+#
+# Get the column names, the maximum length of each column, and the number of
+# rows from an iterator of dataframes. The first skip rows are counted, but
+# their lengths are ignored. Missing values count as empty strings.
+#
+def profile_lengths(chunks, skip: int = 0, advance = None):
+    hdrs = []
+    cols = []
+    rows = 0
+    for df in chunks:
+        if not hdrs:
+            hdrs = list(df.columns)
+            cols = [0] * len(hdrs)
+        if advance:
+            advance(len(df))
+        rows += len(df)
+        if skip > 0:
+            skipped = min(skip, len(df))
+            skip -= skipped
+            df = df.iloc[skipped:]
+        if len(df) > 0:
+            lengths = df.apply(lambda c: c.fillna("").map(str).str.len().max())
+            cols = [max(a, int(b)) for a, b in zip(cols, lengths)]
+    return hdrs, cols, rows
+
+
+#
+# Sample rows of a file to estimate the maximum length of each column, for
+# table --sample. Returns the column names, the lengths of the sampled rows
+# (a rows x columns array), and the number of rows of the file, estimated
+# from the bytes per sampled row when the file is not read in full.
+#
+#   reservoir:  a uniform sample of the rows, in one pass over the file
+#   stratified: short runs of rows at random offsets in equal slices of the
+#               file, found by seeking; no other part of the file is read
+#   ends:       the first and the last rows, and stratified runs in between
+#
+# Seeking needs an uncompressed CSV file; other files are sampled with
+# reservoir. After a seek, reading starts at the next line, and rows with
+# the wrong number of fields (say, from the middle of a quoted field) are
+# dropped.
+#
+_SAMPLINGS = ("head", "reservoir", "stratified", "ends")
+_SAMPLE_RUN = 10 # Rows read after each seek
+
+def sample_lengths(filename: str, separator: str, head: int, n: int, how: str, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    file_ext, compression = _file_format(filename)
+    dialect = sniff_dialect(filename) if file_ext == '.csv' else None
+    separator = separator or (dialect["delimiter"] if dialect else None)
+    if how == "reservoir" or dialect is None or compression or len(separator) != 1:
+        return _reservoir_lengths(read_file_chunks(filename, separator, -1, head), n, rng)
+
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        hdrs, start = _csv_header(f, separator, head, dialect)
+        reader = lambda text: csv.reader(StringIO(text), delimiter=separator, quotechar=dialect["quotechar"],
+                                         escapechar=dialect["escapechar"] or None)
+
+        #
+        # Read count rows from offset on, or the last count rows of the file
+        #
+        def rows_at(offset: int, count: int, tail: bool = False) -> list:
+            block = 1 << 14
+            while True:
+                if tail:
+                    offset = max(start, size - block)
+                f.seek(offset)
+                data = f.read(block)
+                end = offset + len(data) >= size
+                if not end: # Only complete lines
+                    data = data[:data.rfind(b"\n") + 1]
+                if offset > start: # Start at the next line
+                    data = data[data.find(b"\n") + 1:]
+                rows = [row for row in reader(data.decode(dialect["encoding"], errors='replace')) if len(row) == len(hdrs)]
+                if len(rows) >= count or (end and not tail) or offset == start or block >= 1 << 26:
+                    return rows[-count:] if tail else rows[:count]
+                block *= 4
+
+        rows = []
+        if how == "ends":
+            rows += rows_at(start, max(1, n // 3))
+            rows += rows_at(start, max(1, n // 3), tail=True)
+        strata = max(1, -(-(n - len(rows)) // _SAMPLE_RUN))
+        for i, u in enumerate(rng.random(strata)):
+            rows += rows_at(start + int((i + u) * (size - start) / strata), _SAMPLE_RUN)
+
+    lengths = np.array([[len(v) for v in row] for row in rows], dtype=np.int64).reshape(len(rows), len(hdrs))
+    width = sum(len(separator.join(row).encode(dialect["encoding"], errors='replace')) + 1 for row in rows) / max(len(rows), 1)
+    return hdrs, lengths, max(len(rows), int((size - start) / max(width, 1))) # The rows, estimated from their bytes
+
+
+#
+# Get the column names of a CSV file, and the offset of its first data row
+#
+def _csv_header(f, separator: str, head: int, dialect: dict) -> tuple:
+    block = 1 << 16
+    while True:
+        f.seek(0)
+        data = f.read(block)
+        buf = np.frombuffer(data, dtype=np.uint8)
+        offsets = np.zeros(len(data) + 1, dtype=np.int64)
+        kernel = _offsets_kernel_jit or _offsets_kernel
+        esc = ord(dialect["escapechar"]) if dialect["escapechar"] else -1
+        n = kernel(buf, 0, len(data), ord(separator), ord(dialect["quotechar"]), esc, 1, offsets)
+        if n > head or len(data) < block:
+            break
+        block *= 4
+    start = int(offsets[head]) if n > head else len(data)
+    first = int(offsets[head - 1]) if head > 0 and n >= head else 0
+    header = data[first:start].decode(dialect["encoding"], errors='replace').lstrip('\ufeff')
+    for hdrs in csv.reader(StringIO(header), delimiter=separator, quotechar=dialect["quotechar"], escapechar=dialect["escapechar"] or None):
+        return _mangle_headers(hdrs), start
+    return [], start
+
+
+#
+# Keep a uniform sample of n rows of chunks (reservoir sampling): row i
+# replaces a random one of the sample with probability n / (i + 1)
+#
+def _reservoir_lengths(chunks, n: int, rng) -> tuple:
+    hdrs, sample, seen = [], None, 0
+    for df in chunks:
+        if sample is None:
+            hdrs = list(df.columns)
+            sample = np.zeros((n, len(hdrs)), dtype=np.int64)
+        lengths = np.column_stack([df[c].fillna("").map(str).str.len().to_numpy(dtype=np.int64) for c in df.columns]) if len(df) \
+                  else np.zeros((0, len(hdrs)), dtype=np.int64)
+        index = seen + np.arange(len(df))
+        slots = np.where(index < n, index, rng.integers(0, index + 1))
+        keep = slots < n
+        sample[slots[keep]] = lengths[keep] # Later rows win, as if one by one
+        seen += len(df)
+    if sample is None:
+        return hdrs, np.zeros((0, 0), dtype=np.int64), 0
+    return hdrs, sample[:min(n, seen)], seen
+
+
+#
+# Estimate how likely no row of a file is longer than the longest sampled
+# one, for each column. The lengths above the 90th percentile of the sample
+# are fitted with a generalized Pareto tail (peaks over threshold, by the
+# method of moments, with the shape kept >= 0 so that the tail is never
+# assumed to end), unless they are all the same, which suggests a fixed
+# format. With that, the share s of rows longer than the sampled maximum is
+# estimated, and the chance that none of the rows is longer is
+# (1 - s) ** rows. Returns the chances, and the lengths that the longest of
+# the rows stays under with 95% probability.
+#
+def length_confidence(lengths: np.ndarray, rows: int) -> tuple:
+    n = len(lengths)
+    chances, projected = [], []
+    for column in lengths.T:
+        top = int(column.max()) if n else 0
+        threshold = np.quantile(column, 0.9) if n else 0
+        excess = column[column > threshold] - threshold
+        if rows <= n or len(excess) == 0 or excess.min() == excess.max(): # All rows, nothing sticks out, or a fixed format
+            chances.append(1.0 if n else 0.0)
+            projected.append(top)
+            continue
+        share, mean, var = len(excess) / n, excess.mean(), excess.var()
+        shape = max(0.0, 0.5 * (1 - mean * mean / var))
+        scale = 0.5 * mean * (1 + mean * mean / var) if shape > 0 else mean
+        survival = lambda y: (1 + shape * y / scale) ** (-1 / shape) if shape > 0 else np.exp(-y / scale)
+        longer = share * survival(top - threshold)
+        chances.append(float(np.exp(rows * np.log1p(-min(longer, 1 - 1e-12)))))
+        tail = -np.log(0.95) / (rows * share) # The survival of the length the longest row stays under
+        y = scale / shape * (tail ** -shape - 1) if shape > 0 else -scale * np.log(tail)
+        projected.append(max(top, int(np.ceil(threshold + y))))
+    return chances, projected
+
+
+#
+# The lengths at which the column types change: varchar up to 255 characters
+# takes one byte for its length, and 65,535 bytes is the most a row can hold
+#
+_LENGTH_BOUNDARIES = (255, 65535)
+
+def near_boundary(length: int, projected: int) -> Optional[int]:
+    for boundary in _LENGTH_BOUNDARIES:
+        if length <= boundary < max(projected, length * 1.1):
+            return boundary
+    return None
+
+
+#
+# Profile a column beyond its length, chunk by chunk: the missing and blank
+# values, the number of distinct values (estimated with a HyperLogLog), the
+# smallest and largest values (as numbers while all values are numbers, as
+# strings otherwise), the most frequent values (space-saving: only the top
+# values are kept, and error bounds the count a dropped value may have had),
+# and a histogram of the lengths in powers of two. Two profiles of the same
+# column merge into the profile of both, so that chunks can be profiled
+# apart, say in processes, and added up.
+#
+_HLL_PRECISION = 12 # 4,096 registers, for an error of about 1.6%
+_TOP_VALUES = 10
+
+class ColumnStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.missing = 0
+        self.blank = 0
+        self.length = 0
+        self.lengths = np.zeros(64, dtype=np.int64) # lengths[b]: the values of bit_length(length) b
+        self.registers = np.zeros(1 << _HLL_PRECISION, dtype=np.uint8)
+        self.numeric = True # Whether all values so far are numbers
+        self.low = self.high = None # The smallest and largest number
+        self.first = self.last = None # The smallest and largest string
+        self.top = {}
+        self.error = 0
+
+    def update(self, values: pd.Series) -> "ColumnStats":
+        rows = len(values)
+        values = values.dropna()
+        self.rows += rows
+        self.missing += rows - len(values)
+        if len(values) == 0:
+            return self
+        values = values.astype(str)
+        lengths = values.str.len().to_numpy(dtype=np.int64)
+        self.length = max(self.length, int(lengths.max()))
+        self.lengths += np.bincount(np.frexp(lengths)[1], minlength=64)[:64]
+        self.blank += int(values.str.isspace().sum()) + int((lengths == 0).sum())
+
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        p = _HLL_PRECISION
+        ranks = 65 - np.frexp(((hashes << np.uint64(p)) | np.uint64(1 << (p - 1))).astype(np.float64))[1]
+        np.maximum.at(self.registers, (hashes >> np.uint64(64 - p)).astype(np.intp), ranks.astype(np.uint8))
+
+        self._strings(values.min(), values.max())
+        if self.numeric: # Until a value is not a number
+            try: # Raising stops at the first value that is not a number, where coercing parses them all
+                numbers = pd.to_numeric(values)
+                self.numeric = not numbers.isna().any()
+            except (ValueError, TypeError):
+                self.numeric = False
+            if self.numeric:
+                self._numbers(numbers.min().item(), numbers.max().item())
+
+        counts = values.value_counts()
+        self._add_top(dict(zip(counts.index[:4 * _TOP_VALUES], counts.to_numpy()[:4 * _TOP_VALUES].tolist())),
+                      int(counts.iloc[4 * _TOP_VALUES]) if len(counts) > 4 * _TOP_VALUES else 0)
+        return self
+
+    def merge(self, other: "ColumnStats") -> "ColumnStats":
+        self.rows += other.rows
+        self.missing += other.missing
+        self.blank += other.blank
+        self.length = max(self.length, other.length)
+        self.lengths += other.lengths
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.numeric = self.numeric and other.numeric
+        if other.low is not None:
+            self._numbers(other.low, other.high)
+        if other.first is not None:
+            self._strings(other.first, other.last)
+        self._add_top(other.top, other.error)
+        return self
+
+    def _numbers(self, low: float, high: float) -> None:
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+
+    def _strings(self, first: str, last: str) -> None:
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+
+    def _add_top(self, counts: dict, error: int) -> None:
+        for value, count in counts.items():
+            self.top[value] = self.top.get(value, 0) + count
+        self.error += error
+        if len(self.top) > 4 * _TOP_VALUES: # Keep the most frequent values only
+            ranked = sorted(self.top.items(), key=lambda item: -item[1])
+            self.error += ranked[4 * _TOP_VALUES][1]
+            self.top = dict(ranked[:4 * _TOP_VALUES])
+
+    #
+    # The HyperLogLog estimate, with linear counting for few values
+    #
+    def distinct(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def as_dict(self) -> dict:
+        top = sorted(self.top.items(), key=lambda item: -item[1])[:_TOP_VALUES]
+        return {"column": self.name, "rows": self.rows, "missing": self.missing, "blank": self.blank,
+                "distinct": self.distinct(), "length": self.length, "numeric": self.numeric and self.low is not None,
+                "min": self.low if self.numeric else self.first, "max": self.high if self.numeric else self.last,
+                "top": [{"value": value, "count": count} for value, count in top], "top_error": self.error,
+                "lengths": [{"from": (1 << b) >> 1, "to": (1 << b) - 1, "count": int(n)} for b, n in enumerate(self.lengths) if n]}
+
+
+#
+# Profile the lengths of chunks like profile_lengths does, and each column
+# with ColumnStats; with workers > 1, the chunks are profiled in a pool of
+# processes. Returns the column names, their maximum lengths, the number of
+# rows, and the ColumnStats of each column.
+#
+def profile_stats(chunks, skip: int = 0, advance = None, workers: int = 1):
+    hdrs, stats, rows = [], [], 0
+
+    def data(chunks):
+        nonlocal hdrs, rows, skip
+        for df in chunks:
+            if not hdrs:
+                hdrs = list(df.columns)
+            if advance:
+                advance(len(df))
+            rows += len(df)
+            if skip > 0: # The first rows are only counted
+                skipped = min(skip, len(df))
+                skip -= skipped
+                df = df.iloc[skipped:]
+            if len(df) > 0:
+                yield df
+
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        profiles = (_chunk_stats(df) for df in data(chunks)) if pool is None else _ordered_map(pool, _chunk_stats, data(chunks), 2 * workers)
+        for profile in profiles:
+            stats = profile if not stats else [a.merge(b) for a, b in zip(stats, profile)]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    stats = stats or [ColumnStats(hdr) for hdr in hdrs]
+    return hdrs, [s.length for s in stats], rows, stats
+
+
+def _chunk_stats(df: pd.DataFrame) -> List[ColumnStats]:
+    return [ColumnStats(col).update(df[col]) for col in df.columns]
+
+
+#
+# Show the column profiles as a table; the lengths are shown as a bar per
+# power of two (0, 1, 2-3, 4-7, ...)
+#
+_BARS = " ▁▂▃▄▅▆▇█"
+
+def print_stats(stats: List[ColumnStats], hdrs: List[str], console: Console) -> None:
+    table = rich.table.Table(show_header=True, header_style="bold magenta", title="Columns")
+    for col in ("#", "Column", "Length", "Missing", "Blank", "Distinct", "Min", "Max", "Top values", "Lengths"):
+        table.add_column(col, justify="right" if col in ("#", "Length", "Missing", "Blank", "Distinct") else "left", style="cyan")
+    short = lambda v: "" if v is None else rich.markup.escape(str(v) if len(str(v)) <= 20 else f"{str(v)[:19]}…")
+    for i, (hdr, s) in enumerate(zip(hdrs, stats)):
+        d = s.as_dict()
+        top = ", ".join(f"{short(t['value'])} ({t['count']:,})" for t in d["top"][:3])
+        used = s.lengths[:max(np.flatnonzero(s.lengths), default=0) + 1]
+        bars = "".join(_BARS[int(np.ceil(n / used.max() * (len(_BARS) - 1)))] for n in used) if used.any() else ""
+        table.add_row(str(i + 1), rich.markup.escape(hdr), f"{d['length']:,}", f"{d['missing']:,}", f"{d['blank']:,}",
+                      f"~{d['distinct']:,}", short(d["min"]), short(d["max"]), top, bars)
+    console.print(table)
+
+
+#
+# Get the column names, the maximum length of each column, and the number of
+# rows of a CSV file, like profile_lengths does, but without pandas.
+#
+# The file is memory-mapped and its bytes are walked by _scan_kernel, which
+# tracks the quoting state and records the length (in characters) of every
+# field into a NumPy array; no Python strings are created except for the
+# header. The kernel is compiled with numba if it is installed, and the
+# csv module is used otherwise.
+#
+def scan_lengths(filename: str, separator: str, head: int = 0, rows: int = -1, skip: int = 0,
+                 quotechar: str = '"', escapechar: str = None, encoding: str = 'utf-8', advance = None):
+    if _scan_kernel_jit is None:
+        return _scan_lengths_py(filename, separator, head, rows, skip, quotechar, escapechar, encoding, advance)
+    sep, quote = ord(separator), ord(quotechar)
+    esc = ord(escapechar) if escapechar else -1
+    mask, cont = (0xC0, 0x80) if encoding.replace("-", "").lower().startswith("utf8") else (0, 1)
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [], np.zeros(0, dtype=np.int64), 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            scan = lambda pos, lengths, n: _scan_records(_scan_kernel_jit, buf, pos, size, sep, quote, esc, mask, cont, lengths, n, advance)
+            hdrs, pos = _scan_header(mm, scan, head, separator, quotechar, escapechar, encoding)
+
+            #
+            # Scan the data rows: the first skip rows are only counted
+            #
+            limit = rows if rows > -1 else _SCAN_ALL
+            lengths = np.zeros(max(len(hdrs), 1) * 2, dtype=np.int64)
+            pos, skipped, _ = scan(pos, np.zeros(len(lengths), dtype=np.int64), min(skip, limit))
+            pos, scanned, lengths = scan(pos, lengths, limit - skipped)
+            del buf # Release the export of the mmap before it is closed
+    return hdrs, lengths[:len(hdrs)], skipped + scanned
+
+
+_SCAN_ENCODINGS = ('utf-8', 'utf-8-sig', 'cp1252', 'latin-1') # The encodings scan_lengths can deal with
+
+
+#
+# Name the columns like pandas does: "Unnamed: n" for empty headers,
+# and ".n" suffixes for duplicates
+#
+def _mangle_headers(names):
+    columns = []
+    for i, name in enumerate(names):
+        name = name or f"Unnamed: {i}"
+        base, n = name, 0
+        while name in columns:
+            n += 1
+            name = f"{base}.{n}"
+        columns.append(name)
+    return columns
+
+
+#
+# Skip the BOM and the head lines before the header, and parse the header
+# itself with the csv module. Returns the column names and the position of
+# the first data row.
+#
+def _scan_header(mm, scan, head: int, separator: str, quotechar: str, escapechar: str, encoding: str):
+    pos = 3 if mm[:3] == b'\xef\xbb\xbf' else 0 # Skip the BOM
+    pos, _, _ = scan(pos, np.zeros(64, dtype=np.int64), head)
+    start = pos
+    pos, _, _ = scan(pos, np.zeros(64, dtype=np.int64), 1)
+    header = mm[start:pos].decode(encoding, errors='replace')
+    escape = escapechar if escapechar else None
+    hdrs = [] # The first row that is not blank
+    for hdrs in csv.reader(StringIO(header), delimiter=separator, quotechar=quotechar, escapechar=escape):
+        if len(hdrs) > 1 or (hdrs and hdrs[0].strip(" \t")):
+            break
+    return _mangle_headers(hdrs), pos
+
+
+#
+# Run the scan kernel in batches of records, to report progress and to grow
+# the lengths array when a record has more fields than it can hold
+#
+_SCAN_ALL = 2**62
+_SCAN_BATCH = 100000
+
+def _scan_records(kernel, buf, pos, end, sep, quote, esc, mask, cont, lengths, max_records, advance = None):
+    records = 0
+    while records < max_records and pos < end:
+        batch = min(_SCAN_BATCH, max_records - records)
+        pos, n, overflow = kernel(buf, pos, end, sep, quote, esc, mask, cont, lengths, batch)
+        records += n
+        if advance and n:
+            advance(n)
+        if overflow: # Grow the array, and rescan the record that did not fit
+            lengths = np.concatenate([lengths, np.zeros(len(lengths), dtype=np.int64)])
+    return pos, records, lengths
+
+
+#
+# Walk the bytes buf[pos:end] and record the maximum length of each field
+# into lengths, for at most max_records records. Returns the position after
+# the last record, the number of records, and whether a record had more
+# fields than lengths can hold (in which case the position is at its start).
+#
+# Characters are the bytes b for which b & mask != cont, so that UTF-8
+# continuation bytes are not counted. Quoted fields follow the pandas rules:
+# doubled quotes count as one character, and so do escaped characters.
+#
+def _scan_kernel(buf, pos, end, sep, quote, esc, mask, cont, lengths, max_records):
+    capacity = lengths.shape[0]
+    records = 0
+    field = 0
+    flen = 0
+    state = 0 # 0: start of field, 1: unquoted field, 2: quoted field, 3: quote in a quoted field
+    escaped = False
+    empty = True # Only blanks so far in this record
+    start = pos
+    while pos < end and records < max_records:
+        c = buf[pos]
+        pos += 1
+        if escaped: # The character after the escape character is taken as is
+            escaped = False
+            if (c & mask) != cont:
+                flen += 1
+            if state != 2:
+                state = 1
+        elif state == 2:
+            if c == quote:
+                state = 3
+            elif c == esc:
+                escaped = True
+            elif (c & mask) != cont:
+                flen += 1
+        elif state == 3 and c == quote: # A doubled quote
+            flen += 1
+            state = 2
+        elif c == sep or c == 10 or c == 13:
+            if c != sep:
+                if c == 13 and pos < end and buf[pos] == 10:
+                    pos += 1
+                if empty: # Blank lines are skipped
+                    flen = 0
+                    state = 0
+                    start = pos
+                    continue
+            if field >= capacity:
+                return start, records, True
+            if flen > lengths[field]:
+                lengths[field] = flen
+            field += 1
+            flen = 0
+            state = 0
+            empty = False
+            if c != sep:
+                records += 1
+                field = 0
+                empty = True
+                start = pos
+        else:
+            if c != 32 and c != 9: # Lines with only blanks are skipped, too
+                empty = False
+            if state == 0 and c == quote:
+                state = 2
+            elif c == esc:
+                escaped = True
+            else:
+                if (c & mask) != cont:
+                    flen += 1
+                state = 1
+    if pos >= end and not empty and records < max_records: # The last line has no line terminator
+        if field >= capacity:
+            return start, records, True
+        if flen > lengths[field]:
+            lengths[field] = flen
+        records += 1
+        start = pos
+    return start, records, False
+
+
+try:
+    from numba import njit
+    _scan_kernel_jit = njit(cache=True, nogil=True)(_scan_kernel)
+except ImportError:
+    _scan_kernel_jit = None
+
+
+#
+# Get the column names, the maximum length of each column, the number of
+# rows, and the ColumnStats of each column of a CSV file, with the parsing
+# spread over processes, too: the scanner finds the header and the skipped
+# rows, the rest of the file is cut at the cached record_offsets, and each
+# piece is read with pandas and profiled by profile_stats, so that the
+# profile is the one profile_stats takes of the whole file (the same NA
+# markers, hashes, and ColumnStats). Returns None if numba is not installed.
+#
+def scan_stats(filename: str, separator: str, head: int = 0, rows: int = -1, skip: int = 0, quotechar: str = '"',
+               escapechar: str = None, encoding: str = 'utf-8', advance = None, workers: int = 1):
+    if _scan_kernel_jit is None:
+        return None
+    sep, quote = ord(separator), ord(quotechar)
+    esc = ord(escapechar) if escapechar else -1
+    mask, cont = (0xC0, 0x80) if encoding.replace("-", "").lower().startswith("utf8") else (0, 1)
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [], [], 0, []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            scan = lambda pos, lengths, n: _scan_records(_scan_kernel_jit, buf, pos, size, sep, quote, esc, mask, cont, lengths, n, advance)
+            hdrs, pos = _scan_header(mm, scan, head, separator, quotechar, escapechar, encoding)
+            limit = rows if rows > -1 else _SCAN_ALL
+            pos, skipped, _ = scan(pos, np.zeros(max(len(hdrs), 1) * 2, dtype=np.int64), min(skip, limit))
+            del buf # Release the export of the mmap before it is closed
+
+    #
+    # Cut the rest of the file into pieces for the workers, at record boundaries
+    #
+    cuts = []
+    if workers > 1 and limit == _SCAN_ALL:
+        offsets = record_offsets(filename, separator)
+        if offsets is not None:
+            inside = offsets[(offsets > pos) & (offsets < size)]
+            parts = 4 * workers
+            cuts = sorted(set(int(offset) for offset in inside[(np.arange(1, parts) * len(inside)) // parts])) if len(inside) else []
+    pieces = list(zip([pos] + cuts, cuts + [size]))
+    dialect = (separator, quotechar, escapechar, encoding)
+
+    stats, scanned = None, 0
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if len(pieces) > 1 else None
+    try:
+        if pool is None:
+            results = [_stats_piece(pieces[0], filename, limit - skipped, hdrs, dialect, advance)]
+        else:
+            results = _ordered_map(pool, _stats_piece, pieces, 2 * workers, filename, limit, hdrs, dialect)
+        for records, profile in results:
+            scanned += records
+            stats = profile if stats is None else [a.merge(b) for a, b in zip(stats, profile)]
+            if advance and pool is not None:
+                advance(records)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return hdrs, [s.length for s in stats], skipped + scanned, stats
+
+
+#
+# Profile the records in the piece (start, end) of the bytes of a file, at
+# most max_records of them, with profile_stats; returns the number of
+# records and a ColumnStats per column
+#
+def _stats_piece(piece: tuple, filename: str, max_records: int, hdrs: List[str], dialect: tuple, advance = None):
+    start, end = piece
+    separator, quotechar, escapechar, encoding = dialect
+    if max_records <= 0 or start >= end:
+        return 0, [ColumnStats(hdr) for hdr in hdrs]
+    kwargs = {"sep": separator, "quotechar": quotechar, "escapechar": escapechar, "encoding": encoding, "header": None,
+              "names": hdrs, "index_col": False, "dtype": str, "chunksize": _SCAN_BATCH}
+    if max_records < _SCAN_ALL:
+        kwargs["nrows"] = max_records
+    with open(filename, 'rb') as f, io.BufferedReader(_RangeReader(f, start, end), 1 << 20) as r, pd.read_csv(r, **kwargs) as reader:
+        _, _, records, stats = profile_stats(reader, advance=advance)
+    return records, stats
+
+
+#
+# A raw stream of the bytes of a file from start to end
+#
+class _RangeReader(io.RawIOBase):
+    def __init__(self, f, start: int, end: int):
+        self.f = f
+        self.f.seek(start)
+        self.left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.f.readinto(memoryview(b)[:min(len(b), self.left)])
+        self.left -= n
+        return n
+
+
+#
+# Get the byte offsets of every every-th row of a CSV file: offsets[k] is
+# where the rows start once k * every rows are skipped, as pandas counts them
+# for skiprows (blank lines count, a quoted line break does not). The offsets
+# are found in one scan of the memory-mapped file and kept in the cache
+# directory, keyed by the fingerprint of the file, so that later runs can
+# seek close to the rows they skip. Returns None if the file cannot be
+# scanned this way (compressed, a separator of several characters, or an
+# encoding whose bytes are not ASCII-compatible).
+#
+_OFFSETS_EVERY = 10000
+
+def record_offsets(filename: str, separator: str = None, every: int = _OFFSETS_EVERY) -> Optional[np.ndarray]:
+    dialect = sniff_dialect(filename)
+    separator = separator or dialect["delimiter"]
+    if _file_format(filename) != ('.csv', None) or len(separator) != 1 or dialect["encoding"] not in _SCAN_ENCODINGS:
+        return None
+    file = path.join(cache_dir("offsets"), f"{file_fingerprint(filename)}-{ord(separator)}-{every}.npy")
+    try:
+        return np.load(file)
+    except (OSError, ValueError):
+        pass
+
+    kernel = _offsets_kernel_jit or _offsets_kernel
+    esc = ord(dialect["escapechar"]) if dialect["escapechar"] else -1
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return np.zeros(1, dtype=np.int64)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            offsets = np.zeros(size // every + 2, dtype=np.int64) # At least one byte per row
+            offsets[0] = 3 if mm[:3] == b'\xef\xbb\xbf' else 0 # Skip the BOM
+            n = kernel(buf, offsets[0], size, ord(separator), ord(dialect["quotechar"]), esc, every, offsets[1:])
+            offsets = offsets[:n + 1].copy()
+            del buf # Release the export of the mmap before it is closed
+    try:
+        np.save(f"{file}.{os.getpid()}.npy", offsets)
+        os.replace(f"{file}.{os.getpid()}.npy", file) # Atomically, for concurrent runs
+    except OSError:
+        pass
+    return offsets
+
+
+#
+# Walk the bytes buf[pos:end] and write the position after every every-th
+# row into offsets. Rows end at line breaks outside of quoted fields.
+# Returns the number of offsets written.
+#
+def _offsets_kernel(buf, pos, end, sep, quote, esc, every, offsets):
+    n = 0
+    rows = 0
+    state = 0 # 0: start of field, 1: unquoted field, 2: quoted field, 3: quote in a quoted field
+    escaped = False
+    while pos < end:
+        c = buf[pos]
+        pos += 1
+        if escaped: # The character after the escape character is taken as is
+            escaped = False
+            if state != 2:
+                state = 1
+        elif state == 2:
+            if c == quote:
+                state = 3
+            elif c == esc:
+                escaped = True
+        elif state == 3 and c == quote: # A doubled quote
+            state = 2
+        elif c == sep:
+            state = 0
+        elif c == 10 or c == 13:
+            if c == 13 and pos < end and buf[pos] == 10:
+                pos += 1
+            state = 0
+            rows += 1
+            if rows == every:
+                offsets[n] = pos
+                n += 1
+                rows = 0
+        elif state == 0 and c == quote:
+            state = 2
+        elif c == esc:
+            escaped = True
+        else:
+            state = 1
+    return n
+
+
+try:
+    from numba import njit
+    _offsets_kernel_jit = njit(cache=True, nogil=True)(_offsets_kernel)
+except ImportError:
+    _offsets_kernel_jit = None
+
+
+#
+# Get where to start reading a CSV file to skip head rows: the offset of the
+# nearest indexed row before, and the rows left to skip from there
+#
+def seek_rows(filename: str, separator: str, head: int) -> tuple:
+    if head < _OFFSETS_EVERY:
+        return 0, head
+    offsets = record_offsets(filename, separator)
+    if offsets is None:
+        return 0, head
+    k = min(head // _OFFSETS_EVERY, len(offsets) - 1)
+    return int(offsets[k]), head - k * _OFFSETS_EVERY
+
+
+#
+# The pure-Python fallback of scan_lengths, for when numba is not installed:
+# walking the bytes in Python is slower than pandas, so the records are
+# parsed with the csv module instead.
+#
+def _scan_lengths_py(filename: str, separator: str, head: int, rows: int, skip: int,
+                     quotechar: str, escapechar: str, encoding: str, advance = None):
+    with open(filename, 'r', encoding=encoding, errors='replace', newline='') as f:
+        if f.read(1) != '\ufeff': # Skip the BOM
+            f.seek(0)
+        records = csv.reader(_skip_blank_lines(f, separator, quotechar, escapechar), delimiter=separator, quotechar=quotechar, escapechar=escapechar or None)
+        for _ in range(head): # Skip the lines before the header
+            next(records, None)
+        hdrs = _mangle_headers(next(records, []))
+        maxima = [0] * len(hdrs)
+        count = 0
+        for row in records:
+            if count == rows:
+                break
+            count += 1
+            if advance and count % _SCAN_BATCH == 0:
+                advance(_SCAN_BATCH)
+            if count <= skip:
+                continue
+            if len(row) > len(maxima):
+                maxima += [0] * (len(row) - len(maxima))
+            for i, field in enumerate(row):
+                if len(field) > maxima[i]:
+                    maxima[i] = len(field)
+        if advance:
+            advance(count % _SCAN_BATCH)
+    return hdrs, np.array(maxima[:len(hdrs)], dtype=np.int64), count
+
+
+#
+# Drop the lines that only hold blanks, unless they are within a quoted field
+# (as the scan kernel does)
+#
+def _skip_blank_lines(lines, separator: str = ",", quotechar: str = '"', escapechar: str = None):
+    blanks = " \t\r\n".replace(separator, "") # A tab separator makes a line of tabs a record of empty fields
+    escaped = re.compile(f"{re.escape(escapechar)}.") if escapechar else None
+    quoted = False
+    for line in lines:
+        if quoted or line.strip(blanks):
+            yield line
+        quotes = escaped.sub("", line) if escaped else line # Escaped quotes neither open nor close a field
+        quoted ^= quotes.count(quotechar) % 2 == 1
+
+
+#
+# Read the first sheet of an Excel file as an iterator of dataframes.
+#
+# Rows are streamed from python-calamine if it is installed, and from openpyxl
+# in read-only mode otherwise, so the full openpyxl object model of the workbook
+# is never built. Cells are converted the way pd.read_excel(dtype=str) does it.
+#
+def read_excel_chunks(filename: str, rows: int = -1, head: int = 0, converters = None, chunksize: int = 100000):
+    excel_rows = _excel_rows(filename)
+    try:
+        for _ in range(head): # Skip the lines before the header
+            next(excel_rows)
+        header = [_excel_cell(value) for value in next(excel_rows)]
+    except StopIteration:
+        return
+    width = len(header)
+
+    buffer = []
+    blank = [] # Blank rows are only kept if they are followed by data
+    start = 0
+    count = 0
+    for row in excel_rows:
+        if rows > -1 and count >= rows:
+            break
+        count += 1
+        row = [_excel_cell(value) for value in row[:width]]
+        row += [""] * (width - len(row))
+        if all(value == "" for value in row):
+            blank.append(row)
+            continue
+        buffer.extend(blank)
+        blank = []
+        buffer.append(row)
+        if len(buffer) >= chunksize:
+            yield _excel_frame(header, buffer, converters, start)
+            start += len(buffer)
+            buffer = []
+    if buffer or start == 0:
+        yield _excel_frame(header, buffer, converters, start)
+
+
+#
+# Iterate over the raw rows of the first sheet of an Excel file
+#
+def _excel_rows(filename: str):
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        CalamineWorkbook = None
+
+    if CalamineWorkbook is not None: # Fast path: the calamine reader (xls and xlsx)
+        workbook = CalamineWorkbook.from_path(filename)
+        yield from workbook.get_sheet_by_index(0).iter_rows()
+    elif os.path.splitext(filename)[1] == '.xlsx': # Streaming openpyxl reader
+        import openpyxl
+        workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else: # Old xls files without calamine: let pandas read the sheet
+        yield from pd.read_excel(filename, header=None, dtype=object).itertuples(index=False)
+
+
+#
+# Convert a raw Excel cell value like the pandas Excel readers do
+#
+def _excel_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if type(value) is datetime.date: # calamine returns dates for date-only formats
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+#
+# Build a dataframe from a buffer of Excel rows, with the same parser,
+# converters and dtypes that pd.read_excel uses
+#
+def _excel_frame(header, buffer, converters, start: int) -> pd.DataFrame:
+    from pandas.io.parsers import TextParser
+    if converters:
+        df = TextParser([header] + buffer, header=0, skip_blank_lines=False, converters=converters).read()
+    else:
+        df = TextParser([header] + buffer, header=0, skip_blank_lines=False, dtype=str).read()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
 
 
 #
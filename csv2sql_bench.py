@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+
+Benchmarks for csv2sql.py.
+
+# Overview
+
+This script generates synthetic CSV and Excel files and runs csv2sql.py on
+them in separate processes, measuring the wall time and the peak memory
+(maximum resident set size) of each run. The results can be written to a
+JSON file, and two such files can be compared to find regressions.
+
+# Usage
+
+## Generate a Synthetic File
+
+To generate a file of a given number of rows and columns, do it like this:
+
+$ csv2sql_bench.py generate my_file.csv --rows 100000 --cols 20
+
+The columns cycle through repetitive values, numbers, and free text of the
+given average width (--width). The quoting (--quoting) can be minimal, all,
+nonnumeric, or none; Excel files are written if the file name ends in .xlsx.
+
+## Run the Benchmarks
+
+To run all benchmarks and write the results to a JSON file, do it like this:
+
+$ csv2sql_bench.py run --rows 100000 --cols 20 --output before.json
+
+Each benchmark is run --repeat times (3 by default); the minimum and median
+wall times and the largest peak memory are kept. The benchmarks cover table,
+parse with each output format, --query, --replace, --formats, --longest,
+--db against SQLite, and wordcloud. To run only some of them, give parts of
+their names:
+
+$ csv2sql_bench.py run --only parse-json --only table
+
+The generated files are kept in the directory given by --dir, and reused by
+later runs with the same parameters.
+
+## Compare two Runs
+
+To compare two runs, do it like this:
+
+$ csv2sql_bench.py compare before.json after.json
+
+Benchmarks whose median time or peak memory grew by more than the threshold
+(--threshold, 10% by default) are flagged, and the exit code is then 1.
+
+## Memory
+
+To compare the peak memory of parse with and without the --compact option,
+do it like this:
+
+$ csv2sql_bench.py memory --rows 5000000 --cols 80
+
+"""
+
+#
+# Imports
+#
+import os
+import sys
+import re
+import csv
+import json
+import time
+import platform
+import statistics
+import subprocess
+import tempfile
+import datetime
+import numpy as np
+import pandas as pd
+
+from rich import print;
+from rich.progress import Progress
+import rich.table # used to print a table
+
+#
+# Command Line Interface
+#
+from typing import List, Optional
+import typer
+
+app = typer.Typer(
+    add_completion = False,
+    rich_markup_mode = "rich",
+    no_args_is_help=True,
+    help="Benchmark csv2sql.py",
+)
+
+_CSV2SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv2sql.py")
+
+_QUOTING = {"minimal": csv.QUOTE_MINIMAL, "all": csv.QUOTE_ALL, "nonnumeric": csv.QUOTE_NONNUMERIC, "none": csv.QUOTE_NONE}
+
+#
+# The benchmarks: a name and the arguments to csv2sql.py, where {csv}, {xlsx},
+# and {dir} are replaced by the generated files and the working directory.
+# Column col_0 is repetitive, col_1 is numeric, and col_2 is free text.
+#
+BENCHMARKS = [
+    ("table",           ["table", "{csv}"]),
+    ("table-xlsx",      ["table", "{xlsx}"]),
+    ("table-stats",     ["table", "{csv}", "--stats"]),
+    ("parse-table",     ["parse", "{csv}", "-a", "-M", "1000"]),
+    ("parse-csv",       ["parse", "{csv}", "-a", "--csv"]),
+    ("parse-json",      ["parse", "{csv}", "-a", "--json"]),
+    ("parse-pjson",     ["parse", "{csv}", "-a", "--pjson"]),
+    ("parse-html",      ["parse", "{csv}", "-a", "--html"]),
+    ("parse-md",        ["parse", "{csv}", "-a", "--md"]),
+    ("parse-excel",     ["parse", "{csv}", "-a", "--excel", "{dir}/bench_out.xlsx"]),
+    ("parse-sql",       ["parse", "{csv}", "-a", "--sql", "--dbtype", "sqlite", "--dbschema", "{dir}/bench.db"]),
+    ("parse-xlsx",      ["parse", "{xlsx}", "-a", "--csv"]),
+    ("parse-query",     ["parse", "{csv}", "-a", "--csv", "-q", 'col_0="value_1"']),
+    ("parse-contains",  ["parse", "{csv}", "-a", "--csv", "-q", 'col_2 contains "ab"']),
+    ("parse-replace",   ["parse", "{csv}", "-a", "--csv", "-r", "col_2=s/a/A/g"]),
+    ("parse-formats",   ["parse", "{csv}", "-a", "--csv", "-f", "col_1=int"]),
+    ("parse-order",     ["parse", "{csv}", "-a", "--csv", "-o", "col_0", "-o", "-col_2"]),
+    ("parse-unique",    ["parse", "{csv}", "-a", "--csv", "-u", "col_0"]),
+    ("parse-longest",   ["parse", "{csv}", "-a", "--csv", "-l"]),
+    ("parse-db",        ["parse", "{csv}", "-a", "--db", "--dbtype", "sqlite", "--dbschema", "{dir}/bench.db", "-t", "bench"]),
+    ("wordcloud",       ["wordcloud", "{csv}", "-a", "-f", "col_2", "-o", "{dir}/bench_wordcloud.png"]),
+    ("wordcloud-workers",["wordcloud", "{csv}", "-a", "-f", "col_2", "-o", "{dir}/bench_wordcloud.png", "-j", "4"]),
+]
+
+
+@app.callback()
+def main() -> None:
+    """
+    Benchmark csv2sql.py on synthetic files.
+    """
+
+
+#
+# Generate a synthetic file
+#
+@app.command()
+def generate (
+    filename:   str  = typer.Argument(...,                                   help="The file to generate (.csv or .xlsx)"),
+    rows:       int  = typer.Option(100000,    "--rows",      "-r",          help="The number of rows to generate"),
+    cols:       int  = typer.Option(20,        "--cols",      "-c",          help="The number of columns to generate"),
+    width:      int  = typer.Option(12,        "--width",     "-w",          help="The average width of the text fields"),
+    quoting:    str  = typer.Option("minimal", "--quoting",   "-q",          help="The quoting to use: minimal, all, nonnumeric, or none"),
+    cardinality:int  = typer.Option(50,        "--cardinality","-k",         help="The number of distinct values of the repetitive columns"),
+    seed:       int  = typer.Option(0,         "--seed",                     help="The seed of the random generator"),
+) -> None:
+    """
+    Generate a synthetic CSV or XLSX file.
+    """
+    if quoting not in _QUOTING:
+        print(f"Invalid quoting {quoting}. Use one of {', '.join(_QUOTING)}.")
+        sys.exit(1)
+    if filename.endswith(".xlsx"):
+        make_xlsx(filename, rows, cols, width, cardinality, seed)
+    else:
+        make_csv(filename, rows, cols, width, cardinality, seed, quoting=_QUOTING[quoting])
+
+
+#
+# Run the benchmarks
+#
+@app.command()
+def run (
+    rows:       int  = typer.Option(100000,    "--rows",      "-r",          help="The number of rows of the CSV file"),
+    xlsx_rows:  int  = typer.Option(20000,     "--xlsx-rows",                help="The number of rows of the Excel file"),
+    cols:       int  = typer.Option(20,        "--cols",      "-c",          help="The number of columns to generate"),
+    width:      int  = typer.Option(12,        "--width",     "-w",          help="The average width of the text fields"),
+    quoting:    str  = typer.Option("minimal", "--quoting",   "-q",          help="The quoting to use: minimal, all, nonnumeric, or none"),
+    cardinality:int  = typer.Option(50,        "--cardinality","-k",         help="The number of distinct values of the repetitive columns"),
+    repeat:     int  = typer.Option(3,         "--repeat",    "-n",          help="The number of times to run each benchmark"),
+    only:       List[str] = typer.Option(None, "--only",                     help="Only run the benchmarks whose names contain this"),
+    directory:  str  = typer.Option(None,      "--dir",       "-d",          help="The directory to keep the generated files in"),
+    output:     str  = typer.Option(None,      "--output",    "-o",          help="The JSON file to write the results to"),
+) -> None:
+    """
+    Run the benchmarks, and optionally write the results to a JSON file.
+    """
+    if quoting not in _QUOTING:
+        print(f"Invalid quoting {quoting}. Use one of {', '.join(_QUOTING)}.")
+        sys.exit(1)
+    benchmarks = [(name, args) for name, args in BENCHMARKS if not only or any(o in name for o in only)]
+    if not benchmarks:
+        print("No benchmarks selected.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = directory or tmp
+        os.makedirs(directory, exist_ok=True)
+        files = {"dir": directory,
+                 "csv": os.path.join(directory, f"bench_{rows}x{cols}x{width}_{quoting}_{cardinality}.csv"),
+                 "xlsx": os.path.join(directory, f"bench_{xlsx_rows}x{cols}x{width}_{cardinality}.xlsx")}
+        if not os.path.exists(files["csv"]):
+            make_csv(files["csv"], rows, cols, width, cardinality, quoting=_QUOTING[quoting])
+        if not os.path.exists(files["xlsx"]) and any("{xlsx}" in args for _, args in benchmarks):
+            make_xlsx(files["xlsx"], xlsx_rows, cols, width, cardinality)
+
+        results = {}
+        with Progress() as progress:
+            task = progress.add_task("Benchmarking", total=len(benchmarks) * repeat)
+            for name, args in benchmarks:
+                args = [a.format(**files) for a in args]
+                runs = []
+                for _ in range(repeat):
+                    runs.append(run_csv2sql(args, check=False))
+                    progress.update(task, advance=1)
+                    if runs[-1]["returncode"] != 0: # No use repeating a failing benchmark
+                        progress.update(task, advance=repeat - len(runs))
+                        break
+                results[name] = summarize(args, runs)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "rows": rows, "xlsx_rows": xlsx_rows, "cols": cols, "width": width,
+            "quoting": quoting, "cardinality": cardinality, "repeat": repeat,
+        },
+        "results": results,
+    }
+    print_results(results)
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to [green]{output}[/green].")
+
+
+#
+# Compare two runs
+#
+@app.command()
+def compare (
+    before:     str  = typer.Argument(...,                                   help="The JSON file of the earlier run"),
+    after:      str  = typer.Argument(...,                                   help="The JSON file of the later run"),
+    threshold:  float= typer.Option(0.10,      "--threshold", "-t",          help="The relative growth to flag as a regression"),
+) -> None:
+    """
+    Compare two runs and flag regressions.
+    """
+    with open(before) as f:
+        old = json.load(f)
+    with open(after) as f:
+        new = json.load(f)
+    if old["meta"].get("rows") != new["meta"].get("rows") or old["meta"].get("cols") != new["meta"].get("cols"):
+        print("[yellow]The runs used different file sizes; the comparison may not be meaningful.[/yellow]")
+
+    table = rich.table.Table(show_header=True, header_style="bold magenta")
+    for col in ("Benchmark", "Before s", "After s", "Time", "Before MB", "After MB", "Memory", ""):
+        table.add_column(col, justify="right", style="cyan")
+    regressions = 0
+    for name in old["results"]:
+        if name not in new["results"]:
+            continue
+        a, b = old["results"][name], new["results"][name]
+        if a["status"] != "ok" or b["status"] != "ok":
+            table.add_row(name, a["status"], b["status"], "", "", "", "", "")
+            continue
+        dt = b["median"] / a["median"] - 1 if a["median"] else 0.0
+        dm = b["maxrss"] / a["maxrss"] - 1 if a["maxrss"] else 0.0
+        flag = ""
+        if dt > threshold or dm > threshold:
+            flag = "[red]REGRESSION[/red]"
+            regressions += 1
+        elif dt < -threshold or dm < -threshold:
+            flag = "[green]improved[/green]"
+        table.add_row(name, f"{a['median']:.2f}", f"{b['median']:.2f}", f"{dt:+.0%}",
+                      f"{a['maxrss'] / 2**20:,.0f}", f"{b['maxrss'] / 2**20:,.0f}", f"{dm:+.0%}", flag)
+    print(table)
+    if regressions:
+        print(f"[red]{regressions} regression(s) above {threshold:.0%}.[/red]")
+        sys.exit(1)
+
+
+#
+# Memory
+#
+@app.command()
+def memory (
+    rows:       int  = typer.Option(1000000,   "--rows",      "-r",          help="The number of rows to generate"),
+    cols:       int  = typer.Option(80,        "--cols",      "-c",          help="The number of columns to generate"),
+    width:      int  = typer.Option(12,        "--width",     "-w",          help="The average width of the text fields"),
+    cardinality:int  = typer.Option(50,        "--cardinality","-k",         help="The number of distinct values of the repetitive columns"),
+    directory:  str  = typer.Option(None,      "--dir",       "-d",          help="The directory to keep the generated file in"),
+) -> None:
+    """
+    Compare the peak memory of parse with and without --compact.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(directory or tmp, f"bench_{rows}x{cols}.csv")
+        if not os.path.exists(filename):
+            make_csv(filename, rows, cols, width, cardinality)
+
+        table = rich.table.Table(show_header=True, header_style="bold magenta")
+        for col in ("Run", "Seconds", "Peak MB"):
+            table.add_column(col, justify="right", style="cyan")
+        for name, extra in (("parse", []), ("parse --compact", ["--compact"])):
+            result = run_csv2sql(["parse", filename, "-a", "--csv", "-M", "0"] + extra)
+            table.add_row(name, f"{result['seconds']:.2f}", f"{result['maxrss'] / 2**20:,.0f}")
+        print(table)
+
+
+#
+# Run csv2sql.py in a separate process, and measure its wall time and peak memory
+#
+def run_csv2sql(args: List[str], check: bool = True) -> dict:
+    start = time.perf_counter()
+    p = subprocess.Popen([sys.executable, _CSV2SQL] + args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = p.stderr.read()
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    if check and p.returncode != 0:
+        print(f"[red]csv2sql.py {' '.join(args)} failed with exit code {p.returncode}[/red]")
+        sys.exit(1)
+    maxrss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024 # Bytes on macOS, kilobytes elsewhere
+    lines = [l.strip() for l in stderr.decode(errors="replace").splitlines() if any(c.isalnum() for c in l)]
+    errors = [i for i, l in enumerate(lines) if re.match(r"\w+(Error|Exception)\b", l)] # Start at the last exception
+    lines = lines[errors[-1]:errors[-1] + 5] if errors else lines[-5:]
+    return {"seconds": seconds, "maxrss": maxrss, "returncode": p.returncode, "error": lines if p.returncode else []}
+
+
+#
+# Summarize the runs of a benchmark
+#
+def summarize(args: List[str], runs: List[dict]) -> dict:
+    if runs[-1]["returncode"] != 0:
+        return {"args": args, "status": "failed", "error": "\n".join(runs[-1]["error"])}
+    seconds = [r["seconds"] for r in runs]
+    return {"args": args, "status": "ok", "seconds": seconds, "min": min(seconds),
+            "median": statistics.median(seconds), "maxrss": max(r["maxrss"] for r in runs)}
+
+
+#
+# Print the results of a run
+#
+def print_results(results: dict) -> None:
+    table = rich.table.Table(show_header=True, header_style="bold magenta")
+    for col in ("Benchmark", "Min s", "Median s", "Peak MB"):
+        table.add_column(col, justify="right", style="cyan")
+    for name, r in results.items():
+        if r["status"] == "ok":
+            table.add_row(name, f"{r['min']:.2f}", f"{r['median']:.2f}", f"{r['maxrss'] / 2**20:,.0f}")
+        else:
+            table.add_row(name, "[red]failed[/red]", "", "")
+    print(table)
+    for name, r in results.items():
+        if r["status"] != "ok":
+            print(f"[red]{name}[/red]: {r['error']}")
+
+
+#
+# Generate synthetic data. The columns cycle through three kinds:
+# repetitive ones (few distinct values), numbers, and free text made of
+# words, some of them with commas and quotes, so that quoting is needed.
+#
+_WORDS = np.array(["data", "table", "value", "report", "customer", "order", "product", "region",
+                   "market", "ariba", "contract", "supplier", "invoice", "payment", "north", "south",
+                   "a,b", 'say "hi"', "total", "amount", "quarter", "growth", "service", "cloud"], dtype=object)
+
+def make_frames(rows: int, cols: int, width: int = 12, cardinality: int = 50, seed: int = 0, chunksize: int = 100000):
+    rng = np.random.default_rng(seed)
+    values = np.array([f"value_{i}" for i in range(cardinality)], dtype=object)
+    weights = 1.0 / np.arange(1, len(_WORDS) + 1) # Zipf-like word frequencies
+    weights /= weights.sum()
+    words_per_field = max(1, width // 6)
+    header = [f"col_{i}" for i in range(cols)]
+    for start in range(0, rows, chunksize):
+        n = min(chunksize, rows - start)
+        data = {}
+        for i, col in enumerate(header):
+            if i % 3 == 0: # Repetitive
+                data[col] = values[rng.integers(0, cardinality, n)]
+            elif i % 3 == 1: # Numbers
+                data[col] = rng.integers(0, 1000000, n)
+            else: # Free text
+                counts = rng.integers(1, 2 * words_per_field, n)
+                words = _WORDS[rng.choice(len(_WORDS), counts.sum(), p=weights)]
+                data[col] = [" ".join(w) for w in np.split(words, np.cumsum(counts)[:-1])]
+        yield pd.DataFrame(data)
+
+
+def make_csv(filename: str, rows: int, cols: int, width: int = 12, cardinality: int = 50,
+             seed: int = 0, quoting: int = csv.QUOTE_MINIMAL) -> None:
+    with open(filename, "w", newline="") as f, Progress() as progress:
+        task = progress.add_task(f"Generating {filename}", total=rows)
+        for i, df in enumerate(make_frames(rows, cols, width, cardinality, seed)):
+            df.to_csv(f, header=i == 0, index=False, quoting=quoting,
+                      escapechar="\\" if quoting == csv.QUOTE_NONE else None)
+            progress.update(task, advance=len(df))
+
+
+def make_xlsx(filename: str, rows: int, cols: int, width: int = 12, cardinality: int = 50, seed: int = 0) -> None:
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    with Progress() as progress:
+        task = progress.add_task(f"Generating {filename}", total=rows)
+        for i, df in enumerate(make_frames(rows, cols, width, cardinality, seed)):
+            if i == 0:
+                ws.append(list(df.columns))
+            for row in df.itertuples(index=False):
+                ws.append([int(v) if isinstance(v, np.integer) else v for v in row])
+            progress.update(task, advance=len(df))
+    wb.save(filename)
+
+
+#
+# Entry Point
+#
+if __name__ == '__main__':
+    try:
+        app()
+    except SystemExit as e:
+        if e.code != 0:
+            raise
@@ -7,13 +7,16 @@ fi
 
 FILE=$1
 
-dos2unix -q $FILE                                                # Just in case
-perl -pi -e 's/"""/"/g' $FILE                                    # Compress triple quotes
-perl -pi -e 's/"\{"([^"]*?)":"([^"]*?)"/"\1:\2"/g' $FILE         # Remove JSON and its quotes
-perl -pi -e 's/(,"[^",]*)"([^",]*",)/\1\2/g' $FILE               # Remove leading inner quotes
-#perl -pi -e 's/("[^",]*?)"([^",]*?)"/\1\2/g' $FILE               # Remove trailing inner quotes
-perl -pi -e 's/("[^",]*?)"([^",]*?")/\1\2/g' $FILE               # Remove trailing inner quotes
-perl -pi -e 's/,"([^"]*?)""$/,"\1"/g' $FILE                      # And towards the end
-perl -pi -e 's/("[^",]*?)"([^",]*?")/\1\2/g' $FILE               # Remove trailing inner quotes
-perl -pi -e 's/("[^",]*?")",/\1,/g' $FILE                        # "",
-perl -pi -e 's/("[^",]*?")[^,]*?,/\1,/g' $FILE                   # ,"Emirates" on,
+# The repair runs in a single pass; it used to be dos2unix and then these
+# perl passes, each rewriting the whole file:
+#
+# perl -pi -e 's/"""/"/g' $FILE                                    # Compress triple quotes
+# perl -pi -e 's/"\{"([^"]*?)":"([^"]*?)"/"\1:\2"/g' $FILE         # Remove JSON and its quotes
+# perl -pi -e 's/(,"[^",]*)"([^",]*",)/\1\2/g' $FILE               # Remove leading inner quotes
+# perl -pi -e 's/("[^",]*?)"([^",]*?")/\1\2/g' $FILE               # Remove trailing inner quotes
+# perl -pi -e 's/,"([^"]*?)""$/,"\1"/g' $FILE                      # And towards the end
+# perl -pi -e 's/("[^",]*?)"([^",]*?")/\1\2/g' $FILE               # Remove trailing inner quotes
+# perl -pi -e 's/("[^",]*?")",/\1,/g' $FILE                        # "",
+# perl -pi -e 's/("[^",]*?")[^,]*?,/\1,/g' $FILE                   # ,"Emirates" on,
+
+"$(dirname "$0")/csv2sql.py" repair "$FILE"
@@ -0,0 +1,16 @@
+import sys
+from os import path
+
+import pytest
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+
+#
+# Keep the dialect, offset, and frame caches of the tests apart from the
+# user's cache
+#
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CSV2SQL_CACHE", str(tmp_path / "cache"))
+    return tmp_path / "cache"
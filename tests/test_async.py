@@ -0,0 +1,57 @@
+import asyncio
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import csv2sql
+
+pytest.importorskip("aiosqlite")
+
+
+#
+# Many tables over an asyncio SQLite engine: without waiting for the lock
+# (timeout 0), concurrent writers would fail with "database is locked"
+#
+@pytest.mark.parametrize("staging", [False, True])
+def test_sqlite_tables_at_once(tmp_path, staging):
+    db = tmp_path / "db.sqlite"
+    engine = csv2sql.make_async_engine("sqlite", "", "", "", 0, str(db), dbargs='{"timeout": 0}', pool_size=3)
+    runner = csv2sql.AsyncRunner(csv2sql.async_limit(engine, 3))
+    df = pd.DataFrame({"a": range(20000), "b": [f"x{i % 7}" for i in range(20000)]})
+    try:
+        for k in range(5):
+            runner.submit(csv2sql.load_table_async(engine, df, f"t{k}", 1000, ["a"], staging, csv2sql.frame_defs(df, engine.dialect)))
+        runner.wait()
+    finally:
+        runner.run(engine.dispose())
+        runner.close()
+    with sqlite3.connect(db) as connection:
+        tables = sorted(name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        assert tables == [f"t{k}" for k in range(5)]
+        assert all(connection.execute(f"SELECT COUNT(*) FROM t{k}").fetchone()[0] == len(df) for k in range(5))
+
+
+#
+# wait() raises the first error only once all coroutines are done, so that
+# the loop is not closed under the others
+#
+def test_wait_lets_all_finish():
+    finished = []
+
+    async def fail():
+        raise ValueError("failed")
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        finished.append(True)
+
+    runner = csv2sql.AsyncRunner(2)
+    try:
+        runner.submit(fail())
+        runner.submit(slow())
+        with pytest.raises(ValueError):
+            runner.wait()
+        assert finished == [True]
+    finally:
+        runner.close()
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+import typer
+from typer.testing import CliRunner
+
+import csv2sql
+
+
+#
+# The database options have the same short flags in every command, and no
+# two options of a command share one
+#
+def test_database_short_flags():
+    group = typer.main.get_command(csv2sql.app)
+    for name in ("table", "parse", "drop", "ingest"):
+        options = {opt: param.name for param in group.commands[name].params for opt in param.opts}
+        assert (options["-dp"], options["-dw"]) == ("dbport", "dbpass"), name
+        flags = [opt for param in group.commands[name].params for opt in param.opts]
+        assert len(flags) == len(set(flags)), name
+
+
+#
+# drop matches the tables by name and by glob pattern, after the prefix,
+# over one engine or an asyncio one
+#
+@pytest.mark.parametrize("db_async", [[], ["--db-async", "2"]])
+def test_drop_tables_by_pattern(tmp_path, db_async):
+    if db_async:
+        pytest.importorskip("aiosqlite")
+    db = tmp_path / "db.sqlite"
+    with sqlite3.connect(db) as connection:
+        for name in ("_tmp_fpm_a", "_tmp_fpm_b", "_tmp_approvers", "_tmp_other", "fpm_c"):
+            connection.execute(f"CREATE TABLE {name} (a INTEGER)")
+    result = CliRunner().invoke(csv2sql.app, ["drop", "--dbtype", "sqlite", "--dbschema", str(db), "-p", "_tmp_",
+                                              "-t", "fpm_*", "-t", "approvers", "-t", "missing", "-t", "none_*", *db_async])
+    assert result.exit_code == 0, result.output
+    output = " ".join(result.output.split())
+    assert "Table _tmp_missing does not exist." in output
+    assert "No table matches _tmp_none_*." in output
+    with sqlite3.connect(db) as connection:
+        assert sorted(name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")) == ["_tmp_other", "fpm_c"]
+
+
+#
+# ingest keeps the files it loaded in its journal: a second run loads only
+# the files that changed, and the failed ones again with --retry
+#
+def test_ingest_skips_the_loaded_files(tmp_path):
+    inbox, db = tmp_path / "inbox", tmp_path / "db.sqlite"
+    inbox.mkdir()
+    (inbox / "one.csv").write_text("a,b\n1,2\n3,4\n")
+    (inbox / "two.csv").write_text("x\n5\n")
+    (inbox / "bad.csv").write_text('a,b\n"1,2\n')
+
+    def ingest(*args):
+        result = CliRunner().invoke(csv2sql.app, ["ingest", "--dbtype", "sqlite", "--dbschema", str(db), *args, str(inbox)])
+        assert result.exit_code == 0, result.output
+        return " ".join(result.output.split())
+
+    output = ingest()
+    assert "Loaded 2 files, 3 rows" in output and f"Failed {inbox / 'bad.csv'}" in output
+    assert "Loaded 0 files, 0 rows" in ingest()
+    assert f"Failed {inbox / 'bad.csv'}" in ingest("--retry")
+
+    (inbox / "one.csv").write_text("a,b\n1,2\n3,4\n5,6\n")
+    assert "Loaded 1 files, 3 rows" in ingest()
+    with sqlite3.connect(db) as connection:
+        assert connection.execute("SELECT count(*) FROM one").fetchone() == (3,)
+        assert connection.execute("SELECT count(*) FROM two").fetchone() == (1,)
+    with sqlite3.connect(inbox / ".csv2sql-ingest.db") as connection:
+        assert sorted(connection.execute("SELECT path, status, rows FROM files")) == \
+               [(str(inbox / "bad.csv"), "failed", None), (str(inbox / "one.csv"), "done", 3), (str(inbox / "two.csv"), "done", 1)]
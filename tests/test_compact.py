@@ -0,0 +1,31 @@
+import pandas as pd
+
+import csv2sql
+
+
+def _write(file, values):
+    file.write_text("num,cat\n" + "".join(f"{i},{value}\n" for i, value in enumerate(values)))
+    return str(file)
+
+
+#
+# With converters, the strings are not read as str, so a column that is empty
+# throughout a chunk gets float categories there
+#
+def test_converter_with_an_empty_chunk(tmp_path):
+    n = csv2sql._COMPACT_CHUNKSIZE
+    file = _write(tmp_path / "c.csv", ["a" if i % 2 else "b" for i in range(n)] + [""] * n + ["a"] * 10)
+    converters = {"num": int}
+    df = csv2sql.read_file(file, ",", converters=converters, compact=True)
+    expected = csv2sql.read_file(file, ",", converters=converters)
+    assert isinstance(df["cat"].dtype, pd.CategoricalDtype)
+    assert df["cat"].astype(object).equals(expected["cat"].astype(object))
+
+
+def test_numbers_then_strings(tmp_path):
+    n = csv2sql._COMPACT_CHUNKSIZE
+    file = _write(tmp_path / "c.csv", [i % 3 for i in range(n)] + ["xyz"[i % 3] for i in range(n)])
+    df = csv2sql.read_file(file, ",", converters={"num": int}, compact=True)
+    expected = csv2sql.read_file(file, ",", converters={"num": int})
+    assert list(df["cat"].cat.categories) == ["0", "1", "2", "x", "y", "z"]
+    assert df["cat"].astype(object).equals(expected["cat"].astype(str).astype(object))
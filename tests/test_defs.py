@@ -0,0 +1,32 @@
+import pandas as pd
+
+import csv2sql
+
+
+def _types(df, dbtype):
+    return [" ".join(line.split()[1:]) for line in csv2sql.frame_defs(df, csv2sql.offline_dialect(dbtype))]
+
+
+def test_long_strings_become_mediumtext():
+    df = pd.DataFrame({"id": [1, 2], "note": ["x" * 20000, "y"]})
+    assert _types(df, "mysql+pymysql") == ["bigint DEFAULT NULL", "mediumtext DEFAULT NULL"]
+    assert _types(df, "sqlite") == ["bigint DEFAULT NULL", "varchar(20000) DEFAULT NULL"]
+
+
+#
+# 20 columns of 1,000 characters take 80,000 bytes of a row with utf8mb4:
+# the longest varchars become text until the row fits
+#
+def test_wide_rows_fit_a_mysql_row():
+    df = pd.DataFrame({f"c{i}": ["x" * (1000 + i)] for i in range(20)})
+    types = _types(df, "mysql+pymysql")
+    texts = [i for i, t in enumerate(types) if t.startswith("text")]
+    assert texts == list(range(20 - len(texts), 20)) # The longest ones
+    assert 0 < len(texts) < 20
+    varchars = sum(4 * (1000 + i) + 2 for i in range(20) if i not in texts)
+    assert varchars + 12 * len(texts) <= 65535
+
+
+def test_short_strings_stay_varchar():
+    df = pd.DataFrame({"a": ["abc"], "b": ["x" * 300]})
+    assert _types(df, "mysql+pymysql") == ["varchar(3) DEFAULT NULL", "varchar(300) DEFAULT NULL"]
@@ -0,0 +1,53 @@
+import csv2sql
+
+
+#
+# The middle sample of a large UTF-8 file must not end within a character,
+# or the file is taken for cp1252
+#
+def test_middle_sample_ends_at_a_line(tmp_path):
+    for rows in (20001, 20002): # One of them has its middle sample end within an é
+        file = tmp_path / f"{rows}.csv"
+        file.write_text("a\n" + ("é" * 13 + "\n") * rows, encoding="utf-8")
+        assert file.stat().st_size > 3 * csv2sql._SNIFF_SAMPLE
+        assert csv2sql._sniff_dialect(str(file))["encoding"] == "utf-8"
+
+
+def test_cp1252_is_still_detected(tmp_path):
+    file = tmp_path / "cp1252.csv"
+    file.write_bytes(b"a,b\n" + b"\xe9t\xe9,1\n" * 20000)
+    assert csv2sql._sniff_dialect(str(file))["encoding"] == "cp1252"
+
+
+#
+# A backslash escaped quote outside of the samples must still be read
+#
+def test_escape_outside_the_samples(tmp_path):
+    file = tmp_path / "escaped.csv"
+    rows = [f'{i},"row {i}"' for i in range(200000)]
+    rows[50000] = '50000,"say \\"hi\\", now"'
+    file.write_text("a,b\n" + "\n".join(rows) + "\n")
+    assert csv2sql._sniff_dialect(str(file))["escapechar"] == "\\"
+    df = csv2sql.read_file(str(file), rows=-1)
+    assert df["b"][50000] == 'say "hi", now'
+
+
+def test_literal_backslashes_need_no_escape(tmp_path):
+    file = tmp_path / "literal.csv"
+    file.write_text('a,b\n1,"C:\\temp\\"\n2,"say ""hi"""\n')
+    assert csv2sql._sniff_dialect(str(file))["escapechar"] is None
+    assert list(csv2sql.read_file(str(file), rows=-1)["b"]) == ["C:\\temp\\", 'say "hi"']
+
+
+def test_own_output_keeps_the_escape(tmp_path):
+    file = tmp_path / "escaping.csv"
+    file.write_text('"a","b"\n1,"C:\\\\temp\\\\"\n2,"say ""hi"""\n')
+    assert csv2sql._sniff_dialect(str(file))["escapechar"] == "\\"
+    assert list(csv2sql.read_file(str(file), rows=-1)["b"]) == ["C:\\temp\\", 'say "hi"']
+
+
+def test_single_column_of_times(tmp_path):
+    file = tmp_path / "times.csv"
+    file.write_text("time\n10:00\n11:30\n")
+    assert csv2sql._sniff_dialect(str(file))["delimiter"] == ","
+    assert list(csv2sql.read_file(str(file), rows=-1)["time"]) == ["10:00", "11:30"]
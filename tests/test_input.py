@@ -0,0 +1,34 @@
+import bz2
+import gzip
+import os
+import sys
+
+import pytest
+
+import csv2sql
+
+_DATA = b"a,b\n" + b"1,2\n" * 1000
+
+
+def _open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+#
+# Closing a decompressing stream closes the file under it, too, with or
+# without the threaded decompressors
+#
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+@pytest.mark.parametrize("fallback", [False, True])
+@pytest.mark.parametrize("ext, compress", [(".gz", gzip.compress), (".bz2", bz2.compress)])
+def test_compressed_input_is_closed(tmp_path, monkeypatch, fallback, ext, compress):
+    if fallback:
+        monkeypatch.setitem(sys.modules, "isal", None)
+        monkeypatch.setitem(sys.modules, "indexed_bzip2", None)
+    file = tmp_path / f"f.csv{ext}"
+    file.write_bytes(compress(_DATA))
+    before = _open_fds()
+    for _ in range(5):
+        with csv2sql.open_input(str(file)) as f:
+            assert f.read() == _DATA
+    assert _open_fds() == before
@@ -0,0 +1,165 @@
+import io
+
+import pytest
+from typer.testing import CliRunner
+
+import csv2sql
+
+
+def _parse(*args):
+    return CliRunner().invoke(csv2sql.app, ["parse", *args])
+
+
+def test_unique_options_need_external(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_text("a,b\n1,2\n1,2\n")
+    for option in (["--unique-verify"], ["--unique-partitions", "2"]):
+        result = _parse(str(file), "-u", "a", *option)
+        assert result.exit_code == 1
+        assert "only apply to --unique with --external" in " ".join(result.output.split()) # Unwrapped
+    result = _parse(str(file), "-a", "--csv", "-u", "a", "--external", "--unique-verify", "--unique-partitions", "2")
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['"a","b"', '"1","2"']
+
+
+def test_pipeline_matches_parse(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_text("id,city,amount\n1,Rome,5\n2,Berlin,7\n3,Rome,9\n4,Paris,7\n")
+    result = _parse(str(file), "-a", "--csv", "-c", "id", "-c", "city", "-c", "amount", "-q", "amount > 5",
+                    "-u", "city", "-o", "-amount", "-f", "amount=int")
+    assert result.exit_code == 0, result.output
+    pipeline = csv2sql.Pipeline(columns=["id", "city", "amount"], query=["amount > 5"],
+                                unique=["city"], order=["-amount"], formats=["amount=int"])
+    out = io.StringIO()
+    pipeline.write_csv(pipeline.run(str(file)), out, str(file))
+    assert out.getvalue().splitlines() == result.output.splitlines()
+
+
+#
+# Sorting is case insensitive unless --case is given
+#
+def test_order_folds_case_by_default(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_text("name\nb\nC\na\n")
+    for external in ([], ["--external"]):
+        result = _parse(str(file), "-a", "--csv", "-o", "name", *external)
+        assert result.output.splitlines() == ['"name"', '"a"', '"b"', '"C"']
+        result = _parse(str(file), "-a", "--csv", "-o", "name", "--case", *external)
+        assert result.output.splitlines() == ['"name"', '"C"', '"a"', '"b"']
+
+
+
+#
+# --external sorts and queries in chunks, and gives the same output as in
+# memory; the sort keys are unique here, as the sort in memory is not stable
+#
+def _external_file(tmp_path):
+    file = tmp_path / "f.csv"
+    cities = ["Rome", "rome", "Paris", "paris", "Berlin", "Oslo", "oslo", ""]
+    file.write_text("a,b,c\n" + "".join(f"{cities[i * 7 % len(cities)]},{i * 7919 % 2000},{i % 3}\n" for i in range(2000)))
+    return file
+
+
+@pytest.mark.parametrize("options", [["-o", "a", "-o", "-b"],
+                                     ["-o", "a", "-o", "b", "--case"],
+                                     ["-f", "b=int", "-o", "-b"],
+                                     ["-f", "b=int", "-q", "b > 1500", "-o", "a", "-o", "b"],
+                                     ["-q", 'a = "rome"']])
+def test_external_matches_in_memory(tmp_path, options):
+    file = _external_file(tmp_path)
+    memory = _parse(str(file), "-a", "--csv", *options)
+    external = _parse(str(file), "-a", "--csv", "--external", "--chunk-rows", "150", *options)
+    assert external.exit_code == 0, external.output
+    assert len(memory.output.splitlines()) > 2
+    assert external.output == memory.output
+
+
+#
+# --unique with --external keeps the same rows as in memory, with the keys
+# spread over partitions, and compared in full with --unique-verify
+#
+@pytest.mark.parametrize("options", [[], ["--unique-partitions", "3"], ["--unique-verify"],
+                                     ["--unique-partitions", "3", "--unique-verify", "-o", "-b"]])
+def test_external_unique_matches_in_memory(tmp_path, options):
+    file = _external_file(tmp_path)
+    order = options[-2:] if "-o" in options else []
+    memory = _parse(str(file), "-a", "--csv", "-u", "a", "-u", "c", *order)
+    external = _parse(str(file), "-a", "--csv", "-u", "a", "-u", "c", "--external", "--chunk-rows", "150", *options)
+    assert external.exit_code == 0, external.output
+    assert len(memory.output.splitlines()) == 1 + 8 * 3
+    assert external.output == memory.output
+
+#
+# With --external, the stages run interleaved, and are still profiled one
+# by one
+#
+def test_external_stages_are_profiled(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_text("a,b\n" + "".join(f"{i % 50},{i}\n" for i in range(1000)))
+    profiler = csv2sql.Profiler(enabled=True)
+    pipeline = csv2sql.Pipeline(chunk_rows=100, query=["b > 10"], unique=["a"], order=["-b"], formats=["b=int"], profiler=profiler)
+    assert sum(len(chunk) for chunk in pipeline.stream(str(file))) == 50
+    profiler.lap("external")
+    stages = {stage["stage"]: stage["wall"] for stage in profiler.stages}
+    for stage in ("read", "transform", "unique", "sort"):
+        assert stages[f"external: {stage}"] >= 0
+    assert sum(stages.values()) <= profiler.wall - profiler.origin + 1e-6
+
+
+#
+# With --cache, a later run with other queries or order starts from the
+# cached data, without reading the file; a changed file is read again
+#
+def test_cache_skips_the_read(tmp_path, cache_dir, monkeypatch):
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "f.csv"
+    file.write_text("city,amount\nRome,5\nParis,7\nRome,9\n")
+    result = _parse(str(file), "-a", "--csv", "-f", "amount=int", "--cache", "-q", 'city = "Rome"')
+    assert result.output.splitlines() == ['"city","amount"', '"Rome",5', '"Rome",9']
+    assert len(list((cache_dir / "frames").glob("*.parquet"))) == 1
+
+    read_file = csv2sql.read_file
+    monkeypatch.setattr(csv2sql, "read_file", lambda *args, **kwargs: pytest.fail("read despite the cache"))
+    result = _parse(str(file), "-a", "--csv", "-f", "amount=int", "--cache", "-o", "-amount")
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['"city","amount"', '"Rome",9', '"Paris",7', '"Rome",5']
+
+    monkeypatch.setattr(csv2sql, "read_file", read_file)
+    with open(file, "a") as f:
+        f.write("Oslo,1\n")
+    result = _parse(str(file), "-a", "--csv", "-f", "amount=int", "--cache", "-o", "amount")
+    assert result.output.splitlines() == ['"city","amount"', '"Oslo",1', '"Rome",5', '"Paris",7', '"Rome",9']
+    assert len(list((cache_dir / "frames").glob("*.parquet"))) == 2
+
+
+#
+# With --offsets, -h seeks to the nearest cached row offset and reads the
+# same rows as without; a quoted line break counts as part of its row
+#
+def test_offsets_seek_to_the_same_rows(tmp_path, cache_dir):
+    file = tmp_path / "f.csv"
+    file.write_text("".join(f'{i},"line\nbreak {i}"\n' if i % 997 == 0 else f"{i},x{i}\n" for i in range(25000)))
+    for head in (3, 10000, 23456):
+        plain = _parse(str(file), "-a", "--csv", "-h", str(head), "-m", "5")
+        seeked = _parse(str(file), "-a", "--csv", "-h", str(head), "-m", "5", "--offsets")
+        assert seeked.exit_code == 0, seeked.output
+        assert seeked.output == plain.output
+        assert plain.output.splitlines()[0].startswith(f'"{head}"') # The header row
+    assert len(list((cache_dir / "offsets").glob("*.npy"))) == 1
+
+
+#
+# --sql renders the CREATE TABLE of --dbtype without connecting to it
+#
+@pytest.mark.parametrize("dbtype, quote, tail", [("mysql", "`", ") ENGINE=InnoDB"), ("postgresql", '"', ");"), ("sqlite", '"', ");")])
+def test_sql_renders_offline(tmp_path, monkeypatch, dbtype, quote, tail):
+    file = tmp_path / "f.csv"
+    file.write_text("id,city\n1,Rome\n2,Paris\n")
+    monkeypatch.setattr(csv2sql, "create_engine", lambda *args, **kwargs: pytest.fail("connected for --sql"))
+    result = _parse(str(file), "-a", "-f", "id=int", "--sql", "--dbtype", dbtype)
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0] == f"CREATE TABLE {quote}f{quote} ("
+    assert [line.split() for line in lines[1:3]] == [[f"{quote}id{quote}", "bigint", "DEFAULT", "NULL,"],
+                                                     [f"{quote}city{quote}", "varchar(5)", "DEFAULT", "NULL"]]
+    assert lines[3].startswith(tail)
@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+from os import path
+
+import pytest
+from typer.testing import CliRunner
+
+import csv2sql
+
+FIXTURES = path.join(path.dirname(__file__), "fixtures")
+MESSY = path.join(FIXTURES, "messy.csv")             # CRLF, a byte order mark, and broken quoting
+EXPECTED = path.join(FIXTURES, "messy.expected.csv") # What csvclean.sh made of it (dos2unix and the perl passes)
+
+
+def _expected() -> bytes:
+    with open(EXPECTED, "rb") as f:
+        return f.read()
+
+
+def _repaired(f, block: int = 1 << 20) -> bytes:
+    return io.BufferedReader(csv2sql._RepairReader(f, block)).read()
+
+
+#
+# A raw stream that returns the given parts, one per read
+#
+class _Parts(io.RawIOBase):
+    def __init__(self, parts):
+        self.parts = list(parts)
+
+    def readable(self):
+        return True
+
+    def read(self, n = -1):
+        return self.parts.pop(0) if self.parts else b""
+
+
+def test_repair_matches_csvclean(tmp_path):
+    output = tmp_path / "repaired.csv"
+    result = CliRunner().invoke(csv2sql.app, ["repair", MESSY, "-o", str(output)])
+    assert result.exit_code == 0, result.output
+    assert output.read_bytes() == _expected()
+
+
+@pytest.mark.parametrize("block", [1, 2, 3, 7, 64, 1 << 20])
+def test_repair_in_blocks(block):
+    with open(MESSY, "rb") as f:
+        assert _repaired(f, block) == _expected()
+
+
+def test_repair_while_reading():
+    df = csv2sql.read_file(MESSY, ",", repair=True)
+    expected = csv2sql.read_file(EXPECTED, ",")
+    assert df.equals(expected)
+    assert list(df["city"])[:3] == ["Berlin", "Paris", "a:b}"]
+
+
+def test_byte_order_mark_in_short_reads():
+    bom = b"\xef\xbb\xbf"
+    assert _repaired(_Parts([bom, b"a,b\r\n", b"1,2\r\n"])) == b"a,b\n1,2\n"
+    assert _repaired(_Parts([b"\xef", b"\xbb", b"\xbfa\n"])) == b"a\n"
+    assert _repaired(_Parts([b"\xef\xbb", b"x\n"])) == b"\xef\xbbx\n"
+    assert _repaired(io.BytesIO(bom)) == b""
+
+
+def test_repair_in_place_keeps_the_mode(tmp_path):
+    file = tmp_path / "messy.csv"
+    shutil.copy(MESSY, file)
+    os.chmod(file, 0o640)
+    result = CliRunner().invoke(csv2sql.app, ["repair", str(file)])
+    assert result.exit_code == 0, result.output
+    assert file.read_bytes() == _expected()
+    assert os.stat(file).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["messy.csv"]
+
+
+def test_failed_repair_leaves_the_file(tmp_path, monkeypatch):
+    file = tmp_path / "messy.csv"
+    shutil.copy(MESSY, file)
+
+    def fail(data):
+        raise ValueError("failed")
+
+    monkeypatch.setattr(csv2sql, "repair_csv", fail)
+    result = CliRunner().invoke(csv2sql.app, ["repair", str(file)])
+    assert isinstance(result.exception, ValueError)
+    with open(MESSY, "rb") as f:
+        assert file.read_bytes() == f.read()
+    assert os.listdir(tmp_path) == ["messy.csv"]
@@ -0,0 +1,60 @@
+import random
+
+import pandas as pd
+import pytest
+
+import csv2sql
+
+_TEXT = "abcdxyz 0123éß€😀" # No letters to spell NA values like "nan" or "null" with
+
+
+def _field(rng: random.Random, sep: str, escape: bool) -> str:
+    text = "".join(rng.choice(_TEXT) for _ in range(rng.randrange(12)))
+    kind = rng.randrange(7)
+    if kind == 0:
+        return ""
+    elif kind == 1: # A quoted separator
+        return f'"{text}{sep}{text}"'
+    elif kind == 2: # Doubled quotes
+        return f'"{text}""{text}"""'
+    elif kind == 3: # A line break within quotes
+        return f'"{text}\n{text}"'
+    elif kind == 4 and escape: # Escaped quotes and separators
+        return rng.choice([f'"{text}\\"{text}"', f'{text}\\{sep}{text}'])
+    elif kind == 5:
+        return f'"{text}"'
+    return text.strip() or "a"
+
+
+def _write(file, rng: random.Random, sep: str, escape: bool, crlf: bool, bom: bool, columns: int, rows: int) -> None:
+    lines = [sep.join(f"c{i}" for i in range(columns))]
+    for _ in range(rows):
+        lines.append(sep.join(_field(rng, sep, escape) for _ in range(columns)))
+        if rng.random() < 0.1: # Blank lines are skipped
+            lines.append(rng.choice(["", " "]))
+    data = ("\r\n" if crlf else "\n").join(lines) + rng.choice(["", "\n"])
+    file.write_bytes((b"\xef\xbb\xbf" if bom else b"") + data.encode("utf-8"))
+
+
+#
+# The scanner (compiled or not) must find the lengths that pandas does, for
+# quoted separators, doubled quotes, escapes, CRLF, a byte order mark, blank
+# lines, and multibyte characters
+#
+@pytest.mark.parametrize("seed", range(48))
+def test_scan_matches_pandas(tmp_path, seed):
+    rng = random.Random(seed)
+    sep = rng.choice(",;\t|")
+    escape, crlf, bom = seed % 2 == 1, seed % 3 == 1, seed % 4 < 2
+    file = tmp_path / "fuzz.csv"
+    _write(file, rng, sep, escape, crlf, bom, rng.randrange(1, 6), rng.randrange(1, 80))
+    escapechar = "\\" if escape else None
+
+    df = pd.read_csv(file, sep=sep, quotechar='"', escapechar=escapechar, encoding="utf-8-sig" if bom else "utf-8", dtype=str)
+    hdrs, cols, rows = csv2sql.profile_lengths([df])
+    scanners = [csv2sql._scan_lengths_py]
+    if csv2sql._scan_kernel_jit is not None:
+        scanners.append(csv2sql.scan_lengths)
+    for scan in scanners:
+        scanned = scan(str(file), sep, 0, -1, 0, '"', escapechar, "utf-8")
+        assert (scanned[0], [int(length) for length in scanned[1]], scanned[2]) == (hdrs, cols, rows), scan.__name__
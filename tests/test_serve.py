@@ -0,0 +1,68 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from typer.testing import CliRunner
+
+import csv2sql
+
+
+def _job(args, cwd, engines):
+    client, server = socket.socketpair()
+    with client:
+        with server:
+            client.sendall((json.dumps({"args": args, "cwd": str(cwd)}) + "\n").encode())
+            csv2sql.serve_job(server, engines)
+        messages = [json.loads(line) for line in client.makefile("r", encoding="utf-8")]
+    return messages[-1]["exit"], "".join(m.get("out", "") + m.get("err", "") for m in messages)
+
+
+#
+# The jobs of a server share its engines, which are kept by the server, not
+# by the module
+#
+def test_jobs_share_the_engines_of_the_server(tmp_path):
+    db = tmp_path / "db.sqlite"
+    engines = {}
+    args = ["drop", "--dbtype", "sqlite", "--dbschema", str(db), "-t", "nothing"]
+    for _ in range(2):
+        code, output = _job(args, tmp_path, engines)
+        assert code == 0, output
+        assert "does not exist" in output
+    assert len(engines) == 1
+    assert not hasattr(csv2sql, "_engines")
+    for engine in engines.values():
+        engine.dispose()
+
+
+#
+# A client hands parse over to a server, which runs it in the directory of
+# the client and streams back the same output as a run of its own; other
+# commands are refused, and without a server the client runs the command
+# itself
+#
+def test_forward_a_parse_job(tmp_path, monkeypatch, capsys):
+    (tmp_path / "f.csv").write_text("id,city\n1,Rome\n2,Paris\n")
+    address = str(tmp_path / "csv2sql.sock")
+    assert csv2sql.forward_command(address, ["parse", "f.csv"]) is None
+
+    server = subprocess.Popen([sys.executable, csv2sql.__file__, "serve", "--socket", address], stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while not os.path.exists(address):
+            assert server.poll() is None and time.monotonic() < deadline, "the server did not start"
+            time.sleep(0.05)
+        monkeypatch.chdir(tmp_path)
+        assert csv2sql.forward_command(address, ["parse", "f.csv", "-a", "--csv", "-o", "-id"]) == 0
+        served = capsys.readouterr().out
+        assert csv2sql.forward_command(address, ["ingest", "."]) == 1
+        assert "Only table, parse, and drop jobs can be served." in capsys.readouterr().err
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    assert not os.path.exists(address)
+    assert served.splitlines() == ['"id","city"', '"2","Paris"', '"1","Rome"']
+    assert served == CliRunner().invoke(csv2sql.app, ["parse", "f.csv", "-a", "--csv", "-o", "-id"]).output
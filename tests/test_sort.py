@@ -0,0 +1,28 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import csv2sql
+
+
+#
+# The external sort must give the rows in the order of the stable in-memory
+# sort, for mixed directions, case folding, missing values and ties, also
+# when the runs are merged in several passes
+#
+@pytest.mark.parametrize("seed", range(24))
+def test_external_sort_matches_sort_frame(seed):
+    rng = random.Random(seed)
+    rows = rng.randrange(1, 3000)
+    df = pd.DataFrame({"a": [rng.choice(["x", "X", "y", "b", "B", None]) for _ in range(rows)],
+                       "b": [rng.choice([1.0, 2.0, np.nan, 3.5]) for _ in range(rows)],
+                       "c": [str(i) for i in range(rows)]}).astype({"a": "str"})
+    by = rng.sample(["a", "b"], rng.randrange(1, 3))
+    ascending = [rng.random() < 0.5 for _ in by]
+    case_sens = rng.random() < 0.5
+    size = rng.randrange(1, 400)
+    chunks = (df.iloc[i:i + size] for i in range(0, rows, size))
+    merged = pd.concat(csv2sql.external_sort(chunks, by, ascending, case_sens, fanin=rng.choice([2, 3, 64])), ignore_index=True)
+    assert merged.equals(csv2sql.sort_frame(df, by, ascending, case_sens, kind='stable').reset_index(drop=True))
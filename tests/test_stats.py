@@ -0,0 +1,30 @@
+import pytest
+
+import csv2sql
+
+
+def _as_tuple(profiled):
+    hdrs, lengths, rows, stats = profiled
+    return hdrs, [int(length) for length in lengths], rows, [s.as_dict() for s in stats]
+
+
+#
+# The scanner must profile the columns as profile_stats does, with the same
+# NA markers, distinct counts, and top values, in one process or several
+# (with at most 40 values per column, so that the top values are exact)
+#
+@pytest.mark.parametrize("workers", [1, 3])
+def test_scan_stats_matches_profile_stats(tmp_path, workers):
+    if csv2sql._scan_kernel_jit is None:
+        pytest.skip("numba is not installed")
+    file = tmp_path / "stats.csv"
+    rows = ["name,amount,note"]
+    for i in range(30000):
+        note = ["NULL", "", "n/a", "NA", " ", f'"say ""{i % 5}"""', "x"][i % 7]
+        rows.append(f"name {i % 37},{(i * 37) % 40 / 8},{note}")
+    file.write_text("\n".join(rows) + "\n")
+    dialect = csv2sql.sniff_dialect(str(file))
+    scanned = csv2sql.scan_stats(str(file), ",", quotechar=dialect["quotechar"], escapechar=dialect["escapechar"],
+                                 encoding=dialect["encoding"], workers=workers)
+    assert _as_tuple(scanned) == _as_tuple(csv2sql.profile_stats(csv2sql.read_file_chunks(str(file))))
+    assert scanned[3][2].missing == 4 * 30000 // 7 + 2 # NULL, empty, n/a, and NA are missing for both
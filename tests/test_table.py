@@ -0,0 +1,47 @@
+from typer.testing import CliRunner
+
+import csv2sql
+
+
+def _table(*args) -> str:
+    result = CliRunner().invoke(csv2sql.app, ["table", *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_load_uses_the_line_terminator(tmp_path):
+    crlf, lf = tmp_path / "crlf.csv", tmp_path / "lf.csv"
+    crlf.write_bytes(b"a,b\r\n1,2\r\n")
+    lf.write_bytes(b"a,b\n1,2\n")
+    assert "lines terminated by '\\r\\n'" in _table("-t", str(crlf))
+    assert "lines terminated by" not in _table("-t", str(lf))
+
+
+def test_execute_needs_a_mysql_database(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_bytes(b"a,b\n1,2\n")
+    result = CliRunner().invoke(csv2sql.app, ["table", "-x", str(file), "--dbtype", "sqlite", "--dbschema", str(tmp_path / "db")])
+    assert "load data infile" in result.output # -x implies -t
+    assert "LOAD DATA INFILE needs a MySQL database" in result.output
+    assert result.exit_code == 1
+
+
+#
+# The first rows of this file are not like the rest: --sample stratified
+# finds the longer names further on, the same ones for the same --seed, and
+# --verify reads the whole file for a column that may cross 255 characters
+#
+def test_sample_beyond_the_first_rows(tmp_path):
+    file = tmp_path / "f.csv"
+    file.write_text("id,name,code\n" + "".join(f"{i},{'n' * (5 if i < 1000 else 10 + i % 20)},{'c' * (300 if i == 29000 else 250)}\n"
+                                               for i in range(30000)))
+    hdrs, lengths, total = csv2sql.sample_lengths(str(file), None, 0, 200, "stratified", seed=3)
+    assert hdrs == ["id", "name", "code"]
+    assert len(lengths) >= 200 and lengths[:, 1].max() > 5
+    assert abs(total - 30000) < 3000 # Estimated from the bytes per sampled row
+    assert (csv2sql.sample_lengths(str(file), None, 0, 200, "stratified", seed=3)[1] == lengths).all()
+
+    assert "`name` : 5" in " ".join(_table("-m", "200", str(file)).split())
+    output = " ".join(_table("-m", "200", "--sample", "stratified", "--seed", "3", str(file)).split())
+    assert "`code` : 250" in output and "`name` : 5" not in output
+    assert "`code` : 300" in " ".join(_table("-m", "200", "--sample", "stratified", "--seed", "3", "--verify", str(file)).split())
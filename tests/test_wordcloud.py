@@ -0,0 +1,99 @@
+import nltk
+import numpy as np
+import pandas as pd
+import pytest
+from nltk.probability import FreqDist
+from nltk.tokenize import RegexpTokenizer
+from typer.testing import CliRunner
+from wordcloud import WordCloud
+
+import csv2sql
+
+_CORPUS = [
+    "The cars of New York are parked in New York streets",
+    "A car is parked; the car's owner visits New York",
+    "Cats and dogs: the cat chases the dogs, the dog chases cats",
+    None,
+    "In 2023, 42 trains left the stations of New York on time",
+    "Today's weather is fine, and the weather's fine tomorrow",
+    "Trains, cars, and cats",
+    "books",
+    "",
+    "The station has books about trains and stations and New York",
+] * 7
+
+
+#
+# Without the NLTK data (stopwords, wordnet, punkt), both pipelines get the
+# same small stand-ins, so that the test still compares their steps
+#
+class _Lemmatizer:
+    def lemmatize(self, word: str) -> str:
+        return word[:-1] if " " not in word and word.endswith("s") and len(word) > 3 else word
+
+
+@pytest.fixture
+def nltk_data(monkeypatch):
+    try:
+        nltk.corpus.stopwords.words("english")
+        nltk.corpus.wordnet.ensure_loaded()
+        nltk.tokenize.word_tokenize("a b")
+    except LookupError:
+        stopwords = ["the", "a", "and", "is", "are", "of", "in", "on", "about", "has"]
+        monkeypatch.setattr(nltk.corpus, "stopwords", type("Stopwords", (), {"words": lambda self, language: list(stopwords)})())
+        monkeypatch.setattr(nltk.tokenize, "word_tokenize", str.split)
+        monkeypatch.setattr(csv2sql, "WordNetLemmatizer", _Lemmatizer)
+        monkeypatch.setattr(csv2sql, "_lemmatizer", _Lemmatizer())
+        csv2sql.lemmatize.cache_clear()
+        return _Lemmatizer
+    return nltk.stem.WordNetLemmatizer
+
+
+#
+# The words of the word cloud as the wordcloud command had them before it
+# counted the words itself: the same steps on a DataFrame, then the text for
+# WordCloud.generate
+#
+def _baseline_text(texts: pd.Series, lemmatizer) -> str:
+    df = pd.DataFrame({"feature": texts}).fillna("")
+    df["feature"] = df["feature"].astype(str).str.lower()
+    df["text_token"] = df["feature"].apply(RegexpTokenizer('\\w+').tokenize)
+    stopwords = nltk.corpus.stopwords.words("english")
+    df["text_token"] = df["text_token"].apply(lambda x: [item for item in x if item not in stopwords])
+    df["text_string"] = df["text_token"].apply(lambda x: " ".join([item for item in x if len(item) > 2]))
+    fdist = FreqDist(nltk.tokenize.word_tokenize(" ".join(df["text_string"])))
+    df["text_string_fdist"] = df["text_token"].apply(lambda x: " ".join([item for item in x if fdist[item] >= 1]))
+    df["text_string_lem"] = df["text_string_fdist"].apply(lemmatizer().lemmatize)
+    return " ".join(df["text_string_lem"])
+
+
+def _cloud() -> WordCloud:
+    return WordCloud(width=200, height=150, random_state=2, max_font_size=100)
+
+
+#
+# The frequencies, and so the image, are those of the baseline pipeline, in
+# one process or several
+#
+@pytest.mark.parametrize("workers", [1, 3])
+def test_word_frequencies_match_the_baseline(nltk_data, workers):
+    texts = pd.Series(_CORPUS, dtype=object)
+    text = _baseline_text(texts, nltk_data)
+    slices = 4 * workers if workers > 1 else 1
+    size = -(-len(texts) // slices)
+    chunks = (texts.iloc[i:i + size] for i in range(0, len(texts), size))
+    frequencies = csv2sql.word_frequencies(chunks, csv2sql.cloud_stopwords(), workers)
+    assert frequencies == _cloud().process_text(text)
+    assert np.array_equal(_cloud().generate_from_frequencies(frequencies).to_array(), _cloud().generate(text).to_array())
+
+
+def test_workers_draw_the_same_image(nltk_data, tmp_path):
+    file = tmp_path / "corpus.csv"
+    pd.DataFrame({"text": _CORPUS}).to_csv(file, index=False)
+    images = []
+    for workers in ("1", "3"):
+        output = tmp_path / f"cloud{workers}.png"
+        result = CliRunner().invoke(csv2sql.app, ["wordcloud", "-a", "-f", "text", "-j", workers, "-o", str(output), str(file)])
+        assert result.exit_code == 0, result.output
+        images.append(output.read_bytes())
+    assert images[0] == images[1]